@@ -0,0 +1,83 @@
+import json
+import time
+from datetime import datetime, timedelta
+
+from src.core.codec import CacheCodec
+from src.core.message_tracker import MessageHistory
+
+ITERATIONS = 2000
+
+
+def make_history(edits: int) -> MessageHistory:
+    """Синтетическая история сообщения с заданным числом изменений"""
+    now = datetime.now()
+    text = "Очень длинный комментарий под постом канала, который пользователь редактирует " * 3
+    return MessageHistory(
+        original_text=text,
+        edit_history=[
+            {
+                'timestamp': (now + timedelta(seconds=i)).isoformat(),
+                'old_text': text,
+                'new_text': f"{text} правка {i}",
+                'sentiment_change': -0.1 * i,
+                'is_negative': i % 2 == 0,
+                'analysis': {
+                    'sentiment': {'label': 'NEGATIVE', 'score': 0.93},
+                    'toxic': {'label': 'toxic', 'score': 0.81},
+                    'emotion': {'label': 'anger', 'score': 0.77}
+                }
+            }
+            for i in range(edits)
+        ],
+        original_sentiment_score=0.12,
+        last_check=now,
+        user_id=123456789,
+        username='some_user'
+    )
+
+
+def legacy_record(history: MessageHistory) -> dict:
+    """Запись в старом формате (схема v1)"""
+    return {
+        'original_text': history.original_text,
+        'edit_history': history.edit_history,
+        'original_sentiment_score': history.original_sentiment_score,
+        'last_check': history.last_check.isoformat(),
+        'user_id': history.user_id,
+        'username': history.username
+    }
+
+
+def measure(name: str, encode, decode, value):
+    data = encode(value)
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        encode(value)
+    encode_us = (time.perf_counter() - start) / ITERATIONS * 1e6
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        decode(data)
+    decode_us = (time.perf_counter() - start) / ITERATIONS * 1e6
+    print(f"{name:<28} {len(data):>8} байт {encode_us:>10.1f} мкс {decode_us:>10.1f} мкс")
+
+
+def run_benchmark():
+    json_codec = CacheCodec('json')
+    msgpack_codec = CacheCodec('msgpack', compress_threshold=1 << 30)
+    zstd_codec = CacheCodec('msgpack', compress_threshold=1024)
+
+    for edits in (0, 5, 20):
+        history = make_history(edits)
+        print(f"\nИстория с {edits} изменениями")
+        print(f"{'Формат':<28} {'Размер':>13} {'Кодирование':>14} {'Декодирование':>14}")
+        legacy = legacy_record(history)
+        measure('json (v1, старый формат)',
+                lambda v: json.dumps(v).encode('utf-8'), json.loads, legacy)
+        record = history.to_record()
+        measure('json (v2)', json_codec.encode, json_codec.decode, record)
+        measure('msgpack (v2)', msgpack_codec.encode, msgpack_codec.decode, record)
+        measure('msgpack + zstd (v2)', zstd_codec.encode, zstd_codec.decode, record)
+
+
+if __name__ == "__main__":
+    run_benchmark()
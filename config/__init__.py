@@ -4,9 +4,23 @@ __all__ = [
     'BOT_TOKEN',
     'ADMIN_CHAT_ID',
     'CHANNEL_ID',
+    'BOT_MODE',
+    'WEBHOOK_URL',
+    'WEBHOOK_PATH',
+    'WEBHOOK_SECRET',
+    'WEBHOOK_HOST',
+    'WEBHOOK_PORT',
     'DATABASE_URL',
+    'ASYNC_DATABASE_URL',
+    'DB_POOL_SIZE',
+    'DB_MAX_OVERFLOW',
+    'DB_POOL_TIMEOUT',
+    'DB_POOL_RECYCLE',
+    'DB_POOL_PRE_PING',
     'REDIS_URL',
     'REDIS_PASSWORD',
+    'BROKER_BACKEND',
+    'MEMORY_CACHE_MAX_ITEMS',
     'MAX_WARNINGS',
     'BAN_DURATION',
     'NEGATIVE_THRESHOLD',
@@ -14,6 +28,73 @@ __all__ = [
     'BATCH_SIZE',
     'WORKER_COUNT',
     'CACHE_TTL',
+    'CACHE_CODEC',
+    'CACHE_COMPRESS_THRESHOLD',
+    'L1_CACHE_MAX_ITEMS',
+    'L1_CACHE_MAX_BYTES',
+    'L1_CACHE_TTL',
+    'CACHE_INVALIDATION_CHANNEL',
+    'UPDATE_CONCURRENCY',
+    'UPDATE_MAX_PENDING',
+    'OUTBOUND_GLOBAL_RATE',
+    'OUTBOUND_CHAT_RATE',
+    'OUTBOUND_CHAT_BURST',
+    'OUTBOUND_WORKERS',
+    'OUTBOUND_MAX_QUEUE',
+    'OUTBOUND_MAX_RETRIES',
+    'ADMIN_DIGEST_THRESHOLD',
+    'ADMIN_DIGEST_WINDOW',
+    'ADMIN_DIGEST_INTERVAL',
+    'ADMIN_DIGEST_TOP',
+    'RECENT_MESSAGES_PER_USER',
+    'RECENT_MESSAGES_MAX_USERS',
+    'BAN_INDEX_CHANNEL',
+    'WRITE_BEHIND_INTERVAL_MS',
+    'WRITE_BEHIND_MAX_ROWS',
+    'WRITE_BEHIND_MAX_PENDING',
+    'PARTITION_RETENTION_MONTHS',
+    'PARTITION_PREMAKE_MONTHS',
+    'PARTITION_ARCHIVE',
+    'PARTITION_MAINTENANCE_INTERVAL',
+    'REVIEW_PAGE_SIZE',
+    'NEAR_DUP_WINDOW_SECONDS',
+    'NEAR_DUP_MAX_ENTRIES',
+    'NEAR_DUP_THRESHOLD',
+    'NEAR_DUP_MIN_LENGTH',
+    'NEAR_DUP_MIN_CLUSTER_SIZE',
+    'NEAR_DUP_MIN_CLUSTER_USERS',
+    'EXEMPLAR_INDEX_PATH',
+    'EXEMPLAR_MAX_ITEMS',
+    'EXEMPLAR_THRESHOLD',
+    'EXEMPLAR_SNAPSHOT_INTERVAL',
+    'TRUST_TIERS',
+    'TRUST_CACHE_TTL',
+    'TRUST_CACHE_MAX_USERS',
+    'FLOOD_RATE',
+    'FLOOD_BURST',
+    'FLOOD_MAX_USERS',
+    'FLOOD_ESCALATE_AFTER',
+    'RAID_WINDOW_SECONDS',
+    'RAID_BUCKET_SECONDS',
+    'RAID_MIN_MESSAGES',
+    'RAID_MIN_AUTHORS',
+    'RAID_NEW_ACCOUNT_RATIO',
+    'RAID_NEGATIVE_RATIO',
+    'RAID_NEW_ACCOUNT_NEGATIVE_RATIO',
+    'RAID_NEW_ACCOUNT_HOURS',
+    'RAID_CALM_SECONDS',
+    'RAID_WARMUP_SECONDS',
+    'EDIT_QUIET_PERIOD',
+    'EDIT_MAX_DELAY',
+    'EDIT_MAX_PENDING',
+    'ADMISSION_DEPTH_THRESHOLDS',
+    'ADMISSION_AGE_THRESHOLDS',
+    'ADMISSION_HOLD_SECONDS',
+    'ADMISSION_MAX_DEFERRED',
+    'METRICS_PORT',
+    'QUEUE_WEIGHTS',
+    'QUEUE_CONCURRENCY',
+    'QUEUE_AGING_SECONDS',
     'NEGATIVE_WORDS',
     'MESSAGES',
     'BERT_MODEL_PATH',
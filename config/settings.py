@@ -9,6 +9,14 @@ ADMIN_CHAT_ID = os.getenv('ADMIN_CHAT_ID')
 CHANNEL_ID = os.getenv('CHANNEL_ID')
 DISCUSSION_GROUP_ID = os.getenv('DISCUSSION_GROUP_ID')  # ID группы обсуждений канала
 
+# Режим получения обновлений: polling или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')  # публичный адрес, например https://bot.example.com
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')  # если не задан, генерируется случайный при запуске
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+
 # Database Configuration
 DB_HOST = os.getenv('DB_HOST', 'master.ddb2bc2c-b9c8-4cd7-bafd-8b21e116dcdf.c.dbaas.selcloud.ru')
 DB_PORT = os.getenv('DB_PORT', '5432')
@@ -18,10 +26,19 @@ DB_NAME = os.getenv('DB_NAME', 'tgbot_moderator')
 DB_SSL_MODE = os.getenv('DB_SSL_MODE', 'disable')
 
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?sslmode={DB_SSL_MODE}"
+# Асинхронное подключение бота (asyncpg) и параметры пула соединений
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?ssl={DB_SSL_MODE}"
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))  # секунд ожидания свободного соединения
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))  # секунд жизни соединения
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
 
 # Redis Configuration
 REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
 REDIS_PASSWORD = os.getenv('REDIS_PASSWORD')
+BROKER_BACKEND = os.getenv('BROKER_BACKEND', 'redis')  # redis, memory или auto
+MEMORY_CACHE_MAX_ITEMS = int(os.getenv('MEMORY_CACHE_MAX_ITEMS', '100000'))
 
 # Moderation Settings
 MAX_WARNINGS = int(os.getenv('MAX_WARNINGS', '3'))
@@ -33,6 +50,119 @@ MESSAGE_TRACKING_DAYS = int(os.getenv('MESSAGE_TRACKING_DAYS', '7'))
 BATCH_SIZE = int(os.getenv('BATCH_SIZE', '32'))
 WORKER_COUNT = int(os.getenv('WORKER_COUNT', '4'))
 CACHE_TTL = int(os.getenv('CACHE_TTL', '3600'))
+CACHE_CODEC = os.getenv('CACHE_CODEC', 'msgpack')  # msgpack или json
+CACHE_COMPRESS_THRESHOLD = int(os.getenv('CACHE_COMPRESS_THRESHOLD', '1024'))  # байт, выше - сжатие zstd
+L1_CACHE_MAX_ITEMS = int(os.getenv('L1_CACHE_MAX_ITEMS', '10000'))
+L1_CACHE_MAX_BYTES = int(os.getenv('L1_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+L1_CACHE_TTL = float(os.getenv('L1_CACHE_TTL', '30'))
+CACHE_INVALIDATION_CHANNEL = os.getenv('CACHE_INVALIDATION_CHANNEL', 'cache_invalidation')
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', '64'))  # одновременно обрабатываемых обновлений
+UPDATE_MAX_PENDING = int(os.getenv('UPDATE_MAX_PENDING', '1024'))  # принятых в работу, включая ожидающие; сверх лимита прием обновлений ждет
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9100'))
+
+# Scheduler Settings (веса и лимиты параллельности очередей)
+QUEUE_WEIGHTS = {
+    'priority': int(os.getenv('QUEUE_WEIGHT_PRIORITY', '6')),
+    'analysis': int(os.getenv('QUEUE_WEIGHT_ANALYSIS', '3')),
+    'moderation': int(os.getenv('QUEUE_WEIGHT_MODERATION', '1'))
+}
+QUEUE_CONCURRENCY = {
+    'priority': int(os.getenv('QUEUE_CONCURRENCY_PRIORITY', '4')),
+    'analysis': int(os.getenv('QUEUE_CONCURRENCY_ANALYSIS', '3')),
+    'moderation': int(os.getenv('QUEUE_CONCURRENCY_MODERATION', '2'))
+}
+QUEUE_AGING_SECONDS = float(os.getenv('QUEUE_AGING_SECONDS', '5'))
+
+# Outbound Telegram Settings (лимиты Bot API: ~30 запросов/с всего, ~20 в минуту на группу)
+OUTBOUND_GLOBAL_RATE = float(os.getenv('OUTBOUND_GLOBAL_RATE', '30'))
+OUTBOUND_CHAT_RATE = float(os.getenv('OUTBOUND_CHAT_RATE', '0.33'))
+OUTBOUND_CHAT_BURST = float(os.getenv('OUTBOUND_CHAT_BURST', '5'))
+OUTBOUND_WORKERS = int(os.getenv('OUTBOUND_WORKERS', '4'))
+OUTBOUND_MAX_QUEUE = int(os.getenv('OUTBOUND_MAX_QUEUE', '10000'))
+OUTBOUND_MAX_RETRIES = int(os.getenv('OUTBOUND_MAX_RETRIES', '5'))
+
+# Admin Notification Settings (больше THRESHOLD уведомлений за WINDOW секунд - режим сводок)
+ADMIN_DIGEST_THRESHOLD = int(os.getenv('ADMIN_DIGEST_THRESHOLD', '10'))
+ADMIN_DIGEST_WINDOW = float(os.getenv('ADMIN_DIGEST_WINDOW', '60'))
+ADMIN_DIGEST_INTERVAL = float(os.getenv('ADMIN_DIGEST_INTERVAL', '30'))
+ADMIN_DIGEST_TOP = int(os.getenv('ADMIN_DIGEST_TOP', '5'))
+
+# Bulk Purge Settings (буфер последних сообщений пользователя для массового удаления)
+RECENT_MESSAGES_PER_USER = int(os.getenv('RECENT_MESSAGES_PER_USER', '200'))
+RECENT_MESSAGES_MAX_USERS = int(os.getenv('RECENT_MESSAGES_MAX_USERS', '50000'))
+
+# Ban Index Settings (индекс банов и черного списка в памяти)
+BAN_INDEX_CHANNEL = os.getenv('BAN_INDEX_CHANNEL', 'ban_index')
+
+# Write-Behind Settings (пакетная запись комментариев и журнала модерации)
+WRITE_BEHIND_INTERVAL_MS = int(os.getenv('WRITE_BEHIND_INTERVAL_MS', '200'))
+WRITE_BEHIND_MAX_ROWS = int(os.getenv('WRITE_BEHIND_MAX_ROWS', '500'))  # строк в одном INSERT
+WRITE_BEHIND_MAX_PENDING = int(os.getenv('WRITE_BEHIND_MAX_PENDING', '50000'))
+
+# Partition Settings (помесячные разделы журнала модерации и истории изменений)
+PARTITION_RETENTION_MONTHS = int(os.getenv('PARTITION_RETENTION_MONTHS', '6'))  # 0 - хранить без ограничений
+PARTITION_PREMAKE_MONTHS = int(os.getenv('PARTITION_PREMAKE_MONTHS', '2'))  # разделы создаются заранее
+PARTITION_ARCHIVE = os.getenv('PARTITION_ARCHIVE', 'false').lower() == 'true'  # отсоединять в схему archive вместо удаления
+PARTITION_MAINTENANCE_INTERVAL = float(os.getenv('PARTITION_MAINTENANCE_INTERVAL', '3600'))
+
+# Review Queue Settings (постраничный просмотр очередей модерации)
+REVIEW_PAGE_SIZE = int(os.getenv('REVIEW_PAGE_SIZE', '10'))
+
+# Near-Duplicate Settings (поиск копий рассылок по MinHash)
+NEAR_DUP_WINDOW_SECONDS = float(os.getenv('NEAR_DUP_WINDOW_SECONDS', '3600'))  # окно поиска похожих комментариев
+NEAR_DUP_MAX_ENTRIES = int(os.getenv('NEAR_DUP_MAX_ENTRIES', '20000'))
+NEAR_DUP_THRESHOLD = float(os.getenv('NEAR_DUP_THRESHOLD', '0.6'))  # оценка сходства Жаккара
+NEAR_DUP_MIN_LENGTH = int(os.getenv('NEAR_DUP_MIN_LENGTH', '30'))  # короткие тексты не сравниваются
+# Вердикт рассылки применяется без анализа только к кластеру из стольких сообщений и авторов
+NEAR_DUP_MIN_CLUSTER_SIZE = int(os.getenv('NEAR_DUP_MIN_CLUSTER_SIZE', '5'))
+NEAR_DUP_MIN_CLUSTER_USERS = int(os.getenv('NEAR_DUP_MIN_CLUSTER_USERS', '3'))
+
+# Exemplar Index Settings (векторы отклоненных модераторами комментариев)
+EXEMPLAR_INDEX_PATH = os.getenv('EXEMPLAR_INDEX_PATH', 'data/exemplars.npz')
+EXEMPLAR_MAX_ITEMS = int(os.getenv('EXEMPLAR_MAX_ITEMS', '20000'))
+EXEMPLAR_THRESHOLD = float(os.getenv('EXEMPLAR_THRESHOLD', '0.93'))  # косинусная близость для автоматического отклонения
+EXEMPLAR_SNAPSHOT_INTERVAL = float(os.getenv('EXEMPLAR_SNAPSHOT_INTERVAL', '300'))  # секунд между сохранениями на диск
+
+# Trust Tier Settings (быстрая проверка комментариев пользователей с хорошей репутацией)
+# Уровни через запятую: имя:минимальная_репутация:доля_выборочного_полного_анализа
+TRUST_TIERS = [
+    (name, float(min_score), float(sample_rate))
+    for name, min_score, sample_rate in (
+        tier.split(':') for tier in os.getenv('TRUST_TIERS', 'trusted:0.8:0.05,regular:0.5:0.25').split(',') if tier
+    )
+]
+TRUST_CACHE_TTL = float(os.getenv('TRUST_CACHE_TTL', '3600'))  # секунд до пересчета репутации
+TRUST_CACHE_MAX_USERS = int(os.getenv('TRUST_CACHE_MAX_USERS', '100000'))
+
+# Flood Control Settings (лимит частоты комментариев одного пользователя)
+FLOOD_RATE = float(os.getenv('FLOOD_RATE', '0.2'))  # сообщений в секунду в среднем
+FLOOD_BURST = float(os.getenv('FLOOD_BURST', '5'))  # сообщений подряд без задержки
+FLOOD_MAX_USERS = int(os.getenv('FLOOD_MAX_USERS', '100000'))
+FLOOD_ESCALATE_AFTER = int(os.getenv('FLOOD_ESCALATE_AFTER', '10'))  # сообщений сверх лимита на одно предупреждение; 0 - без предупреждений
+
+# Raid Detection Settings (скользящие окна по каналу и постам в хранилище брокера)
+RAID_WINDOW_SECONDS = int(os.getenv('RAID_WINDOW_SECONDS', '300'))
+RAID_BUCKET_SECONDS = int(os.getenv('RAID_BUCKET_SECONDS', '10'))  # шаг скользящего окна
+RAID_MIN_MESSAGES = int(os.getenv('RAID_MIN_MESSAGES', '30'))
+RAID_MIN_AUTHORS = int(os.getenv('RAID_MIN_AUTHORS', '15'))
+RAID_NEW_ACCOUNT_RATIO = float(os.getenv('RAID_NEW_ACCOUNT_RATIO', '0.5'))
+RAID_NEGATIVE_RATIO = float(os.getenv('RAID_NEGATIVE_RATIO', '0.4'))
+RAID_NEW_ACCOUNT_NEGATIVE_RATIO = float(os.getenv('RAID_NEW_ACCOUNT_NEGATIVE_RATIO', '0.2'))  # доля негатива, при которой волна новых аккаунтов - рейд
+RAID_NEW_ACCOUNT_HOURS = float(os.getenv('RAID_NEW_ACCOUNT_HOURS', '24'))  # впервые замеченные ботом за это время
+RAID_CALM_SECONDS = float(os.getenv('RAID_CALM_SECONDS', '120'))  # без превышения порогов до выхода из режима
+RAID_WARMUP_SECONDS = float(os.getenv('RAID_WARMUP_SECONDS', '3600'))  # после запуска новые аккаунты не учитываются
+
+# Edit Debounce Settings (анализ только последней версии серии быстрых правок)
+EDIT_QUIET_PERIOD = float(os.getenv('EDIT_QUIET_PERIOD', '2'))  # секунд без новых правок до анализа
+EDIT_MAX_DELAY = float(os.getenv('EDIT_MAX_DELAY', '10'))  # максимум секунд от первой правки серии
+EDIT_MAX_PENDING = int(os.getenv('EDIT_MAX_PENDING', '10000'))
+
+# Admission Control Settings (ступени деградации анализа при росте очередей)
+# Пороги по ступеням (без эмоций, каскад, отложенные изменения): задачи в очередях и возраст старейшей в секундах
+ADMISSION_DEPTH_THRESHOLDS = [int(value) for value in os.getenv('ADMISSION_DEPTH_THRESHOLDS', '50,200,500').split(',')]
+ADMISSION_AGE_THRESHOLDS = [float(value) for value in os.getenv('ADMISSION_AGE_THRESHOLDS', '2,5,15').split(',')]
+ADMISSION_HOLD_SECONDS = float(os.getenv('ADMISSION_HOLD_SECONDS', '30'))  # спокойствия до возврата на ступень выше
+ADMISSION_MAX_DEFERRED = int(os.getenv('ADMISSION_MAX_DEFERRED', '10000'))
 
 # Negative words list (можно расширить)
 NEGATIVE_WORDS = [
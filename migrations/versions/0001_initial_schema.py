@@ -0,0 +1,80 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('telegram_id', sa.BigInteger(), unique=True),
+        sa.Column('username', sa.String(255)),
+        sa.Column('warning_count', sa.Integer()),
+        sa.Column('suspicious_edits_count', sa.Integer()),
+        sa.Column('is_banned', sa.Boolean()),
+        sa.Column('banned_until', sa.DateTime(), nullable=True),
+        sa.Column('is_in_blacklist', sa.Boolean()),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('updated_at', sa.DateTime())
+    )
+    op.create_table(
+        'warnings',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id')),
+        sa.Column('reason', sa.String(255)),
+        sa.Column('created_at', sa.DateTime())
+    )
+    op.create_table(
+        'comments',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id')),
+        sa.Column('post_id', sa.Integer()),
+        sa.Column('text', sa.Text()),
+        sa.Column('sentiment_score', sa.Float()),
+        sa.Column('toxicity_score', sa.Float()),
+        sa.Column('is_approved', sa.Boolean()),
+        sa.Column('is_rejected', sa.Boolean()),
+        sa.Column('rejection_reason', sa.String(255)),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('updated_at', sa.DateTime())
+    )
+    op.create_table(
+        'message_edits',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('comment_id', sa.Integer(), sa.ForeignKey('comments.id')),
+        sa.Column('old_text', sa.Text()),
+        sa.Column('new_text', sa.Text()),
+        sa.Column('sentiment_change', sa.Float()),
+        sa.Column('is_suspicious', sa.Boolean()),
+        sa.Column('created_at', sa.DateTime())
+    )
+    op.create_table(
+        'moderator_logs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('moderator_id', sa.BigInteger()),
+        sa.Column('action', sa.String(50)),
+        sa.Column('target_user_id', sa.BigInteger()),
+        sa.Column('comment_id', sa.Integer(), sa.ForeignKey('comments.id'), nullable=True),
+        sa.Column('details', sa.Text(), nullable=True),
+        sa.Column('analysis_data', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime())
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('moderator_logs')
+    op.drop_table('message_edits')
+    op.drop_table('comments')
+    op.drop_table('warnings')
+    op.drop_table('users')
@@ -0,0 +1,49 @@
+"""hot path indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 00:10:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# (имя, таблица, колонки, условие частичного индекса)
+INDEXES = [
+    # История комментариев пользователя: WHERE user_id = ? ORDER BY created_at DESC
+    ('ix_comments_user_id_created_at', 'comments', ['user_id', 'created_at'], None),
+    # Очередь модерации: WHERE NOT is_approved AND NOT is_rejected ORDER BY created_at
+    ('ix_comments_pending_created_at', 'comments', ['created_at'], 'NOT is_approved AND NOT is_rejected'),
+    # Статистика: WHERE action = ? AND created_at >= ?
+    ('ix_moderator_logs_action_created_at', 'moderator_logs', ['action', 'created_at'], None),
+    # Подозрительные изменения: WHERE is_suspicious ORDER BY created_at DESC
+    ('ix_message_edits_suspicious_created_at', 'message_edits', ['created_at'], 'is_suspicious'),
+    ('ix_warnings_user_id', 'warnings', ['user_id'], None),
+    # /unban_user ищет пользователя по username
+    ('ix_users_username', 'users', ['username'], None),
+    # Загрузка индекса банов при старте
+    ('ix_users_restricted', 'users', ['telegram_id'], 'is_banned OR is_in_blacklist'),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не блокирует запись в таблицы, но требует выполнения вне транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name, table, columns,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+                if_not_exists=True
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,43 @@
+"""moderator action rollups
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 00:20:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'moderator_action_rollups',
+        sa.Column('bucket', sa.DateTime(), primary_key=True),
+        sa.Column('action', sa.String(50), primary_key=True),
+        sa.Column('count', sa.Integer(), nullable=False),
+    )
+    # Счетчики за прошлые периоды строятся по уже накопленному журналу
+    op.execute(
+        "INSERT INTO moderator_action_rollups (bucket, action, count) "
+        "SELECT date_trunc('hour', created_at), action, count(*) FROM moderator_logs "
+        "WHERE created_at IS NOT NULL AND action IS NOT NULL "
+        "GROUP BY 1, 2"
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_moderator_logs_created_at', 'moderator_logs', ['created_at'],
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_moderator_logs_created_at', table_name='moderator_logs',
+                      postgresql_concurrently=True, if_exists=True)
+    op.drop_table('moderator_action_rollups')
@@ -0,0 +1,127 @@
+"""partition moderator_logs and message_edits by month
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 00:30:00
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def _columns(table: str, partitioned: bool) -> list:
+    # Имя внешнего ключа задается явно: при автоматическом выборе PostgreSQL
+    # обходит имена ключей разделов и добавляет суффикс
+    comment_fk = sa.ForeignKey('comments.id', name=f"{table}_comment_id_fkey")
+    # Последовательность id переходит от старой таблицы к новой
+    columns = [sa.Column('id', sa.Integer(), nullable=False,
+                         server_default=sa.text(f"nextval('{table}_id_seq'::regclass)"))]
+    if table == 'moderator_logs':
+        columns += [
+            sa.Column('moderator_id', sa.BigInteger()),
+            sa.Column('action', sa.String(50)),
+            sa.Column('target_user_id', sa.BigInteger()),
+            sa.Column('comment_id', sa.Integer(), comment_fk, nullable=True),
+            sa.Column('details', sa.Text(), nullable=True),
+            sa.Column('analysis_data', sa.Text(), nullable=True),
+        ]
+    else:
+        columns += [
+            sa.Column('comment_id', sa.Integer(), comment_fk),
+            sa.Column('old_text', sa.Text()),
+            sa.Column('new_text', sa.Text()),
+            sa.Column('sentiment_change', sa.Float()),
+            sa.Column('is_suspicious', sa.Boolean()),
+        ]
+    # Ключ раздела входит в первичный ключ и не может быть NULL
+    return columns + [sa.Column('created_at', sa.DateTime(), nullable=not partitioned)]
+
+
+# (имя, таблица, колонки, условие частичного индекса)
+INDEXES = [
+    ('ix_moderator_logs_action_created_at', 'moderator_logs', ['action', 'created_at'], None),
+    ('ix_moderator_logs_created_at', 'moderator_logs', ['created_at'], None),
+    ('ix_message_edits_suspicious_created_at', 'message_edits', ['created_at'], 'is_suspicious'),
+]
+
+TABLES = ('moderator_logs', 'message_edits')
+
+# Разделы на будущие месяцы; остальные создает обслуживание разделов при запуске бота
+PREMAKE_MONTHS = 2
+
+
+def _add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _create_partitions(table: str, since) -> None:
+    """Помесячные разделы с месяца since (или текущего) на PREMAKE_MONTHS вперед"""
+    current = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    month = since.replace(day=1, hour=0, minute=0, second=0, microsecond=0) if since else current
+    month = min(month, current)
+    while month <= _add_months(current, PREMAKE_MONTHS):
+        following = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE {table}_p{month:%Y_%m} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{following:%Y-%m-%d}')"
+        )
+        month = following
+
+
+def _create_indexes(table: str) -> None:
+    for name, index_table, columns, where in INDEXES:
+        if index_table == table:
+            op.create_index(name, table, columns, postgresql_where=sa.text(where) if where else None)
+
+
+def _drop_indexes(table: str) -> None:
+    for name, index_table, _, _ in INDEXES:
+        if index_table == table:
+            op.drop_index(name, table_name=table)
+
+
+def _swap(table: str, partitioned: bool) -> None:
+    """Пересоздание таблицы с переносом строк и последовательности id"""
+    old = f"{table}_old"
+    _drop_indexes(table)
+    op.rename_table(table, old)
+    for constraint in ('pkey', 'comment_id_fkey'):
+        op.execute(f"ALTER TABLE {old} RENAME CONSTRAINT {table}_{constraint} TO {old}_{constraint}")
+
+    columns = _columns(table, partitioned)
+    if partitioned:
+        op.create_table(table, *columns, sa.PrimaryKeyConstraint('id', 'created_at'),
+                        postgresql_partition_by='RANGE (created_at)')
+        since = op.get_bind().execute(sa.text(f"SELECT min(created_at) FROM {old}")).scalar()
+        _create_partitions(table, since)
+        # Страховка на случай, если обслуживание разделов долго не запускалось
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+    else:
+        op.create_table(table, *columns, sa.PrimaryKeyConstraint('id'))
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+
+    names = ', '.join(column.name for column in columns)
+    values = names.replace('created_at', "COALESCE(created_at, now() AT TIME ZONE 'utc')")
+    op.execute(f"INSERT INTO {table} ({names}) SELECT {values} FROM {old}")
+    op.drop_table(old)
+    _create_indexes(table)
+
+
+def upgrade() -> None:
+    # Строки переносятся один раз: таблицы появились вместе с миграциями
+    # (до этого схема пересоздавалась при каждом запуске) и еще невелики
+    for table in TABLES:
+        _swap(table, partitioned=True)
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        _swap(table, partitioned=False)
@@ -0,0 +1,58 @@
+"""keyset queue indexes
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 00:40:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+# (имя, таблица, колонки до, колонки после, условие частичного индекса)
+# Очереди модерации листаются по ключу (created_at, id), поэтому id добавляется в индекс
+INDEXES = [
+    ('ix_comments_user_id_created_at', 'comments',
+     ['user_id', 'created_at'], ['user_id', 'created_at', 'id'], None),
+    ('ix_comments_pending_created_at', 'comments',
+     ['created_at'], ['created_at', 'id'], 'NOT is_approved AND NOT is_rejected'),
+    ('ix_comments_rejected_created_at', 'comments',
+     None, ['created_at', 'id'], 'is_rejected'),
+    ('ix_message_edits_suspicious_created_at', 'message_edits',
+     ['created_at'], ['created_at', 'id'], 'is_suspicious'),
+]
+
+# Индексы партиционированных таблиц нельзя строить CONCURRENTLY
+PARTITIONED = ('message_edits',)
+
+
+def _replace(name: str, table: str, columns, where) -> None:
+    """Замена индекса без периода, когда запросы остаются без него"""
+    where = sa.text(where) if where else None
+    if table in PARTITIONED:
+        op.drop_index(name, table_name=table, if_exists=True)
+        if columns:
+            op.create_index(name, table, columns, postgresql_where=where)
+        return
+    with op.get_context().autocommit_block():
+        if not columns:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+            return
+        op.create_index(f"{name}_new", table, columns, postgresql_where=where,
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+        op.execute(f"ALTER INDEX {name}_new RENAME TO {name}")
+
+
+def upgrade() -> None:
+    for name, table, _, columns, where in INDEXES:
+        _replace(name, table, columns, where)
+
+
+def downgrade() -> None:
+    for name, table, columns, _, where in reversed(INDEXES):
+        _replace(name, table, columns, where)
@@ -0,0 +1,36 @@
+import asyncio
+import json
+import sys
+import time
+
+import aiohttp
+
+from config.settings import WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET
+
+
+async def replay(path: str, url: str):
+    """Отправка записанных обновлений (по одному JSON в строке) на локальный webhook"""
+    with open(path, encoding='utf-8') as f:
+        updates = [json.loads(line) for line in f if line.strip()]
+
+    headers = {'X-Telegram-Bot-Api-Secret-Token': WEBHOOK_SECRET} if WEBHOOK_SECRET else {}
+    async with aiohttp.ClientSession(headers=headers) as session:
+        latencies = []
+        for update in updates:
+            start = time.perf_counter()
+            async with session.post(url, json=update) as response:
+                latencies.append((time.perf_counter() - start) * 1000)
+                print(f"update_id={update.get('update_id')}: HTTP {response.status}, {latencies[-1]:.1f} мс")
+
+    if latencies:
+        latencies.sort()
+        print(f"\nОтправлено обновлений: {len(latencies)}")
+        print(f"Медиана: {latencies[len(latencies) // 2]:.1f} мс, максимум: {latencies[-1]:.1f} мс")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Использование: python replay_updates.py updates.jsonl [url]")
+        sys.exit(1)
+    target = sys.argv[2] if len(sys.argv) > 2 else f"http://127.0.0.1:{WEBHOOK_PORT}{WEBHOOK_PATH}"
+    asyncio.run(replay(sys.argv[1], target))
@@ -1,25 +1,64 @@
 import logging
 from datetime import datetime, timedelta
 import asyncio
+import random
+import secrets
+import signal
+import time
 import sys
 import nest_asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
 from telegram.constants import ParseMode
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes, Defaults
 import traceback
+from prometheus_client import Histogram, start_http_server
 
-from src.models import Session, User, Comment
+from src.models import Session, User, engine
 from src.db.init_db import init_db
+from src.db.partitions import maintain_partitions
 from src.services.user_service import UserService
 from src.services.comment_service import CommentService
 from src.services.message_service import MessageService
 from src.services.moderator_log_service import ModeratorLogService
+from src.services.pagination import Page, encode_cursor, decode_cursor
 from src.core.text_analyzer import TextAnalyzer
 from src.core.message_tracker import MessageTracker
 from src.core.message_broker import MessageBroker
+from src.core.update_processor import OrderedUpdateProcessor
+from src.core.webhook_server import WebhookServer
+from src.core.outbound import OutboundDispatcher
+from src.core.admin_notifier import AdminNotifier
+from src.core.recent_messages import RecentMessages
+from src.core.ban_index import BanIndex
+from src.core.write_behind import WriteBehindBuffer
+from src.core.near_duplicates import NearDuplicateIndex
+from src.core.exemplar_index import ExemplarIndex
+from src.core.admission import AdmissionController, LEVEL_FULL, LEVEL_NO_EMOTION, LEVEL_CASCADE, LEVEL_NAMES
+from src.core.edit_debouncer import EditDebouncer
+from src.core.flood_control import create_flood_limiter
+from src.core.raid_detector import RaidDetector, RAID_DELETED
+from src.core.reputation import ReputationCache, reputation_score
 from config.settings import (
     BOT_TOKEN, ADMIN_CHAT_ID, MESSAGES, CHANNEL_ID,
-    MAX_WARNINGS, WORKER_COUNT, DISCUSSION_GROUP_ID
+    MAX_WARNINGS, WORKER_COUNT, DISCUSSION_GROUP_ID, METRICS_PORT,
+    UPDATE_CONCURRENCY, UPDATE_MAX_PENDING, BOT_MODE,
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+    OUTBOUND_GLOBAL_RATE, OUTBOUND_CHAT_RATE, OUTBOUND_CHAT_BURST, OUTBOUND_WORKERS,
+    OUTBOUND_MAX_QUEUE, OUTBOUND_MAX_RETRIES, ADMIN_DIGEST_THRESHOLD,
+    ADMIN_DIGEST_WINDOW, ADMIN_DIGEST_INTERVAL, ADMIN_DIGEST_TOP,
+    RECENT_MESSAGES_PER_USER, RECENT_MESSAGES_MAX_USERS, BAN_INDEX_CHANNEL, BAN_DURATION,
+    WRITE_BEHIND_INTERVAL_MS, WRITE_BEHIND_MAX_ROWS, WRITE_BEHIND_MAX_PENDING,
+    PARTITION_RETENTION_MONTHS, PARTITION_PREMAKE_MONTHS, PARTITION_ARCHIVE,
+    PARTITION_MAINTENANCE_INTERVAL, REVIEW_PAGE_SIZE, NEAR_DUP_WINDOW_SECONDS,
+    NEAR_DUP_MAX_ENTRIES, NEAR_DUP_THRESHOLD, NEAR_DUP_MIN_LENGTH,
+    NEAR_DUP_MIN_CLUSTER_SIZE, NEAR_DUP_MIN_CLUSTER_USERS, EXEMPLAR_INDEX_PATH,
+    EXEMPLAR_MAX_ITEMS, EXEMPLAR_THRESHOLD, EXEMPLAR_SNAPSHOT_INTERVAL, TRUST_TIERS,
+    TRUST_CACHE_TTL, TRUST_CACHE_MAX_USERS, FLOOD_RATE, FLOOD_BURST, FLOOD_MAX_USERS, FLOOD_ESCALATE_AFTER,
+    RAID_WINDOW_SECONDS, RAID_BUCKET_SECONDS, RAID_MIN_MESSAGES, RAID_MIN_AUTHORS, RAID_NEW_ACCOUNT_RATIO,
+    RAID_NEGATIVE_RATIO, RAID_NEW_ACCOUNT_NEGATIVE_RATIO, RAID_NEW_ACCOUNT_HOURS, RAID_CALM_SECONDS,
+    RAID_WARMUP_SECONDS, EDIT_QUIET_PERIOD, EDIT_MAX_DELAY,
+    EDIT_MAX_PENDING, ADMISSION_DEPTH_THRESHOLDS, ADMISSION_AGE_THRESHOLDS, ADMISSION_HOLD_SECONDS,
+    ADMISSION_MAX_DEFERRED
 )
 
 # Настройка логирования
@@ -33,21 +72,84 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+COMMENT_STAGE_SECONDS = Histogram(
+    'comment_stage_seconds',
+    'Время стадий обработки комментария',
+    ['stage'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+
 class HighLoadBot:
     def __init__(self):
         self.text_analyzer = TextAnalyzer()
         self.message_broker = MessageBroker()
         self.message_tracker = MessageTracker(self.text_analyzer, self.message_broker)
-        self.session = Session()
-        self.user_service = UserService(self.session)
-        self.comment_service = CommentService(self.session)
-        self.message_service = MessageService()
+        self.write_behind = WriteBehindBuffer(
+            engine,
+            flush_interval=WRITE_BEHIND_INTERVAL_MS / 1000,
+            max_rows=WRITE_BEHIND_MAX_ROWS,
+            max_pending=WRITE_BEHIND_MAX_PENDING
+        )
+        self.message_service = MessageService(buffer=self.write_behind)
+        self.outbound = OutboundDispatcher(
+            global_rate=OUTBOUND_GLOBAL_RATE,
+            chat_rate=OUTBOUND_CHAT_RATE,
+            chat_burst=OUTBOUND_CHAT_BURST,
+            workers=OUTBOUND_WORKERS,
+            max_queue=OUTBOUND_MAX_QUEUE,
+            max_retries=OUTBOUND_MAX_RETRIES
+        )
+        self.recent_messages = RecentMessages(RECENT_MESSAGES_PER_USER, RECENT_MESSAGES_MAX_USERS)
+        self.admin_notifier = AdminNotifier(
+            self.outbound,
+            ADMIN_CHAT_ID,
+            threshold=ADMIN_DIGEST_THRESHOLD,
+            window_seconds=ADMIN_DIGEST_WINDOW,
+            digest_interval=ADMIN_DIGEST_INTERVAL,
+            top=ADMIN_DIGEST_TOP
+        )
+        self.ban_index = BanIndex(self.message_broker.backend, BAN_INDEX_CHANNEL, self._load_restrictions)
+        self.near_duplicates = NearDuplicateIndex(
+            window_seconds=NEAR_DUP_WINDOW_SECONDS,
+            max_entries=NEAR_DUP_MAX_ENTRIES,
+            threshold=NEAR_DUP_THRESHOLD,
+            min_length=NEAR_DUP_MIN_LENGTH,
+            min_cluster_size=NEAR_DUP_MIN_CLUSTER_SIZE,
+            min_cluster_users=NEAR_DUP_MIN_CLUSTER_USERS
+        )
+        self.flood_limiter = create_flood_limiter(self.message_broker.backend, FLOOD_RATE, FLOOD_BURST, FLOOD_MAX_USERS)
+        self.raid_detector = RaidDetector(
+            self.message_broker.backend,
+            window_seconds=RAID_WINDOW_SECONDS,
+            bucket_seconds=RAID_BUCKET_SECONDS,
+            min_messages=RAID_MIN_MESSAGES,
+            min_authors=RAID_MIN_AUTHORS,
+            new_ratio=RAID_NEW_ACCOUNT_RATIO,
+            negative_ratio=RAID_NEGATIVE_RATIO,
+            new_negative_ratio=RAID_NEW_ACCOUNT_NEGATIVE_RATIO,
+            calm_seconds=RAID_CALM_SECONDS,
+            warmup_seconds=RAID_WARMUP_SECONDS
+        )
+        self.edit_debouncer = EditDebouncer(self.process_edit, EDIT_QUIET_PERIOD, EDIT_MAX_DELAY, EDIT_MAX_PENDING)
+        self.admission = AdmissionController(
+            self.message_broker.scheduler.get_stats,
+            depth_thresholds=ADMISSION_DEPTH_THRESHOLDS,
+            age_thresholds=ADMISSION_AGE_THRESHOLDS,
+            hold_seconds=ADMISSION_HOLD_SECONDS,
+            max_deferred=ADMISSION_MAX_DEFERRED,
+            on_change=self.report_degradation,
+            on_drain=lambda item: self.process_edit(*item)
+        )
+        self.reputation = ReputationCache(TRUST_TIERS, TRUST_CACHE_TTL, TRUST_CACHE_MAX_USERS)
+        self.exemplars = ExemplarIndex(EXEMPLAR_INDEX_PATH, EXEMPLAR_MAX_ITEMS, EXEMPLAR_SNAPSHOT_INTERVAL)
+        self._background_tasks: set[asyncio.Task] = set()
         print(f"\nБот запущен и настроен для работы с:\nКанал ID: {CHANNEL_ID}\nАдмин чат ID: {ADMIN_CHAT_ID}\n")
         
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка команды /start"""
         keyboard = ReplyKeyboardMarkup([
             [KeyboardButton("/stats"), KeyboardButton("/unban_user")],
+            [KeyboardButton("/pending"), KeyboardButton("/suspicious"), KeyboardButton("/clusters")],
             [KeyboardButton("/get_chat_id")]
         ], resize_keyboard=True)
         
@@ -81,8 +183,187 @@ class HighLoadBot:
             f"• Подозрительных изменениях"
         )
 
+    async def on_startup(self, application: Application):
+        """Запуск фоновых компонентов после инициализации приложения"""
+        await self.message_broker.start()
+        self.admission.start()
+        try:
+            await self.ban_index.start()
+        except Exception as e:
+            logger.error(f"Failed to load ban index: {e}")
+        self.outbound.start(application.bot)
+        self.admin_notifier.start()
+        self.write_behind.start()
+        await self.exemplars.start()
+
+    async def on_shutdown(self, application: Application):
+        """Остановка фоновых компонентов"""
+        # Отложенные под нагрузкой и ожидающие серии правок анализируются сразу,
+        # после остановки контроллера изменения больше не откладываются
+        await self.admission.stop()
+        await self.edit_debouncer.stop()
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        await self.admin_notifier.stop()
+        await self.ban_index.stop()
+        await self.exemplars.stop()
+        await self.outbound.stop()
+        await self.message_broker.close()
+        # Запись накопленных строк до закрытия пула соединений
+        await self.write_behind.stop()
+        await engine.dispose()
+
+    async def _load_restrictions(self) -> list:
+        """Загрузка действующих банов и черного списка для индекса"""
+        async with Session() as session:
+            return await UserService(session).get_restricted_users()
+
+    async def register_ban(self, user_id: int) -> None:
+        """Добавление бана в индекс и рассылка другим репликам"""
+        await self.ban_index.ban(user_id, datetime.utcnow() + timedelta(hours=BAN_DURATION))
+
+    async def log_auto_warning(self, session, bot_id: int, user_id: int, banned: bool,
+                               analysis: dict) -> None:
+        """Запись автоматического предупреждения и бана в журнал модерации (пакетно)"""
+        log_service = ModeratorLogService(session, self.write_behind)
+        await log_service.log_action(bot_id, 'warning_issued', user_id, analysis_data=analysis)
+        if banned:
+            await log_service.log_action(bot_id, 'user_banned', user_id, details='превышен лимит предупреждений')
+
+    async def escalate_flood(self, bot_id: int, user_id: int, strikes: int) -> None:
+        """Предупреждение за повторное превышение лимита частоты сообщений"""
+        async with Session() as session:
+            warnings_count, banned = await UserService(session).add_warning(user_id)
+            await self.log_auto_warning(session, bot_id, user_id, banned, {'flood_strikes': strikes})
+        self.reputation.invalidate(user_id)
+        if banned:
+            self.purge_recent_messages(user_id)
+            await self.register_ban(user_id)
+        print(f"Предупреждение за флуд пользователю {user_id} ({warnings_count}/{MAX_WARNINGS})")
+
+    async def report_degradation(self, previous: int, level: int, load: dict) -> None:
+        """Уведомление администраторов о смене уровня деградации анализа"""
+        if level > previous:
+            header = "⚠️ Высокая нагрузка: анализ упрощен"
+        elif level == LEVEL_FULL:
+            header = "✅ Нагрузка снизилась: анализ снова в полном объеме"
+        else:
+            header = "↘️ Нагрузка снижается"
+        self.outbound.send_message(
+            ADMIN_CHAT_ID,
+            f"{header}\n\n"
+            f"Уровень: {LEVEL_NAMES[previous]} → {LEVEL_NAMES[level]}\n"
+            f"Задач в очередях: {load['depth']}\n"
+            f"Ожидание старейшей: {load['age']:.1f} с"
+        )
+
+    async def observe_raid(self, scopes: tuple, user_id: int, is_new_account: bool, suspicious: bool) -> None:
+        """Учет сообщения в окнах рейдов; при начале рейда - массовое удаление и одно уведомление"""
+        started = []
+        for event in await self.raid_detector.observe(scopes, user_id, is_new_account, suspicious):
+            if event.event == 'ended':
+                logger.info(f"Raid mode ended for {event.scope}")
+            else:
+                logger.warning(f"Raid mode started for {event.scope}: {event.stats}")
+                started.append(event)
+        if not started:
+            return
+        
+        # Недавние сообщения новых аккаунтов, писавших подозрительные сообщения
+        participants = {participant for event in started for participant in event.participants}
+        purged = sum(self.purge_recent_messages(participant) for participant in participants)
+        
+        # Канал и пост обычно переходят в режим рейда вместе: одно уведомление на всех
+        claimed = [event for event in started if await self.raid_detector.claim_alert(event.scope)]
+        if not claimed:
+            return
+        stats = claimed[0].stats
+        self.outbound.send_message(
+            ADMIN_CHAT_ID,
+            f"🚨 Похоже на рейд ({', '.join(event.scope for event in claimed)})\n\n"
+            f"За {RAID_WINDOW_SECONDS // 60} мин:\n"
+            f"- Сообщений: {stats.messages}\n"
+            f"- Авторов: {stats.authors}\n"
+            f"- Новых аккаунтов: {stats.new_ratio:.0%}\n"
+            f"- Негативных: {stats.negative_ratio:.0%}\n\n"
+            f"Включен режим рейда: подозрительные сообщения недоверенных пользователей "
+            f"удаляются без анализа. Удалено недавних сообщений новых аккаунтов: {purged}.\n"
+            f"Режим выключится автоматически после {RAID_CALM_SECONDS:.0f} с без превышения порогов."
+        )
+
+    def purge_recent_messages(self, user_id: int) -> int:
+        """Массовое удаление недавних сообщений пользователя через deleteMessages"""
+        purged = 0
+        for chat_id, message_ids in self.recent_messages.take(user_id).items():
+            self.outbound.delete_messages(chat_id, message_ids)
+            purged += len(message_ids)
+        if purged:
+            logger.info(f"Queued bulk deletion of {purged} messages from user {user_id}")
+        return purged
+
+    async def _analyze_text(self, text: str) -> tuple:
+        """Полный анализ текста: негативность, токсичность, эмоция и признак
+        совпадения с отклоненным модератором комментарием"""
+        level = self.admission.level
+        if level >= LEVEL_CASCADE and not self.text_analyzer.quick_screen(text):
+            # Под нагрузкой тексты без признаков по правилам принимаются без моделей
+            self.admission.record_degraded()
+            return False, 0.0, 'neutral', False
+        if level > LEVEL_FULL:
+            self.admission.record_degraded()
+        mode = 'full' if level == LEVEL_FULL else 'no_emotion' if level == LEVEL_NO_EMOTION else 'toxicity_only'
+        started = time.perf_counter()
+        result = await self.text_analyzer.analyze(text, self.exemplars, EXEMPLAR_THRESHOLD, mode)
+        if level == LEVEL_FULL:
+            self.reputation.observe_analysis(time.perf_counter() - started)
+        if 'exemplar' in result:
+            # Почти копия ранее отклоненного модератором комментария
+            return True, result['toxicity_score'], f"копия отклоненного #{result['exemplar']['comment_id']}", True
+        return result['is_negative'], result['toxicity_score'], result['emotion'], False
+
+    @staticmethod
+    def _is_violation(is_negative: bool, toxicity_score: float, exemplar: bool) -> bool:
+        """Нарушение: негативный и токсичный текст или копия отклоненного комментария"""
+        return exemplar or (is_negative and toxicity_score > 0.7)
+
+    async def add_exemplar(self, comment_id: int, text: str, reason: str) -> None:
+        """Сохранение вектора отклоненного комментария в индекс образцов"""
+        embedding = await self.text_analyzer.embed(text)
+        if embedding is not None:
+            self.exemplars.add(embedding, comment_id, reason, text)
+
+    async def _known_verdict(self, verdict: tuple) -> tuple:
+        """Готовый результат анализа (вердикт кластера рассылки)"""
+        return verdict
+
+    async def _prefetch_user(self, user_service: UserService, user_id: int, username: str) -> tuple:
+        """Загрузка пользователя и проверка бана"""
+        user = await user_service.get_or_create_user(user_id, username)
+        banned = bool(user.is_banned and user.banned_until and user.banned_until > datetime.utcnow())
+        return user, banned
+
+    async def _timed_stage(self, stage: str, coro):
+        """Выполнение стадии обработки комментария с замером времени"""
+        with COMMENT_STAGE_SECONDS.labels(stage).time():
+            return await coro
+
+    def _run_background(self, coro) -> asyncio.Task:
+        """Запуск некритичной операции вне пути ответа"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_done)
+        return task
+
+    def _background_done(self, task: asyncio.Task) -> None:
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Background task failed: {task.exception()}")
+
     async def handle_comment(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Обработка комментария"""
+        # Короткая сессия на время обработки одного обновления
+        session = Session()
+        user_service = UserService(session)
         try:
             print("\n=== Получено новое обновление ===")
             print(f"Update ID: {update.update_id}")
@@ -166,11 +447,86 @@ class HighLoadBot:
             if not user_id:
                 print("Не удалось получить ID пользователя")
                 return
+            
+            # Сообщения заблокированных пользователей удаляются без анализа и обращения к БД
+            if self.ban_index.is_blocked(user_id):
+                self.outbound.delete_message(message.chat.id, message.message_id)
+                print(f"Сообщение заблокированного пользователя поставлено на удаление (ID: {message.message_id})")
+                return
+            
+            # Сообщения сверх лимита частоты удаляются без анализа
+            flood = await self.flood_limiter.check(user_id)
+            if not flood.allowed:
+                self.outbound.delete_message(message.chat.id, message.message_id)
+                print(f"Сообщение сверх лимита частоты поставлено на удаление (ID: {message.message_id})")
+                if FLOOD_ESCALATE_AFTER > 0 and flood.strikes % FLOOD_ESCALATE_AFTER == 0:
+                    self._run_background(self.escalate_flood(context.bot.id, user_id, flood.strikes))
+                return
                 
-            # Анализ текста
-            is_negative = await self.text_analyzer.is_negative(text)
-            toxicity_score = await self.text_analyzer.get_toxicity_score(text)
-            emotion = await self.text_analyzer.get_emotion(text)
+            # Запоминаем сообщение для возможной массовой очистки
+            self.recent_messages.record(message.chat.id, user_id, message.message_id)
+            username = message.from_user.username
+            
+            # Копии рассылки, уже признанной негативной, получают ее вердикт без запуска моделей
+            duplicate = self.near_duplicates.observe(text, user_id)
+            tier = None
+            if duplicate is not None and duplicate.verdict is not None:
+                print(f"Копия рассылки (кластер {duplicate.cluster_id}, {duplicate.size} сообщений)")
+                analysis_coro = self._known_verdict(duplicate.verdict)
+            else:
+                tier = self.reputation.get(user_id)
+                if tier is not None and self.text_analyzer.quick_screen(text):
+                    # Правила сработали: комментарий доверенного пользователя проверяется полностью
+                    self.reputation.record(tier, 'escalated')
+                    tier = None
+                if tier is not None:
+                    # Быстрый путь для доверенных пользователей: только правила
+                    analysis_coro = self._known_verdict((False, 0.0, 'neutral', False))
+                else:
+                    analysis_coro = self.message_broker.submit('analysis', user_id, lambda: self._analyze_text(text))
+            
+            # Стадия 1: анализ текста и загрузка пользователя выполняются параллельно
+            analysis = asyncio.create_task(self._timed_stage('analysis', analysis_coro))
+            try:
+                user, banned = await self._timed_stage('prefetch', self._prefetch_user(user_service, user_id, username))
+            except Exception:
+                analysis.cancel()
+                raise
+            
+            # Бан, отсутствующий в индексе (например, индекс еще не загружен)
+            if banned:
+                analysis.cancel()
+                await self.ban_index.ban(user_id, user.banned_until)
+                self.outbound.delete_message(message.chat.id, message.message_id)
+                print(f"Сообщение заблокированного пользователя поставлено на удаление (ID: {message.message_id})")
+                return
+            
+            # Статистика рейдов по каналу и посту обновляется вне пути ответа
+            raid_scopes = self.raid_detector.scopes(message.chat.id, message.message_thread_id)
+            is_new_account = user.created_at is None or \
+                datetime.utcnow() - user.created_at < timedelta(hours=RAID_NEW_ACCOUNT_HOURS)
+            suspicious = self.text_analyzer.quick_screen(text)
+            self._run_background(self.observe_raid(raid_scopes, user_id, is_new_account, suspicious))
+            
+            # В режиме рейда сообщения со словами из словаря или ссылками (кроме доверенных
+            # пользователей) удаляются без анализа; остальные сообщения новых аккаунтов
+            # проходят обычный анализ
+            if self.raid_detector.is_active(raid_scopes):
+                if suspicious and self.reputation.get(user_id) is None:
+                    reason = 'new_account' if is_new_account else 'quick_screen'
+                else:
+                    reason = None
+                if reason:
+                    analysis.cancel()
+                    RAID_DELETED.labels(reason).inc()
+                    self.outbound.delete_message(message.chat.id, message.message_id)
+                    print(f"Сообщение удалено в режиме рейда (ID: {message.message_id}, причина: {reason})")
+                    return
+            
+            if not self.reputation.is_fresh(user_id):
+                self._run_background(self.refresh_reputation(user))
+            
+            is_negative, toxicity_score, emotion, exemplar = await analysis
             
             print(f"\n=== Результаты анализа ===")
             print(f"Негативный контент: {is_negative}")
@@ -178,72 +534,143 @@ class HighLoadBot:
             print(f"Эмоция: {emotion}")
             print("=========================")
             
-            # Сохраняем сообщение для отслеживания изменений
+            # История записывается до завершения обработчика: изменение этого
+            # сообщения обрабатывается только после него и должно ее найти
             await self.message_tracker.track_message(
                 message_id=message.message_id,
                 text=text,
                 sentiment_score=toxicity_score,
                 user_id=user_id,
-                username=message.from_user.username
+                username=username
             )
             
-            # Если контент негативный и токсичный
-            if is_negative and toxicity_score > 0.7:
-                user = await self.user_service.get_or_create_user(user_id, message.from_user.username)
-                warnings_count = await self.user_service.add_warning(user_id)
-                
-                # Удаляем негативное сообщение
-                try:
-                    await context.bot.delete_message(
-                        chat_id=message.chat.id,
-                        message_id=message.message_id
+            # Если контент негативный и токсичный или копирует отклоненный комментарий
+            if self._is_violation(is_negative, toxicity_score, exemplar):
+                self._run_background(self.raid_detector.record_negative(raid_scopes))
+                if duplicate is not None and duplicate.near_seed:
+                    self.near_duplicates.mark_spam(
+                        duplicate.cluster_id, (is_negative, toxicity_score, emotion, exemplar)
                     )
-                    print(f"Удалено негативное сообщение (ID: {message.message_id})")
-                except Exception as e:
-                    print(f"Ошибка при удалении сообщения: {e}")
                 
-                # Отправляем предупреждение в группу обсуждений
-                warning_text = (
-                    f"⚠️ @{message.from_user.username}, ваше сообщение удалено из-за негативного контента.\n"
-                    f"У вас {warnings_count} предупреждений из {MAX_WARNINGS}.\n\n"
-                    f"Анализ удаленного сообщения:\n"
-                    f"- Токсичность: {toxicity_score:.2f}\n"
-                    f"- Эмоция: {emotion}"
+                await self.punish_negative(
+                    session, context.bot.id, message, text, user_id, username,
+                    is_negative, toxicity_score, emotion, is_from_discussion
                 )
-                
-                try:
-                    # Если сообщение было в группе обсуждений, отправляем предупреждение туда же
-                    if is_from_discussion:
-                        await context.bot.send_message(
-                            chat_id=DISCUSSION_GROUP_ID,
-                            text=warning_text,
-                            reply_to_message_id=message.message_id if message.reply_to_message else None
-                        )
-                except Exception as e:
-                    print(f"Ошибка при отправке предупреждения в группу: {e}")
-                
-                # Уведомляем администраторов
-                if ADMIN_CHAT_ID:
-                    try:
-                        await context.bot.send_message(
-                            chat_id=ADMIN_CHAT_ID,
-                            text=f"🚨 Негативное сообщение от @{message.from_user.username}:\n\n"
-                                 f"Текст: {text}\n\n"
-                                 f"Анализ:\n"
-                                 f"- Негативность: {is_negative}\n"
-                                 f"- Токсичность: {toxicity_score:.2f}\n"
-                                 f"- Эмоция: {emotion}\n"
-                                 f"- Предупреждений: {warnings_count}/{MAX_WARNINGS}\n"
-                                 f"Сообщение было автоматически удалено."
-                        )
-                    except Exception as e:
-                        print(f"Ошибка при отправке уведомления администраторам: {e}")
+            
+            # Доверенный пользователь: полный анализ в фоне для выборки комментариев
+            if tier is not None:
+                if random.random() < tier.sample_rate:
+                    self.reputation.record(tier, 'sampled')
+                    self._run_background(self._sampled_analysis(
+                        context.bot.id, message, text, user, username, is_from_discussion
+                    ))
+                else:
+                    self.reputation.record(tier, 'skipped')
+                    await self.record_comment(session, user, message, text, False, 0.0)
+            else:
+                await self.record_comment(session, user, message, text, is_negative, toxicity_score, exemplar)
                     
         except Exception as e:
             print(f"Ошибка в handle_comment: {e}")
             traceback.print_exc()
         finally:
-            self.session.commit()
+            await session.close()
+
+    async def punish_negative(self, session, bot_id: int, message, text: str, user_id: int, username: str,
+                              is_negative: bool, toxicity_score: float, emotion: str,
+                              is_from_discussion: bool) -> None:
+        """Предупреждение, удаление и уведомления для негативного комментария"""
+        # Нарушение сбрасывает доверие до следующего пересчета репутации
+        self.reputation.invalidate(user_id)
+        
+        # Стадия 2: учет предупреждения
+        warnings_count, banned = await self._timed_stage('warning', UserService(session).add_warning(user_id))
+        await self.log_auto_warning(session, bot_id, user_id, banned, {
+            'toxicity': toxicity_score, 'emotion': emotion
+        })
+        
+        # Стадия 3: удаление, предупреждение и уведомление администраторов
+        # ставятся в очередь исходящих действий одновременно и не ждут друг друга
+        with COMMENT_STAGE_SECONDS.labels('actions').time():
+            # При бане сообщение удаляется вместе с остальными недавними сообщениями пользователя
+            if banned:
+                self.purge_recent_messages(user_id)
+                self._run_background(self.register_ban(user_id))
+            else:
+                self.outbound.delete_message(message.chat.id, message.message_id)
+            print(f"Негативное сообщение поставлено на удаление (ID: {message.message_id})")
+            
+            # Если сообщение было в группе обсуждений, отправляем предупреждение туда же
+            if is_from_discussion:
+                self.outbound.send_message(
+                    DISCUSSION_GROUP_ID,
+                    f"⚠️ @{username}, ваше сообщение удалено из-за негативного контента.\n"
+                    f"У вас {warnings_count} предупреждений из {MAX_WARNINGS}.\n\n"
+                    f"Анализ удаленного сообщения:\n"
+                    f"- Токсичность: {toxicity_score:.2f}\n"
+                    f"- Эмоция: {emotion}",
+                    reply_to_message_id=message.message_id if message.reply_to_message else None,
+                    allow_sending_without_reply=True
+                )
+            
+            # Уведомляем администраторов (под нагрузкой - в составе сводки)
+            self.admin_notifier.notify(
+                username,
+                user_id,
+                message.message_thread_id,
+                f"🚨 Негативное сообщение от @{username}:\n\n"
+                f"Текст: {text}",
+                f"Анализ:\n"
+                f"- Негативность: {is_negative}\n"
+                f"- Токсичность: {toxicity_score:.2f}\n"
+                f"- Эмоция: {emotion}\n"
+                f"- Предупреждений: {warnings_count}/{MAX_WARNINGS}\n"
+                f"Сообщение было автоматически удалено."
+            )
+
+    async def _sampled_analysis(self, bot_id: int, message, text: str, user: User, username: str,
+                                is_from_discussion: bool) -> None:
+        """Выборочный полный анализ комментария, принятого по быстрому пути"""
+        user_id = user.telegram_id
+        is_negative, toxicity_score, emotion, exemplar = await self.message_broker.submit(
+            'analysis', user_id, lambda: self._analyze_text(text)
+        )
+        async with Session() as session:
+            if self._is_violation(is_negative, toxicity_score, exemplar):
+                print(f"Выборочный анализ нашел нарушение у доверенного пользователя {user_id}")
+                await self.punish_negative(
+                    session, bot_id, message, text, user_id, username,
+                    is_negative, toxicity_score, emotion, is_from_discussion
+                )
+            await self.record_comment(session, user, message, text, is_negative, toxicity_score, exemplar)
+
+    async def record_comment(self, session, user: User, message, text: str,
+                             is_negative: bool, toxicity_score: float, exemplar: bool = False) -> None:
+        """Запись комментария через буфер: история для репутации и очередь модерации
+
+        Удаленные как нарушения отклоняются сразу, комментарии только с одним из
+        признаков (негатив или токсичность) ждут решения модератора, остальные
+        одобряются.
+        """
+        toxic = toxicity_score > 0.7
+        rejected = self._is_violation(is_negative, toxicity_score, exemplar)
+        try:
+            await CommentService(session, self.write_behind).create_comment(
+                user.id, text, message.message_thread_id, toxicity_score=toxicity_score,
+                is_approved=not (is_negative or toxic),
+                is_rejected=rejected,
+                rejection_reason='Автоматически: негативный контент' if rejected else None
+            )
+        except Exception as e:
+            logger.error(f"Failed to record comment: {e}")
+
+    async def refresh_reputation(self, user: User) -> None:
+        """Пересчет репутации и уровня доверия пользователя"""
+        async with Session() as session:
+            comments, rejected = await UserService(session).get_comment_counts(user)
+        age_days = (datetime.utcnow() - user.created_at).total_seconds() / 86400 if user.created_at else 0
+        score = reputation_score(user.warning_count or 0, comments, rejected, age_days)
+        self.reputation.update(user.telegram_id, score)
 
     async def unban_user(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Разбан пользователя"""
@@ -255,31 +682,33 @@ class HighLoadBot:
             return
             
         username = context.args[0].replace("@", "")
+        session = Session()
         try:
-            user = self.session.query(User).filter_by(username=username).first()
+            user = await UserService(session).get_by_username(username)
             if not user:
                 await update.message.reply_text(f"Пользователь @{username} не найден.")
                 return
                 
             # Сбрасываем счетчик предупреждений и снимаем бан
-            user.warnings_count = 0
+            user.warning_count = 0
+            user.is_banned = False
             user.banned_until = None
-            self.session.commit()
+            await session.commit()
+            await self.ban_index.unban(user.telegram_id)
             
             await update.message.reply_text(f"Пользователь @{username} разбанен.")
             
             # Уведомляем пользователя о разбане
-            try:
-                await context.bot.send_message(
-                    chat_id=user.telegram_id,
-                    text="🎉 Вы были разбанены! Пожалуйста, соблюдайте правила общения."
-                )
-            except Exception as e:
-                logging.error(f"Ошибка при отправке уведомления о разбане: {e}")
+            self.outbound.send_message(
+                user.telegram_id,
+                "🎉 Вы были разбанены! Пожалуйста, соблюдайте правила общения."
+            )
                 
         except Exception as e:
             logging.error(f"Ошибка при разбане пользователя: {e}")
             await update.message.reply_text("Произошла ошибка при разбане пользователя.")
+        finally:
+            await session.close()
 
     async def handle_edited_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка измененных сообщений"""
@@ -327,37 +756,68 @@ class HighLoadBot:
                     print("Измененное сообщение не является комментарием к посту из целевого канала")
                     return
             
-            # Анализируем новый текст
-            is_negative = await self.text_analyzer.is_negative(text)
-            toxicity_score = await self.text_analyzer.get_toxicity_score(text)
-            emotion = await self.text_analyzer.get_emotion(text)
+            # Изменения заблокированных пользователей удаляются без анализа
+            if message.from_user and self.ban_index.is_blocked(message.from_user.id):
+                self.outbound.delete_message(message.chat.id, message.message_id)
+                return
+            
+            # Серия быстрых правок анализируется один раз по последней версии
+            self.edit_debouncer.submit((message.chat.id, message.message_id), (context.bot.id, message, text))
+            
+        except Exception as e:
+            print(f"Ошибка в handle_edited_message: {e}")
+            traceback.print_exc()
+
+    async def process_edit(self, latest: tuple, superseded: list) -> None:
+        """Анализ последней версии измененного сообщения после окончания серии правок"""
+        if self.admission.defer_edits:
+            # Под максимальной нагрузкой повторный анализ изменений ждет ее спада
+            self.admission.defer((latest, superseded))
+            return
+        bot_id, message, text = latest
+        superseded = [earlier_text for _, _, earlier_text in superseded]
+        session = Session()
+        user_service = UserService(session)
+        try:
+            # Промежуточные версии серии правок попадают в историю без анализа
+            for earlier_text in superseded:
+                await self.message_tracker.record_edit(message.message_id, earlier_text)
+            
+            # Анализируем последний текст через очередь модерации изменений
+            is_negative, toxicity_score, emotion, exemplar = await self.message_broker.submit(
+                'moderation',
+                message.from_user.id if message.from_user else message.chat.id,
+                lambda: self._analyze_text(text)
+            )
             
             print(f"\n=== Анализ измененного текста ===")
             print(f"Негативный контент: {is_negative}")
             print(f"Токсичность: {toxicity_score:.2f}")
             print(f"Эмоция: {emotion}")
             print("===============================")
+            await self.message_tracker.record_edit(message.message_id, text, toxicity_score, is_negative)
             
-            # Если контент негативный и токсичный
-            if is_negative and toxicity_score > 0.7:
+            # Если контент негативный и токсичный или копирует отклоненный комментарий
+            if self._is_violation(is_negative, toxicity_score, exemplar):
                 try:
                     # Получаем пользователя
                     user_id = message.from_user.id if message.from_user else None
                     if not user_id:
                         return
                     
-                    user = await self.user_service.get_or_create_user(user_id, message.from_user.username)
-                    warnings_count = await self.user_service.add_warning(user_id)
+                    warnings_count, banned = await user_service.add_warning(
+                        user_id, username=message.from_user.username
+                    )
+                    await self.log_auto_warning(session, bot_id, user_id, banned, {
+                        'toxicity': toxicity_score, 'emotion': emotion, 'edited': True
+                    })
                     
-                    # Удаляем негативное сообщение
-                    try:
-                        await context.bot.delete_message(
-                            chat_id=message.chat.id,
-                            message_id=message.message_id
-                        )
-                        print(f"Удалено негативное измененное сообщение (ID: {message.message_id})")
-                    except Exception as e:
-                        print(f"Ошибка при удалении измененного сообщения: {e}")
+                    # Удаляем негативное сообщение через очередь исходящих действий
+                    self.outbound.delete_message(message.chat.id, message.message_id)
+                    if banned:
+                        self.purge_recent_messages(user_id)
+                        await self.register_ban(user_id)
+                    print(f"Негативное измененное сообщение поставлено на удаление (ID: {message.message_id})")
                     
                     # Отправляем предупреждение в группу обсуждений
                     warning_text = (
@@ -368,66 +828,60 @@ class HighLoadBot:
                         f"- Эмоция: {emotion}"
                     )
                     
-                    try:
-                        await context.bot.send_message(
-                            chat_id=DISCUSSION_GROUP_ID,
-                            text=warning_text
-                        )
-                    except Exception as e:
-                        print(f"Ошибка при отправке предупреждения в группу: {e}")
+                    self.outbound.send_message(DISCUSSION_GROUP_ID, warning_text)
                     
-                    # Уведомляем администраторов
-                    if ADMIN_CHAT_ID:
-                        try:
-                            await context.bot.send_message(
-                                chat_id=ADMIN_CHAT_ID,
-                                text=f"🚨 Негативное измененное сообщение от @{message.from_user.username}:\n\n"
-                                     f"Новый текст: {text}\n\n"
-                                     f"Анализ:\n"
-                                     f"- Негативность: {is_negative}\n"
-                                     f"- Токсичность: {toxicity_score:.2f}\n"
-                                     f"- Эмоция: {emotion}\n"
-                                     f"- Предупреждений: {warnings_count}/{MAX_WARNINGS}\n"
-                                     f"Сообщение было автоматически удалено."
-                            )
-                        except Exception as e:
-                            print(f"Ошибка при отправке уведомления администраторам: {e}")
+                    # Уведомляем администраторов (под нагрузкой - в составе сводки)
+                    self.admin_notifier.notify(
+                        message.from_user.username,
+                        user_id,
+                        message.message_thread_id,
+                        f"🚨 Негативное измененное сообщение от @{message.from_user.username}:\n\n"
+                        f"Новый текст: {text}",
+                        f"Анализ:\n"
+                        f"- Негативность: {is_negative}\n"
+                        f"- Токсичность: {toxicity_score:.2f}\n"
+                        f"- Эмоция: {emotion}\n"
+                        f"- Предупреждений: {warnings_count}/{MAX_WARNINGS}\n"
+                        f"Сообщение было автоматически удалено."
+                    )
                 except Exception as e:
                     print(f"Ошибка при обработке негативного изменения: {e}")
                     traceback.print_exc()
             
         except Exception as e:
-            print(f"Ошибка в handle_edited_message: {e}")
+            print(f"Ошибка в process_edit: {e}")
             traceback.print_exc()
         finally:
-            self.session.commit()
+            await session.close()
 
     async def handle_moderation_action(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка действий модерации (кнопки одобрения/отклонения)"""
         query = update.callback_query
         await query.answer()
         
-        # Получаем данные из callback_data
-        action, comment_id = query.data.split('_')
+        # Получаем данные из callback_data (approve_<id>, reject_<id>, reason_<тип>_<id>)
+        action, comment_id = query.data.rsplit('_', 1)
         comment_id = int(comment_id)
+        session = Session()
+        log_service = ModeratorLogService(session, self.write_behind)
+        comment_service = CommentService(session, self.write_behind)
         
         try:
             # Получаем комментарий
-            comment = self.session.query(Comment).filter_by(id=comment_id).first()
+            comment = await comment_service.get_comment(comment_id)
             if not comment:
                 await query.edit_message_text("Комментарий не найден")
                 return
                 
             # Получаем пользователя
-            user = self.session.query(User).filter_by(id=comment.user_id).first()
+            user = await session.get(User, comment.user_id)
             
             if action == "approve":
                 # Одобряем комментарий
-                self.comment_service.approve_comment(comment, query.from_user.id)
+                await comment_service.approve_comment(comment, query.from_user.id)
                 
                 # Логируем действие
-                log_service = ModeratorLogService(self.session)
-                log_service.log_action(
+                await log_service.log_action(
                     moderator_id=query.from_user.id,
                     action='approve_comment',
                     target_user_id=user.telegram_id,
@@ -435,10 +889,7 @@ class HighLoadBot:
                 )
                 
                 # Уведомляем пользователя
-                await context.bot.send_message(
-                    chat_id=user.telegram_id,
-                    text=MESSAGES['comment_approved']
-                )
+                self.outbound.send_message(user.telegram_id, MESSAGES['comment_approved'])
                 
                 # Обновляем сообщение модератора
                 await query.edit_message_text(
@@ -472,14 +923,29 @@ class HighLoadBot:
                 }
                 reason = reasons.get(reason_type, "нарушение правил")
                 
-                # Отклоняем комментарий
-                self.comment_service.reject_comment(comment, query.from_user.id, reason)
+                # Отклоняем комментарий; его вектор становится образцом для похожих
+                await comment_service.reject_comment(comment, query.from_user.id, reason)
+                self._run_background(self.add_exemplar(comment.id, comment.text, reason))
+                self.reputation.invalidate(user.telegram_id)
                 
                 # Добавляем предупреждение пользователю
-                warnings_count, should_ban = self.user_service.add_warning(user, reason)
+                warnings_count, should_ban = await UserService(session).add_warning(user.telegram_id, reason)
+                
+                if should_ban:
+                    await self.register_ban(user.telegram_id)
+                    await log_service.log_action(
+                        moderator_id=query.from_user.id,
+                        action='user_banned',
+                        target_user_id=user.telegram_id,
+                        details=reason
+                    )
+                
+                # Спам или бан: удаляем остальные недавние сообщения пользователя
+                if should_ban or reason_type == "spam":
+                    self.purge_recent_messages(user.telegram_id)
                 
                 # Логируем действие
-                log_service.log_action(
+                await log_service.log_action(
                     moderator_id=query.from_user.id,
                     action='reject_comment',
                     target_user_id=user.telegram_id,
@@ -488,22 +954,14 @@ class HighLoadBot:
                 )
                 
                 # Уведомляем пользователя
-                await context.bot.send_message(
-                    chat_id=user.telegram_id,
-                    text=MESSAGES['comment_rejected'].format(reason)
-                )
+                self.outbound.send_message(user.telegram_id, MESSAGES['comment_rejected'].format(reason))
                 
                 if should_ban:
-                    await context.bot.send_message(
-                        chat_id=user.telegram_id,
-                        text=MESSAGES['user_banned'].format(24)
-                    )
+                    self.outbound.send_message(user.telegram_id, MESSAGES['user_banned'].format(24))
                 else:
-                    await context.bot.send_message(
-                        chat_id=user.telegram_id,
-                        text=MESSAGES['user_warning'].format(
-                            reason, warnings_count, MAX_WARNINGS
-                        )
+                    self.outbound.send_message(
+                        user.telegram_id,
+                        MESSAGES['user_warning'].format(reason, warnings_count, MAX_WARNINGS)
                     )
                 
                 # Обновляем сообщение модератора
@@ -517,22 +975,32 @@ class HighLoadBot:
         except Exception as e:
             logger.error(f"Error handling moderation action: {e}")
             await query.edit_message_text(f"Произошла ошибка: {e}")
+        finally:
+            await session.close()
 
     async def show_stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
-            log_service = ModeratorLogService(self.session)
-            
-            # Получаем статистику за последние 24 часа
-            stats_24h = log_service.get_moderation_stats(
-                from_date=datetime.utcnow() - timedelta(days=1)
-            )
-            
-            # Получаем общую статистику
-            stats_total = log_service.get_moderation_stats()
+            async with Session() as session:
+                log_service = ModeratorLogService(session)
+                
+                # Получаем статистику за последние 24 часа
+                stats_24h = await log_service.get_moderation_stats(
+                    from_date=datetime.utcnow() - timedelta(days=1)
+                )
+                
+                # Получаем общую статистику
+                stats_total = await log_service.get_moderation_stats()
             
             # Получаем статистику изменений
             edit_stats = await self.message_tracker.get_edit_statistics()
             
+            # Статистика локального кэша
+            cache_stats = self.message_broker.get_cache_stats()
+            
+            # Быстрый путь для доверенных пользователей
+            trust_stats = self.reputation.stats
+            raids = self.raid_detector.active_raids()
+            
             stats_message = (
                 "📊 Статистика модерации\n\n"
                 "За последние 24 часа:\n"
@@ -550,7 +1018,18 @@ class HighLoadBot:
                 "Статистика изменений:\n"
                 f"📝 Отслеживается сообщений: {edit_stats['total_tracked_messages']}\n"
                 f"✏️ Всего изменений: {edit_stats['total_edits']}\n"
-                f"⚠️ Подозрительных изменений: {edit_stats['suspicious_edits']}"
+                f"⚠️ Подозрительных изменений: {edit_stats['suspicious_edits']}\n\n"
+                "Локальный кэш:\n"
+                f"🗂 Записей: {cache_stats['items']}\n"
+                f"🎯 Доля попаданий: {cache_stats['hit_ratio']:.1%}\n\n"
+                "Доверенные пользователи:\n"
+                f"⚡️ Без полного анализа: {trust_stats['skipped']}\n"
+                f"🔍 Выборочно проверено: {trust_stats['sampled']}\n"
+                f"⬆️ Передано на полный анализ: {trust_stats['escalated']}\n"
+                f"⏱ Сэкономлено инференса: {trust_stats['saved_seconds']:.0f} с\n\n"
+                f"🛡 Режим рейда: {', '.join(raids) if raids else 'выключен'}\n"
+                f"⚙️ Уровень анализа: {self.admission.level_name} "
+                f"(очереди: {self.admission.load['depth']}, ожидание: {self.admission.load['age']:.1f} с)"
             )
             
             await update.message.reply_text(stats_message)
@@ -559,6 +1038,143 @@ class HighLoadBot:
             logger.error(f"Error showing stats: {e}")
             await update.message.reply_text("Произошла ошибка при получении статистики")
 
+    async def _review_page(self, queue: str, after=None, before=None) -> tuple:
+        """Текст и клавиатура страницы очереди модерации"""
+        async with Session() as session:
+            comment_service = CommentService(session)
+            if queue == 'pending':
+                page = await comment_service.get_pending_comments(REVIEW_PAGE_SIZE, after, before)
+                title = "🕓 Комментарии на модерации"
+                lines = [
+                    f"#{row.id} {row.created_at:%d.%m %H:%M} @{row.username or row.user_id}\n"
+                    f"{self._shorten(row.text)}"
+                    for row in page.rows
+                ]
+            else:
+                page = await comment_service.get_suspicious_edits(REVIEW_PAGE_SIZE, after=after, before=before)
+                title = "⚠️ Подозрительные изменения"
+                lines = [
+                    f"#{row.comment_id} {row.created_at:%d.%m %H:%M}\n"
+                    f"Было: {self._shorten(row.old_text)}\n"
+                    f"Стало: {self._shorten(row.new_text)}"
+                    for row in page.rows
+                ]
+        
+        if not lines:
+            return f"{title}: записей нет", None
+        return f"{title}:\n\n" + "\n\n".join(lines), self._page_keyboard(queue, page)
+
+    @staticmethod
+    def _shorten(text: str, limit: int = 150) -> str:
+        text = text or ""
+        return text if len(text) <= limit else text[:limit - 1] + "…"
+
+    @staticmethod
+    def _page_keyboard(queue: str, page: Page):
+        # Курсор передается в callback_data: page:<очередь>:<prev|next>:<курсор>
+        buttons = []
+        if page.prev_cursor:
+            buttons.append(InlineKeyboardButton(
+                "⬅️ Назад", callback_data=f"page:{queue}:prev:{encode_cursor(page.prev_cursor)}"
+            ))
+        if page.next_cursor:
+            buttons.append(InlineKeyboardButton(
+                "Далее ➡️", callback_data=f"page:{queue}:next:{encode_cursor(page.next_cursor)}"
+            ))
+        return InlineKeyboardMarkup([buttons]) if buttons else None
+
+    async def show_pending(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Очередь комментариев на модерации"""
+        # Очередь модерации видна только администраторам
+        if not self._is_admin_chat(update):
+            return
+        try:
+            text, markup = await self._review_page('pending')
+            await update.message.reply_text(text, reply_markup=markup)
+        except Exception as e:
+            logger.error(f"Error showing pending comments: {e}")
+            await update.message.reply_text("Произошла ошибка при получении очереди модерации")
+
+    async def show_suspicious(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Подозрительные изменения комментариев"""
+        try:
+            text, markup = await self._review_page('suspicious')
+            await update.message.reply_text(text, reply_markup=markup)
+        except Exception as e:
+            logger.error(f"Error showing suspicious edits: {e}")
+            await update.message.reply_text("Произошла ошибка при получении подозрительных изменений")
+
+    async def handle_page(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Переход между страницами очереди (кнопки Назад/Далее)"""
+        query = update.callback_query
+        await query.answer()
+        try:
+            _, queue, direction, cursor = query.data.split(':', 3)
+            cursor = decode_cursor(cursor)
+            if direction == 'next':
+                text, markup = await self._review_page(queue, after=cursor)
+            else:
+                text, markup = await self._review_page(queue, before=cursor)
+            await query.edit_message_text(text, reply_markup=markup)
+        except Exception as e:
+            logger.error(f"Error handling page callback: {e}")
+
+    async def show_clusters(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Крупнейшие кластеры похожих комментариев"""
+        stats = self.near_duplicates.get_stats()
+        clusters = self.near_duplicates.top_clusters()
+        lines = [
+            f"{'🚫' if cluster['spam'] else '🔁'} {cluster['size']} сообщений от {cluster['users']} пользователей, "
+            f"{cluster['age'] / 60:.0f} мин, последнее {cluster['idle'] / 60:.0f} мин назад\n"
+            f"{self._shorten(cluster['sample'], 100)}"
+            for cluster in clusters
+        ]
+        await update.message.reply_text(
+            "🧬 Похожие комментарии\n\n"
+            f"Отпечатков в окне: {stats['entries']}\n"
+            f"Кластеров: {stats['clusters']}, из них рассылок: {stats['spam_clusters']}\n\n"
+            + ("\n\n".join(lines) if lines else "Повторяющихся комментариев нет")
+        )
+
+    @staticmethod
+    def _is_admin_chat(update: Update) -> bool:
+        """Команда отправлена из чата администраторов"""
+        return bool(ADMIN_CHAT_ID) and update.effective_chat is not None \
+            and str(update.effective_chat.id) == str(ADMIN_CHAT_ID)
+
+    async def find_similar(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Поиск отклоненных комментариев, похожих на текст или на сообщение в ответе"""
+        # Тексты отклоненных комментариев видны только администраторам
+        if not self._is_admin_chat(update):
+            return
+        reply = update.message.reply_to_message
+        text = " ".join(context.args) if context.args else (reply.text or reply.caption if reply else None)
+        if not text:
+            await update.message.reply_text(
+                "Укажите текст или ответьте командой на сообщение.\n"
+                "Пример: /similar текст комментария"
+            )
+            return
+        
+        try:
+            embedding = await self.text_analyzer.embed(text)
+            if embedding is None:
+                await update.message.reply_text("Поиск недоступен: модели не загружены")
+                return
+            matches = self.exemplars.search(embedding, k=5)
+            lines = [
+                f"{match['score']:.3f} #{match['comment_id']} ({match['reason']})\n"
+                f"{self._shorten(match['text'], 100)}"
+                for match in matches
+            ]
+            await update.message.reply_text(
+                f"🔎 Похожие отклоненные комментарии (образцов: {len(self.exemplars)}):\n\n"
+                + ("\n\n".join(lines) if lines else "Образцов пока нет")
+            )
+        except Exception as e:
+            logger.error(f"Error searching similar comments: {e}")
+            await update.message.reply_text("Произошла ошибка при поиске похожих комментариев")
+
     async def cleanup_task(self):
         """Периодическая очистка старых записей"""
         try:
@@ -571,17 +1187,26 @@ class HighLoadBot:
     async def cleanup_task_wrapper(self, context):
         await self.cleanup_task()
 
-    def __del__(self):
-        """Закрываем сессию при удалении объекта"""
-        if hasattr(self, 'session'):
-            self.session.close()
+    async def partition_maintenance(self):
+        """Создание разделов на будущие месяцы и удаление устаревших"""
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(
+                    maintain_partitions, PARTITION_PREMAKE_MONTHS,
+                    PARTITION_RETENTION_MONTHS, PARTITION_ARCHIVE
+                )
+        except Exception as e:
+            logger.error(f"Error in partition maintenance: {e}")
+
+    async def partition_maintenance_wrapper(self, context):
+        await self.partition_maintenance()
 
 async def setup_bot(application: Application):
     """Настройка бота перед запуском"""
     try:
-        # Проверяем webhook
+        # В режиме polling webhook должен быть удален
         webhook_info = await application.bot.get_webhook_info()
-        if webhook_info.url:
+        if webhook_info.url and BOT_MODE != 'webhook':
             print(f"\n🔄 Удаляем существующий webhook: {webhook_info.url}")
             await application.bot.delete_webhook()
         
@@ -640,12 +1265,60 @@ async def setup_bot(application: Application):
         print(f"• ADMIN_CHAT_ID: {ADMIN_CHAT_ID}")
         print(f"• Разрешенные обновления: channel_post, edited_channel_post, message, edited_message, callback_query")
         print(f"• Игнорирование старых обновлений: True")
-        print(f"• Таймаут: 30 секунд")
+        if BOT_MODE == 'webhook':
+            print(f"• Режим: webhook ({WEBHOOK_URL}{WEBHOOK_PATH})")
+        else:
+            print(f"• Режим: polling, таймаут 30 секунд")
         
     except Exception as e:
         print(f"\n❌ Ошибка при настройке бота: {e}")
         raise
 
+ALLOWED_UPDATES = [
+    "message",
+    "edited_message",
+    "channel_post",
+    "edited_channel_post",
+    "callback_query"
+]
+
+async def run_webhook(application: Application):
+    """Запуск бота в режиме webhook на сервере aiohttp"""
+    if not WEBHOOK_URL:
+        raise ValueError("WEBHOOK_URL must be set when BOT_MODE=webhook")
+    
+    # Без секрета любой, кто знает адрес, может прислать поддельное обновление
+    secret_token = WEBHOOK_SECRET
+    if not secret_token:
+        secret_token = secrets.token_urlsafe(32)
+        logger.warning("WEBHOOK_SECRET is not set, using a random secret for this process; "
+                       "set WEBHOOK_SECRET when running several replicas")
+    
+    server = WebhookServer(application, WEBHOOK_PATH, secret_token, WEBHOOK_HOST, WEBHOOK_PORT)
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.bot.set_webhook(
+            url=f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+            secret_token=secret_token,
+            allowed_updates=ALLOWED_UPDATES,
+            drop_pending_updates=True
+        )
+        await application.start()
+        await server.start()
+        try:
+            await stop_event.wait()
+        finally:
+            await server.stop()
+            await application.stop()
+            if application.post_shutdown:
+                await application.post_shutdown(application)
+
 def main():
     """Запуск бота"""
     nest_asyncio.apply()
@@ -655,26 +1328,51 @@ def main():
     
     # Создание и настройка бота
     bot = HighLoadBot()
-    application = Application.builder().token(BOT_TOKEN).build()
+    update_processor = OrderedUpdateProcessor(UPDATE_CONCURRENCY, UPDATE_MAX_PENDING)
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .update_queue(update_processor.update_queue)
+        .concurrent_updates(update_processor)
+        .post_init(bot.on_startup)
+        .post_shutdown(bot.on_shutdown)
+        .build()
+    )
+    
+    # Экспорт метрик Prometheus
+    start_http_server(METRICS_PORT)
+    
+    # Обслуживание разделов журнала: сразу после запуска и затем периодически
+    if application.job_queue:
+        application.job_queue.run_repeating(
+            bot.partition_maintenance_wrapper, interval=PARTITION_MAINTENANCE_INTERVAL, first=0
+        )
+    else:
+        logger.warning("JobQueue is not available, partition maintenance is disabled")
     
     # Добавление обработчиков команд
     application.add_handler(CommandHandler("start", bot.start))
     application.add_handler(CommandHandler("stats", bot.show_stats))
     application.add_handler(CommandHandler("unban_user", bot.unban_user))
     application.add_handler(CommandHandler("get_chat_id", bot.get_chat_id))
+    application.add_handler(CommandHandler("pending", bot.show_pending))
+    application.add_handler(CommandHandler("suspicious", bot.show_suspicious))
+    application.add_handler(CommandHandler("clusters", bot.show_clusters))
+    application.add_handler(CommandHandler("similar", bot.find_similar))
+    
+    # Обработчики выполняются внутри OrderedUpdateProcessor, который сам
+    # распараллеливает обновления, поэтому block=False не используется
     
     # Обработчики сообщений канала
     application.add_handler(MessageHandler(
         filters.ChatType.CHANNEL & filters.UpdateType.CHANNEL_POST,
-        bot.handle_comment,
-        block=False
+        bot.handle_comment
     ))
     
     # Обработчик редактирования сообщений канала
     application.add_handler(MessageHandler(
         filters.ChatType.CHANNEL & filters.UpdateType.EDITED_CHANNEL_POST,
-        bot.handle_edited_message,
-        block=False
+        bot.handle_edited_message
     ))
     
     # Обработчики для группы обсуждений
@@ -682,25 +1380,24 @@ def main():
         # Обработчик новых сообщений
         application.add_handler(MessageHandler(
             filters.Chat(chat_id=int(DISCUSSION_GROUP_ID)) & filters.TEXT,
-            bot.handle_comment,
-            block=False
+            bot.handle_comment
         ))
         
         # Обработчик редактирования сообщений
         application.add_handler(MessageHandler(
             filters.Chat(chat_id=int(DISCUSSION_GROUP_ID)) & filters.UpdateType.EDITED_MESSAGE,
-            bot.handle_edited_message,
-            block=False
+            bot.handle_edited_message
         ))
     
     # Обработчик обычных сообщений (не из канала)
     application.add_handler(MessageHandler(
         filters.TEXT & ~filters.COMMAND & ~filters.ChatType.CHANNEL,
-        bot.handle_comment,
-        block=False
+        bot.handle_comment
     ))
     
-    # Добавляем обработчик callback кнопок
+    # Добавляем обработчик callback кнопок; листание очередей регистрируется
+    # раньше общего обработчика модерации
+    application.add_handler(CallbackQueryHandler(bot.handle_page, pattern=r'^page:'))
     application.add_handler(CallbackQueryHandler(bot.handle_moderation_action))
     
     logging.info(
@@ -714,15 +1411,13 @@ def main():
     # Настройка и проверка бота перед запуском
     asyncio.get_event_loop().run_until_complete(setup_bot(application))
     
+    if BOT_MODE == 'webhook':
+        asyncio.get_event_loop().run_until_complete(run_webhook(application))
+        return
+    
     # Запуск бота с разрешением всех типов обновлений
     application.run_polling(
-        allowed_updates=[
-            "message",
-            "edited_message",
-            "channel_post",
-            "edited_channel_post",
-            "callback_query"
-        ],
+        allowed_updates=ALLOWED_UPDATES,
         drop_pending_updates=True,
         timeout=30,
         read_timeout=30,
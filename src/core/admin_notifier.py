@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import time
+from collections import Counter as CounterDict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+from prometheus_client import Counter, Gauge
+
+ADMIN_ALERTS = Counter('admin_alerts_total', 'Уведомления администраторам', ['mode'])
+ADMIN_DIGEST_MODE = Gauge('admin_digest_mode', 'Режим сводок для администраторов (1 - включен)')
+ADMIN_MODE_SWITCHES = Counter('admin_digest_switches_total', 'Переключения режима уведомлений', ['mode'])
+
+
+class AdminNotifier:
+    """Уведомления администраторов с переходом в режим сводок под нагрузкой
+
+    Пока уведомлений за окно window_seconds меньше threshold, каждое
+    отправляется отдельным сообщением. При превышении порога события
+    накапливаются и раз в digest_interval секунд одно сводное сообщение
+    редактируется: счетчики по пользователям и постам и несколько примеров.
+    Обратное переключение происходит, когда поток падает ниже половины порога.
+    """
+
+    def __init__(self, outbound, chat_id: Any, threshold: int = 10, window_seconds: float = 60,
+                 digest_interval: float = 30, top: int = 5):
+        self.outbound = outbound
+        self.chat_id = chat_id
+        self.threshold = threshold
+        self.window_seconds = window_seconds
+        self.digest_interval = digest_interval
+        self.top = top
+        self.digest_mode = False
+        self._events: Deque[float] = deque()
+        self._task: Optional[asyncio.Task] = None
+        self._reset_digest()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.digest_mode and self._dirty:
+            await self._flush()
+
+    def notify(self, username: str, user_id: int, post_id: Optional[int],
+               text: str, details: str) -> None:
+        """Уведомление о нарушении; отправляется сразу или попадает в сводку"""
+        if not self.chat_id:
+            return
+        now = time.monotonic()
+        self._events.append(now)
+        self._update_mode(now)
+
+        if not self.digest_mode:
+            ADMIN_ALERTS.labels('individual').inc()
+            self.outbound.send_message(self.chat_id, f"{text}\n\n{details}" if details else text)
+            return
+
+        ADMIN_ALERTS.labels('digest').inc()
+        user_key = f"@{username}" if username else str(user_id)
+        self._total += 1
+        self._by_user[user_key] += 1
+        if post_id:
+            self._by_post[post_id] += 1
+        if len(self._examples) < self.top:
+            self._examples.append(f"{user_key}: {text[:200]}")
+        self._dirty = True
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'digest_mode': self.digest_mode,
+            'events_in_window': len(self._events),
+            'digest_total': self._total
+        }
+
+    def _update_mode(self, now: float) -> None:
+        while self._events and self._events[0] < now - self.window_seconds:
+            self._events.popleft()
+        rate = len(self._events)
+        if not self.digest_mode and rate > self.threshold:
+            self.digest_mode = True
+            self._started_at = datetime.now()
+            ADMIN_DIGEST_MODE.set(1)
+            ADMIN_MODE_SWITCHES.labels('digest').inc()
+            logging.info(f"Admin notifications switched to digest mode ({rate} alerts in window)")
+        elif self.digest_mode and rate <= self.threshold // 2:
+            self.digest_mode = False
+            ADMIN_DIGEST_MODE.set(0)
+            ADMIN_MODE_SWITCHES.labels('individual').inc()
+            logging.info("Admin notifications switched back to individual alerts")
+
+    def _reset_digest(self) -> None:
+        self._total = 0
+        self._by_user: CounterDict = CounterDict()
+        self._by_post: CounterDict = CounterDict()
+        self._examples: List[str] = []
+        self._summary_message_id: Optional[int] = None
+        self._started_at = datetime.now()
+        self._dirty = False
+
+    def _render(self, final: bool = False) -> str:
+        lines = [
+            f"📋 Сводка нарушений с {self._started_at.strftime('%H:%M:%S')}"
+            f"{' (завершена)' if final else ''}",
+            f"Всего: {self._total}",
+            "",
+            "По пользователям:"
+        ]
+        lines += [f"• {user}: {count}" for user, count in self._by_user.most_common(self.top)]
+        if self._by_post:
+            lines += ["", "По постам:"]
+            lines += [f"• {post}: {count}" for post, count in self._by_post.most_common(self.top)]
+        if self._examples:
+            lines += ["", "Примеры:"]
+            lines += [f"• {example}" for example in self._examples]
+        return "\n".join(lines)[:4000]
+
+    async def _flush(self) -> None:
+        """Отправка или обновление сводного сообщения"""
+        final = not self.digest_mode
+        text = self._render(final)
+        self._dirty = False
+        if self._summary_message_id is None:
+            message = await self.outbound.send_message(self.chat_id, text)
+            self._summary_message_id = message.message_id if message else None
+        else:
+            await self.outbound.edit_message_text(self.chat_id, self._summary_message_id, text)
+        if final:
+            self._reset_digest()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.digest_interval)
+            try:
+                self._update_mode(time.monotonic())
+                if self._dirty or (not self.digest_mode and self._total):
+                    await self._flush()
+            except Exception as e:
+                logging.error(f"Error flushing admin digest: {e}")
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Sequence
+
+from prometheus_client import Counter, Gauge
+
+# Уровни деградации по возрастанию нагрузки
+LEVEL_FULL = 0
+# Без модели эмоций
+LEVEL_NO_EMOTION = 1
+# Сначала правила; модель токсичности только для текстов, отмеченных правилами
+LEVEL_CASCADE = 2
+# Дополнительно повторный анализ изменений откладывается до спада нагрузки
+LEVEL_DEFER_EDITS = 3
+LEVEL_NAMES = ('full', 'no_emotion', 'cascade', 'defer_edits')
+
+ADMISSION_LEVEL = Gauge('admission_degradation_level', 'Текущий уровень деградации анализа')
+ADMISSION_TRANSITIONS = Counter('admission_transitions_total', 'Переходы на уровень деградации', ['level'])
+ADMISSION_DEGRADED = Counter('admission_degraded_total', 'Анализы, упрощенные или отложенные под нагрузкой', ['level'])
+ADMISSION_DEFERRED = Gauge('admission_deferred_edits', 'Изменения сообщений, отложенные до спада нагрузки')
+
+SchedulerStats = Callable[[], Dict[str, Dict[str, float]]]
+LevelListener = Callable[[int, int, Dict[str, float]], Awaitable[None]]
+
+
+class AdmissionController:
+    """Постепенная деградация анализа по нагрузке планировщика
+
+    Раз в interval секунд по статистике планировщика считается суммарная
+    глубина очередей и возраст старейшей задачи. Уровень повышается сразу,
+    как только превышен порог depth_thresholds[i] или age_thresholds[i], а
+    понижается на один шаг, когда нагрузка не меньше hold_seconds держится
+    ниже recover_ratio от порогов текущего уровня. Пока действует уровень
+    LEVEL_DEFER_EDITS, изменения сообщений копятся в очереди (не больше
+    max_deferred) и обрабатываются после спада нагрузки или при остановке.
+    """
+
+    def __init__(self, get_stats: SchedulerStats, depth_thresholds: Sequence[float] = (50, 200, 500),
+                 age_thresholds: Sequence[float] = (2, 5, 15), recover_ratio: float = 0.5,
+                 hold_seconds: float = 30, interval: float = 1.0, max_deferred: int = 10000,
+                 on_change: Optional[LevelListener] = None,
+                 on_drain: Optional[Callable[[Any], Awaitable[None]]] = None, drain_batch: int = 8):
+        if len(depth_thresholds) != len(age_thresholds):
+            raise ValueError("depth_thresholds and age_thresholds must have the same length")
+        self.get_stats = get_stats
+        self.depth_thresholds = list(depth_thresholds)
+        self.age_thresholds = list(age_thresholds)
+        self.recover_ratio = recover_ratio
+        self.hold_seconds = hold_seconds
+        self.interval = interval
+        self.on_change = on_change
+        self.on_drain = on_drain
+        self.drain_batch = drain_batch
+        self.level = LEVEL_FULL
+        self.load: Dict[str, float] = {'depth': 0, 'age': 0.0}
+        self._deferred: Deque[Any] = deque(maxlen=max_deferred)
+        self._calm_since: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._drain_task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def level_name(self) -> str:
+        return LEVEL_NAMES[self.level]
+
+    @property
+    def defer_edits(self) -> bool:
+        # При остановке откладывать изменения уже некуда
+        return self.level >= LEVEL_DEFER_EDITS and not self._stopping
+
+    def record_degraded(self) -> None:
+        """Учет анализа, выполненного не в полном объеме"""
+        ADMISSION_DEGRADED.labels(self.level_name).inc()
+
+    def defer(self, item: Any) -> None:
+        """Отложить повторный анализ до спада нагрузки (старейшие вытесняются)"""
+        self._deferred.append(item)
+        self.record_degraded()
+        ADMISSION_DEFERRED.set(len(self._deferred))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановка пересчета уровня и обработка всех отложенных изменений"""
+        self._stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._drain_task is not None:
+            await asyncio.gather(self._drain_task, return_exceptions=True)
+        if self._deferred:
+            logging.info(f"Processing {len(self._deferred)} deferred edits on shutdown")
+        while self._deferred:
+            await self._drain_batch()
+
+    def measure(self) -> Dict[str, float]:
+        """Суммарная глубина очередей и возраст старейшей задачи"""
+        stats = self.get_stats().values()
+        return {
+            'depth': sum(queue['depth'] for queue in stats),
+            'age': max((queue['oldest_age'] for queue in stats), default=0.0)
+        }
+
+    def target_level(self, load: Dict[str, float], ratio: float = 1.0) -> int:
+        """Уровень, пороги которого превышены (ratio масштабирует пороги)"""
+        level = LEVEL_FULL
+        for index, (depth, age) in enumerate(zip(self.depth_thresholds, self.age_thresholds)):
+            if load['depth'] >= depth * ratio or load['age'] >= age * ratio:
+                level = index + 1
+        return level
+
+    async def update(self, now: Optional[float] = None) -> int:
+        """Пересчет уровня по текущей нагрузке"""
+        now = time.monotonic() if now is None else now
+        self.load = load = self.measure()
+        level = self.level
+        target = self.target_level(load)
+        if target > level:
+            level = target
+            self._calm_since = None
+        elif level > LEVEL_FULL and self.target_level(load, self.recover_ratio) < level:
+            if self._calm_since is None:
+                self._calm_since = now
+            elif now - self._calm_since >= self.hold_seconds:
+                level -= 1
+                self._calm_since = now
+        else:
+            self._calm_since = None
+
+        if level != self.level:
+            previous, self.level = self.level, level
+            ADMISSION_LEVEL.set(level)
+            ADMISSION_TRANSITIONS.labels(self.level_name).inc()
+            logging.warning(f"Analysis degradation level {LEVEL_NAMES[previous]} -> {self.level_name}, load {load}")
+            if self.on_change is not None:
+                try:
+                    await self.on_change(previous, level, load)
+                except Exception as e:
+                    logging.error(f"Failed to report degradation level: {e}")
+        return self.level
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.update()
+                # Отложенные изменения разбираются пачками, не задерживая пересчет уровня
+                if self._deferred and not self.defer_edits and \
+                        (self._drain_task is None or self._drain_task.done()):
+                    self._drain_task = asyncio.create_task(self._drain_batch())
+            except Exception as e:
+                logging.error(f"Admission controller update failed: {e}")
+
+    async def _drain_batch(self) -> None:
+        """Обработка части отложенных изменений; остальные - на следующих шагах"""
+        batch = [self._deferred.popleft() for _ in range(min(self.drain_batch, len(self._deferred)))]
+        ADMISSION_DEFERRED.set(len(self._deferred))
+        if self.on_drain is not None:
+            await asyncio.gather(*(self.on_drain(item) for item in batch), return_exceptions=True)
@@ -0,0 +1,152 @@
+import asyncio
+import heapq
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from prometheus_client import Counter, Gauge
+
+BAN_INDEX_USERS = Gauge('ban_index_users', 'Пользователи в индексе ограничений', ['kind'])
+BAN_INDEX_BLOCKED = Counter('ban_index_blocked_total', 'Сообщения, отклоненные по индексу ограничений')
+
+# Загрузчик ограничений из БД: (telegram_id, banned_until, is_in_blacklist)
+RestrictionLoader = Callable[[], Awaitable[Iterable[Tuple[int, Optional[datetime], bool]]]]
+
+
+class BanIndex:
+    """Индекс заблокированных пользователей и черного списка в памяти процесса
+
+    Проверка выполняется за O(1) без обращения к БД. Истекшие баны снимаются
+    по куче сроков окончания. Изменения рассылаются другим репликам через
+    канал брокера; после (пере)подключения к каналу индекс перезагружается
+    из БД, так как за время разрыва изменения могли быть пропущены.
+    """
+
+    def __init__(self, backend, channel: str, loader: RestrictionLoader):
+        self.backend = backend
+        self.channel = channel
+        self.loader = loader
+        self.instance_id = uuid.uuid4().hex
+        self._blacklist: Set[int] = set()
+        # telegram_id -> окончание бана (UTC), None - бессрочно
+        self._banned: Dict[int, Optional[datetime]] = {}
+        self._expiry: List[Tuple[datetime, int]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        await self.reload()
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def reload(self) -> None:
+        """Полная загрузка ограничений из БД"""
+        rows = await self.loader()
+        self._blacklist.clear()
+        self._banned.clear()
+        self._expiry.clear()
+        for telegram_id, banned_until, is_in_blacklist in rows:
+            if is_in_blacklist:
+                self._blacklist.add(telegram_id)
+            else:
+                self._set_ban(telegram_id, banned_until)
+        self._update_gauges()
+        logging.info(f"Ban index loaded: {len(self._banned)} banned, {len(self._blacklist)} blacklisted")
+
+    def is_blocked(self, user_id: int) -> bool:
+        """Заблокирован ли пользователь или находится в черном списке"""
+        if user_id in self._blacklist:
+            BAN_INDEX_BLOCKED.inc()
+            return True
+        if user_id not in self._banned:
+            return False
+        self._expire(datetime.utcnow())
+        if user_id in self._banned:
+            BAN_INDEX_BLOCKED.inc()
+            return True
+        return False
+
+    async def ban(self, user_id: int, until: Optional[datetime]) -> None:
+        self._set_ban(user_id, until)
+        self._update_gauges()
+        await self._publish('ban', user_id, until.replace(tzinfo=timezone.utc).timestamp() if until else '')
+
+    async def unban(self, user_id: int) -> None:
+        self._banned.pop(user_id, None)
+        self._blacklist.discard(user_id)
+        self._update_gauges()
+        await self._publish('unban', user_id)
+
+    async def blacklist(self, user_id: int) -> None:
+        self._blacklist.add(user_id)
+        self._update_gauges()
+        await self._publish('blacklist', user_id)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'banned': len(self._banned), 'blacklisted': len(self._blacklist)}
+
+    def _set_ban(self, user_id: int, until: Optional[datetime]) -> None:
+        self._banned[user_id] = until
+        if until is not None:
+            heapq.heappush(self._expiry, (until, user_id))
+
+    def _expire(self, now: datetime) -> None:
+        expired = False
+        while self._expiry and self._expiry[0][0] <= now:
+            until, user_id = heapq.heappop(self._expiry)
+            # Запись в куче могла устареть после повторного бана
+            if self._banned.get(user_id) == until:
+                del self._banned[user_id]
+                expired = True
+        if expired:
+            self._update_gauges()
+
+    def _update_gauges(self) -> None:
+        BAN_INDEX_USERS.labels('banned').set(len(self._banned))
+        BAN_INDEX_USERS.labels('blacklisted').set(len(self._blacklist))
+
+    async def _publish(self, action: str, user_id: int, arg='') -> None:
+        try:
+            await self.backend.publish(self.channel, f"{self.instance_id}:{action}:{user_id}:{arg}")
+        except Exception as e:
+            logging.error(f"Failed to publish ban index update: {e}")
+
+    def _apply(self, data: str) -> None:
+        origin, action, user_id, arg = data.split(':', 3)
+        if origin == self.instance_id:
+            return
+        user_id = int(user_id)
+        if action == 'ban':
+            # Время окончания передается как UTC timestamp
+            self._set_ban(user_id, datetime.utcfromtimestamp(float(arg)) if arg else None)
+        elif action == 'unban':
+            self._banned.pop(user_id, None)
+            self._blacklist.discard(user_id)
+        elif action == 'blacklist':
+            self._blacklist.add(user_id)
+        self._update_gauges()
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async for data in self.backend.subscribe(self.channel):
+                    try:
+                        self._apply(data)
+                    except ValueError:
+                        logging.warning(f"Invalid ban index message: {data}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Ban index listener failed: {e}")
+            await asyncio.sleep(1)
+            # За время разрыва подписки изменения могли быть пропущены
+            try:
+                await self.reload()
+            except Exception as e:
+                logging.error(f"Failed to reload ban index: {e}")
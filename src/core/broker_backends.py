@@ -0,0 +1,297 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from redis import Redis
+from redis import asyncio as aioredis
+from rq import Queue
+
+# Порядок выборки очередей: срочные сообщения обрабатываются первыми
+QUEUE_PRIORITY = ('priority', 'analysis', 'moderation')
+
+
+class BrokerBackend:
+    """Интерфейс хранилища брокера: кэш, pub/sub и очереди задач"""
+
+    # Удаленное хранилище, для которого имеет смысл локальный кэш процесса
+    remote = False
+
+    async def get(self, key: str) -> Tuple[Optional[bytes], int]:
+        """Значение и оставшийся TTL в секундах (-1 без TTL)"""
+        raise NotImplementedError
+
+    async def set(self, key: str, data: bytes, expire: Optional[int] = None) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def incr(self, key: str, amount: int = 1, expire: Optional[int] = None) -> int:
+        """Увеличение счетчика; возвращает новое значение"""
+        raise NotImplementedError
+
+    async def get_counters(self, keys: Sequence[str]) -> List[int]:
+        """Значения счетчиков (0 для отсутствующих)"""
+        raise NotImplementedError
+
+    async def pfadd(self, key: str, *values: Any, expire: Optional[int] = None) -> None:
+        """Добавление элементов в оценку числа уникальных (HyperLogLog)"""
+        raise NotImplementedError
+
+    async def pfcount(self, *keys: str) -> int:
+        """Оценка числа уникальных элементов в объединении ключей"""
+        raise NotImplementedError
+
+    async def publish(self, channel: str, message: str) -> None:
+        raise NotImplementedError
+
+    def subscribe(self, channel: str) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    async def enqueue(self, queue: str, payload: Dict[str, Any]) -> str:
+        raise NotImplementedError
+
+    async def fetch_result(self, job_id: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisBackend(BrokerBackend):
+    """Хранилище на Redis: кэш и pub/sub через redis.asyncio, очереди через RQ"""
+
+    remote = True
+
+    def __init__(self, url: str, password: Optional[str] = None):
+        self.redis = Redis.from_url(url, password=password)
+        self.queues = {name: Queue(name, connection=self.redis) for name in QUEUE_PRIORITY}
+        self.aioredis = aioredis.from_url(url, password=password)
+
+    def ping(self) -> bool:
+        return self.redis.ping()
+
+    async def get(self, key: str) -> Tuple[Optional[bytes], int]:
+        async with self.aioredis.pipeline(transaction=False) as pipe:
+            data, ttl = await pipe.get(key).ttl(key).execute()
+        return data, ttl
+
+    async def set(self, key: str, data: bytes, expire: Optional[int] = None) -> None:
+        await self.aioredis.set(key, data, ex=expire)
+
+    async def delete(self, key: str) -> None:
+        await self.aioredis.delete(key)
+
+    async def incr(self, key: str, amount: int = 1, expire: Optional[int] = None) -> int:
+        async with self.aioredis.pipeline(transaction=False) as pipe:
+            pipe.incrby(key, amount)
+            if expire:
+                pipe.expire(key, expire)
+            value, *_ = await pipe.execute()
+        return value
+
+    async def get_counters(self, keys: Sequence[str]) -> List[int]:
+        if not keys:
+            return []
+        return [int(value) if value else 0 for value in await self.aioredis.mget(keys)]
+
+    async def pfadd(self, key: str, *values: Any, expire: Optional[int] = None) -> None:
+        async with self.aioredis.pipeline(transaction=False) as pipe:
+            pipe.pfadd(key, *values)
+            if expire:
+                pipe.expire(key, expire)
+            await pipe.execute()
+
+    async def pfcount(self, *keys: str) -> int:
+        return await self.aioredis.pfcount(*keys) if keys else 0
+
+    async def publish(self, channel: str, message: str) -> None:
+        await self.aioredis.publish(channel, message)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[str]:
+        pubsub = self.aioredis.pubsub()
+        try:
+            await pubsub.subscribe(channel)
+            async for message in pubsub.listen():
+                if message['type'] != 'message':
+                    continue
+                data = message['data']
+                yield data.decode('utf-8') if isinstance(data, bytes) else data
+        finally:
+            await pubsub.close()
+
+    async def enqueue(self, queue: str, payload: Dict[str, Any]) -> str:
+        job = self.queues[queue].enqueue(
+            'workers.analyze_message',
+            payload,
+            timeout=300,  # 5 минут таймаут
+            result_ttl=3600  # Хранить результат 1 час
+        )
+        return job.id
+
+    async def fetch_result(self, job_id: str) -> Optional[Any]:
+        for queue in self.queues.values():
+            job = queue.fetch_job(job_id)
+            if job is not None:
+                return job.result if job.is_finished else None
+        return None
+
+    async def close(self) -> None:
+        await self.aioredis.close()
+        self.redis.close()
+
+
+class InMemoryBackend(BrokerBackend):
+    """Хранилище в памяти процесса для одноузловых установок и тестов:
+    LRU-кэш с TTL, pub/sub внутри процесса и очереди asyncio"""
+
+    def __init__(self, max_items: int = 100000, result_ttl: int = 3600):
+        self.max_items = max_items
+        self.result_ttl = result_ttl
+        self._items: "OrderedDict[str, Tuple[bytes, Optional[float]]]" = OrderedDict()
+        self._subscribers: Dict[str, set] = {}
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._ready: Optional[asyncio.Event] = None
+        # Результаты в порядке добавления, то есть и в порядке истечения
+        self._results: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        # Счетчики и множества уникальных (точные вместо HyperLogLog) в порядке
+        # последней записи: окна, в которые больше не пишут, вытесняются первыми
+        self._counters: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+
+    async def get(self, key: str) -> Tuple[Optional[bytes], int]:
+        item = self._items.get(key)
+        if item is None:
+            return None, -2
+        data, expires = item
+        if expires is not None and expires <= time.monotonic():
+            del self._items[key]
+            return None, -2
+        self._items.move_to_end(key)
+        return data, int(expires - time.monotonic()) if expires is not None else -1
+
+    async def set(self, key: str, data: bytes, expire: Optional[int] = None) -> None:
+        self._items[key] = (data, time.monotonic() + expire if expire else None)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self._items.pop(key, None)
+
+    async def incr(self, key: str, amount: int = 1, expire: Optional[int] = None) -> int:
+        value = (self._counter(key) or 0) + amount
+        self._store_counter(key, value, expire)
+        return value
+
+    async def get_counters(self, keys: Sequence[str]) -> List[int]:
+        return [self._counter(key) or 0 for key in keys]
+
+    async def pfadd(self, key: str, *values: Any, expire: Optional[int] = None) -> None:
+        members = self._counter(key) or set()
+        members.update(values)
+        self._store_counter(key, members, expire)
+
+    async def pfcount(self, *keys: str) -> int:
+        return len(set().union(*(self._counter(key) or () for key in keys)))
+
+    async def publish(self, channel: str, message: str) -> None:
+        for queue in self._subscribers.get(channel, ()):
+            queue.put_nowait(message)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[str]:
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(channel, set()).add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers[channel].discard(queue)
+
+    async def enqueue(self, queue: str, payload: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        self._queue(queue).put_nowait((job_id, payload))
+        self._signal().set()
+        return job_id
+
+    async def dequeue(self) -> Tuple[str, str, Dict[str, Any]]:
+        """Получение следующей задачи; очередь priority выбирается первой"""
+        while True:
+            for name in QUEUE_PRIORITY:
+                queue = self._queues.get(name)
+                if queue is not None and not queue.empty():
+                    job_id, payload = queue.get_nowait()
+                    return name, job_id, payload
+            self._signal().clear()
+            await self._signal().wait()
+
+    def complete(self, job_id: str, result: Any) -> None:
+        """Сохранение результата задачи"""
+        now = time.monotonic()
+        while self._results and next(iter(self._results.values()))[1] <= now:
+            self._results.popitem(last=False)
+        self._results[job_id] = (result, now + self.result_ttl)
+        if len(self._results) > self.max_items:
+            self._results.popitem(last=False)
+
+    async def fetch_result(self, job_id: str) -> Optional[Any]:
+        item = self._results.get(job_id)
+        if item is None or item[1] <= time.monotonic():
+            return None
+        return item[0]
+
+    def _counter(self, key: str) -> Any:
+        item = self._counters.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires <= time.monotonic():
+            del self._counters[key]
+            return None
+        return value
+
+    def _store_counter(self, key: str, value: Any, expire: Optional[int]) -> None:
+        now = time.monotonic()
+        if expire:
+            expires = now + expire
+        else:
+            expires = self._counters[key][1] if key in self._counters else None
+        self._counters[key] = (value, expires)
+        self._counters.move_to_end(key)
+        # Истекшие окна собираются с начала порядка, лишние - вытесняются
+        while self._counters and self._expired(next(iter(self._counters.values()))[1], now):
+            self._counters.popitem(last=False)
+        while len(self._counters) > self.max_items:
+            self._counters.popitem(last=False)
+
+    @staticmethod
+    def _expired(expires: Optional[float], now: float) -> bool:
+        return expires is not None and expires <= now
+
+    def _queue(self, name: str) -> asyncio.Queue:
+        if name not in self._queues:
+            self._queues[name] = asyncio.Queue()
+        return self._queues[name]
+
+    def _signal(self) -> asyncio.Event:
+        if self._ready is None:
+            self._ready = asyncio.Event()
+        return self._ready
+
+
+def create_backend(name: str, url: str, password: Optional[str] = None,
+                   max_items: int = 100000) -> BrokerBackend:
+    """Создание хранилища по имени из настроек: redis, memory или auto"""
+    if name == 'memory':
+        return InMemoryBackend(max_items)
+
+    backend = RedisBackend(url, password)
+    if name == 'auto':
+        try:
+            backend.ping()
+        except Exception as e:
+            logging.warning(f"Redis is unreachable ({e}), using in-memory broker backend")
+            return InMemoryBackend(max_items)
+    return backend
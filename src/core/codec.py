@@ -0,0 +1,80 @@
+import json
+import logging
+from typing import Any, Tuple
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Бинарные значения начинаются с байта 0xFE, который не встречается в JSON,
+# поэтому старые JSON-значения из кэша распознаются без дополнительных ключей
+MAGIC = b'\xfe'
+FORMAT_JSON = b'\x00'
+FORMAT_MSGPACK = b'\x01'
+FORMAT_MSGPACK_ZSTD = b'\x02'
+
+
+class JsonCodec:
+    """Кодек JSON с заголовком формата"""
+    name = 'json'
+
+    def encode(self, value: Any) -> bytes:
+        return MAGIC + FORMAT_JSON + json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+
+class MsgpackCodec:
+    """Кодек msgpack со сжатием zstd для больших значений"""
+    name = 'msgpack'
+
+    def __init__(self, compress_threshold: int = 1024, level: int = 3):
+        self.compress_threshold = compress_threshold
+        self.compressor = zstandard.ZstdCompressor(level=level) if zstandard else None
+
+    def encode(self, value: Any) -> bytes:
+        payload = msgpack.packb(value, use_bin_type=True)
+        if self.compressor and len(payload) >= self.compress_threshold:
+            return MAGIC + FORMAT_MSGPACK_ZSTD + self.compressor.compress(payload)
+        return MAGIC + FORMAT_MSGPACK + payload
+
+
+class CacheCodec:
+    """Кодирование значений кэша с поддержкой чтения старого JSON"""
+
+    def __init__(self, name: str = 'msgpack', compress_threshold: int = 1024):
+        if name == 'msgpack' and msgpack is None:
+            logging.warning("msgpack is not installed, falling back to JSON cache codec")
+            name = 'json'
+        self.codec = MsgpackCodec(compress_threshold) if name == 'msgpack' else JsonCodec()
+        self.decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+    @property
+    def name(self) -> str:
+        return self.codec.name
+
+    def encode(self, value: Any) -> bytes:
+        return self.codec.encode(value)
+
+    def decode(self, data: bytes) -> Tuple[Any, bool]:
+        """Декодирование значения. Второй элемент - признак устаревшего формата"""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if not data.startswith(MAGIC):
+            return json.loads(data), True
+
+        fmt, payload = data[1:2], data[2:]
+        if fmt == FORMAT_JSON:
+            return json.loads(payload), self.codec.name != 'json'
+        if fmt == FORMAT_MSGPACK:
+            return msgpack.unpackb(payload, raw=False), self.codec.name != 'msgpack'
+        if fmt == FORMAT_MSGPACK_ZSTD:
+            if self.decompressor is None:
+                raise ValueError("zstandard is required to decode compressed cache value")
+            return msgpack.unpackb(self.decompressor.decompress(payload), raw=False), \
+                self.codec.name != 'msgpack'
+        raise ValueError(f"Unknown cache value format: {fmt!r}")
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from prometheus_client import Counter, Gauge
+
+EDITS_COALESCED = Counter('edit_debounce_coalesced_total', 'Изменения, замененные более новой версией до анализа')
+EDITS_FLUSHED = Counter('edit_debounce_flushed_total', 'Серии изменений, переданные на анализ', ['reason'])
+EDITS_PENDING = Gauge('edit_debounce_pending', 'Сообщения, ожидающие окончания серии изменений')
+
+# Обработчик серии: последняя версия и более ранние версии по порядку
+EditHandler = Callable[[Any, List[Any]], Awaitable[None]]
+
+
+class _PendingEdit:
+    __slots__ = ('item', 'superseded', 'first', 'last', 'task')
+
+    def __init__(self, item: Any, now: float):
+        self.item = item
+        self.superseded: List[Any] = []
+        self.first = now
+        self.last = now
+        self.task: Optional[asyncio.Task] = None
+
+
+class EditDebouncer:
+    """Схлопывание серии быстрых изменений одного сообщения
+
+    Изменение ждет quiet_period без новых правок того же ключа; новая версия
+    заменяет ожидающую, и обработчик получает только последнюю версию вместе
+    со списком замененных. Серия передается обработчику не позже max_delay от
+    первой правки, поэтому постоянными правками анализ не отложить. Больше
+    max_pending сообщений одновременно не ждут: сверх лимита изменения
+    обрабатываются сразу.
+    """
+
+    def __init__(self, handler: EditHandler, quiet_period: float = 2.0, max_delay: float = 10.0,
+                 max_pending: int = 10000):
+        self.handler = handler
+        self.quiet_period = quiet_period
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self._pending: Dict[Hashable, _PendingEdit] = {}
+        self._running: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def submit(self, key: Hashable, item: Any) -> None:
+        """Поставить версию сообщения в ожидание конца серии изменений"""
+        now = time.monotonic()
+        pending = self._pending.get(key)
+        if pending is not None:
+            pending.superseded.append(pending.item)
+            pending.item = item
+            pending.last = now
+            EDITS_COALESCED.inc()
+            return
+
+        if len(self._pending) >= self.max_pending:
+            EDITS_FLUSHED.labels('overflow').inc()
+            self._track(asyncio.create_task(self._call(item, [])))
+            return
+        pending = self._pending[key] = _PendingEdit(item, now)
+        pending.task = self._track(asyncio.create_task(self._wait(key, pending)))
+        EDITS_PENDING.set(len(self._pending))
+
+    async def stop(self) -> None:
+        """Обработка всех ожидающих серий без задержки (при остановке бота)"""
+        pending = list(self._pending.values())
+        self._pending.clear()
+        EDITS_PENDING.set(0)
+        for series in pending:
+            series.task.cancel()
+        await asyncio.gather(*(series.task for series in pending), return_exceptions=True)
+        for series in pending:
+            EDITS_FLUSHED.labels('shutdown').inc()
+            await self._call(series.item, series.superseded)
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    async def _wait(self, key: Hashable, pending: _PendingEdit) -> None:
+        deadline = pending.first + self.max_delay
+        while True:
+            delay = min(pending.last + self.quiet_period, deadline) - time.monotonic()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        del self._pending[key]
+        EDITS_PENDING.set(len(self._pending))
+        EDITS_FLUSHED.labels('max_delay' if pending.last + self.quiet_period > deadline else 'quiet').inc()
+        await self._call(pending.item, pending.superseded)
+
+    async def _call(self, item: Any, superseded: List[Any]) -> None:
+        try:
+            await self.handler(item, superseded)
+        except Exception as e:
+            logging.error(f"Edit handler failed: {e}")
+
+    def _track(self, task: asyncio.Task) -> asyncio.Task:
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+        return task
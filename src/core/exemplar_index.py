@@ -0,0 +1,162 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from prometheus_client import Counter, Gauge, Histogram
+
+EXEMPLAR_ITEMS = Gauge('exemplar_index_items', 'Отклоненные комментарии в индексе образцов')
+EXEMPLAR_MATCHES = Counter('exemplar_index_matches_total', 'Комментарии, совпавшие с отклоненными образцами')
+EXEMPLAR_SEARCH_SECONDS = Histogram(
+    'exemplar_index_search_seconds',
+    'Время поиска ближайших образцов',
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05)
+)
+
+
+class ExemplarIndex:
+    """Индекс векторов отклоненных модераторами комментариев
+
+    Векторы нормируются и хранятся в float16 (компактно, так же пишутся на
+    диск); для поиска держится копия в float32, и косинусная близость ко всем
+    образцам считается одним матричным умножением. При заполнении max_items
+    самые старые образцы перезаписываются. Индекс периодически сохраняется в
+    snapshot_path и загружается при старте. Поиск вызывается из потоков
+    инференса, поэтому изменения защищены блокировкой.
+    """
+
+    def __init__(self, snapshot_path: str, max_items: int = 20000, snapshot_interval: float = 300):
+        self.snapshot_path = snapshot_path
+        self.max_items = max_items
+        self.snapshot_interval = snapshot_interval
+        self._vectors: Optional[np.ndarray] = None
+        self._search: Optional[np.ndarray] = None
+        self._meta: List[Dict[str, Any]] = []
+        self._added = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._meta)
+
+    def add(self, vector: np.ndarray, comment_id: int, reason: str, text: str) -> None:
+        vector = self._normalize(vector)
+        meta = {'comment_id': comment_id, 'reason': reason, 'text': (text or '')[:200], 'added_at': time.time()}
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((min(1024, self.max_items), vector.shape[0]), dtype=np.float16)
+                self._search = np.zeros(self._vectors.shape, dtype=np.float32)
+            if vector.shape[0] != self._vectors.shape[1]:
+                raise ValueError(f"Vector size {vector.shape[0]} does not match index size {self._vectors.shape[1]}")
+            position = self._added % self.max_items
+            if position >= self._vectors.shape[0]:
+                self._grow()
+            self._vectors[position] = vector
+            self._search[position] = vector
+            if position < len(self._meta):
+                self._meta[position] = meta
+            else:
+                self._meta.append(meta)
+            self._added += 1
+            self._dirty = True
+        EXEMPLAR_ITEMS.set(len(self._meta))
+
+    def search(self, vector: np.ndarray, k: int = 5, min_score: float = 0.0) -> List[Dict[str, Any]]:
+        """Ближайшие образцы по косинусной близости, по убыванию"""
+        query = self._normalize(vector).astype(np.float32)
+        with EXEMPLAR_SEARCH_SECONDS.time(), self._lock:
+            count = len(self._meta)
+            if not count or query.shape[0] != self._search.shape[1]:
+                return []
+            scores = self._search[:count] @ query
+            k = min(k, count)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                dict(self._meta[i], score=float(scores[i]))
+                for i in top if scores[i] >= min_score
+            ]
+
+    def best_match(self, vector: np.ndarray, min_score: float) -> Optional[Dict[str, Any]]:
+        """Самый близкий образец не ниже min_score"""
+        found = self.search(vector, 1, min_score)
+        if found:
+            EXEMPLAR_MATCHES.inc()
+            return found[0]
+        return None
+
+    def load(self) -> None:
+        if not os.path.exists(self.snapshot_path):
+            return
+        with np.load(self.snapshot_path) as data:
+            vectors = data['vectors']
+            meta = json.loads(str(data['meta']))
+            added = int(data['added'])
+        with self._lock:
+            self._vectors = vectors.astype(np.float16)
+            self._search = self._vectors.astype(np.float32)
+            self._meta = meta
+            self._added = added
+        EXEMPLAR_ITEMS.set(len(self._meta))
+        logging.info(f"Loaded {len(meta)} exemplars from {self.snapshot_path}")
+
+    def snapshot(self) -> None:
+        """Атомарная запись индекса на диск"""
+        with self._lock:
+            if not self._dirty or self._vectors is None:
+                return
+            vectors = self._vectors[:len(self._meta)].copy()
+            meta = json.dumps(self._meta, ensure_ascii=False)
+            added = self._added
+            self._dirty = False
+        directory = os.path.dirname(self.snapshot_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.snapshot_path}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.savez(f, vectors=vectors, meta=np.array(meta), added=np.array(added))
+        os.replace(temp_path, self.snapshot_path)
+
+    async def start(self) -> None:
+        try:
+            await asyncio.to_thread(self.load)
+        except Exception as e:
+            logging.error(f"Failed to load exemplar index: {e}")
+        if self._task is None:
+            self._task = asyncio.create_task(self._snapshot_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.to_thread(self.snapshot)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'items': len(self._meta), 'added': self._added}
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).astype(np.float16)
+
+    def _grow(self) -> None:
+        size = min(max(self._vectors.shape[0] * 2, 1024), self.max_items)
+        vectors = np.zeros((size, self._vectors.shape[1]), dtype=np.float16)
+        vectors[:self._vectors.shape[0]] = self._vectors
+        self._vectors = vectors
+        self._search = vectors.astype(np.float32)
+
+    async def _snapshot_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            try:
+                await asyncio.to_thread(self.snapshot)
+            except Exception as e:
+                logging.error(f"Failed to save exemplar index: {e}")
@@ -0,0 +1,132 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, NamedTuple, Optional
+
+from prometheus_client import Counter, Gauge
+
+from .broker_backends import BrokerBackend, RedisBackend
+from .rate_limit import TokenBucket
+
+FLOOD_CHECKS = Counter('flood_control_checks_total', 'Проверки частоты сообщений пользователей', ['result'])
+FLOOD_TRACKED_USERS = Gauge('flood_control_tracked_users', 'Пользователи с корзиной в памяти процесса')
+
+# Атомарное обновление корзины пользователя в Redis. Время берется с сервера
+# Redis, поэтому часы реплик не влияют на результат. Ключ живет, пока корзина
+# не наполнится заново: дальше его состояние совпадает с начальным.
+_REDIS_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated', 'strikes')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+local strikes = tonumber(state[3]) or 0
+if now > updated then
+    tokens = math.min(capacity, tokens + (now - updated) * rate)
+end
+if tokens >= capacity then
+    strikes = 0
+end
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    strikes = strikes + 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now), 'strikes', strikes)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, strikes}
+"""
+
+
+class FloodDecision(NamedTuple):
+    allowed: bool
+    # Сообщения сверх лимита с момента, когда корзина была полной
+    strikes: int
+
+
+class _UserBucket(TokenBucket):
+    __slots__ = ('strikes',)
+
+    def __init__(self, rate: float, capacity: float):
+        super().__init__(rate, capacity)
+        self.strikes = 0
+
+
+class FloodLimiter:
+    """Ограничение частоты сообщений пользователя (маркерные корзины в памяти)
+
+    Пользователь может отправить burst сообщений подряд и дальше rate в
+    секунду. Проверка - несколько арифметических операций над корзиной;
+    число корзин ограничено max_users, давно не писавшие вытесняются первыми.
+    """
+
+    def __init__(self, rate: float, burst: float, max_users: int = 100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_users = max_users
+        self._buckets: "OrderedDict[Any, _UserBucket]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    async def check(self, user_id: Any) -> FloodDecision:
+        """Забрать маркер для сообщения пользователя"""
+        return self.check_local(user_id)
+
+    def check_local(self, user_id: Any, now: Optional[float] = None) -> FloodDecision:
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = _UserBucket(self.rate, self.burst)
+            bucket.updated = now
+            if len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+            FLOOD_TRACKED_USERS.set(len(self._buckets))
+        else:
+            self._buckets.move_to_end(user_id)
+            bucket._refill(now)
+            if bucket.tokens >= bucket.capacity:
+                bucket.strikes = 0
+
+        if bucket.try_acquire(1, now):
+            FLOOD_CHECKS.labels('allowed').inc()
+            return FloodDecision(True, bucket.strikes)
+        bucket.strikes += 1
+        FLOOD_CHECKS.labels('limited').inc()
+        return FloodDecision(False, bucket.strikes)
+
+
+class RedisFloodLimiter(FloodLimiter):
+    """Общие для всех реплик корзины в Redis
+
+    Корзина хранится в хеше и обновляется Lua-скриптом за один запрос. Если
+    Redis недоступен, проверка выполняется по корзинам процесса.
+    """
+
+    def __init__(self, redis, rate: float, burst: float, max_users: int = 100000,
+                 prefix: str = 'flood:'):
+        super().__init__(rate, burst, max_users)
+        self.prefix = prefix
+        self._script = redis.register_script(_REDIS_BUCKET_SCRIPT)
+
+    async def check(self, user_id: Any) -> FloodDecision:
+        try:
+            allowed, strikes = await self._script(keys=[f"{self.prefix}{user_id}"], args=[self.rate, self.burst])
+        except Exception as e:
+            logging.warning(f"Redis flood check failed, using local buckets: {e}")
+            FLOOD_CHECKS.labels('error').inc()
+            return self.check_local(user_id)
+        FLOOD_CHECKS.labels('allowed' if allowed else 'limited').inc()
+        return FloodDecision(bool(allowed), int(strikes))
+
+
+def create_flood_limiter(backend: BrokerBackend, rate: float, burst: float,
+                         max_users: int = 100000) -> FloodLimiter:
+    """Корзины в Redis, если брокер работает через Redis, иначе в памяти"""
+    if isinstance(backend, RedisBackend):
+        return RedisFloodLimiter(backend.aioredis, rate, burst, max_users)
+    return FloodLimiter(rate, burst, max_users)
@@ -0,0 +1,111 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from prometheus_client import Counter, Gauge
+
+L1_HITS = Counter('l1_cache_hits_total', 'Попадания в локальный кэш')
+L1_MISSES = Counter('l1_cache_misses_total', 'Промахи локального кэша')
+L1_INVALIDATIONS = Counter('l1_cache_invalidations_total', 'Инвалидации локального кэша')
+L1_BYTES = Gauge('l1_cache_bytes', 'Объем данных в локальном кэше')
+L1_STALE_FILLS = Counter('l1_cache_stale_fills_total', 'Заполнения, пропущенные из-за инвалидации во время чтения')
+
+# Число ячеек поколений: ключи распределяются по ним по хешу
+GENERATION_SLOTS = 4096
+
+
+class LocalCache:
+    """LRU-кэш закодированных значений в памяти процесса с ограничением
+    по количеству записей, объему и времени жизни
+
+    Каждая запись и инвалидация увеличивают поколение ключа. Читатель
+    запоминает поколение до обращения к удаленному хранилищу и заполняет кэш
+    через fill: если ключ за это время изменили, устаревшее значение не
+    сохраняется. Поколения хранятся в GENERATION_SLOTS ячейках по хешу ключа,
+    поэтому память не растет с числом ключей; совпадение ячеек приводит
+    только к лишнему промаху.
+    """
+
+    def __init__(self, max_items: int = 10000, max_bytes: int = 32 * 1024 * 1024,
+                 ttl: float = 30.0):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._generations = [0] * GENERATION_SLOTS
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Получение значения, None при промахе"""
+        item = self._items.get(key)
+        if item is None or item[1] < time.monotonic():
+            if item is not None:
+                self._remove(key)
+            self.misses += 1
+            L1_MISSES.inc()
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        L1_HITS.inc()
+        return item[0]
+
+    def generation(self, key: str) -> int:
+        """Поколение ключа; запоминается перед чтением из удаленного хранилища"""
+        return self._generations[hash(key) % GENERATION_SLOTS]
+
+    def fill(self, key: str, data: bytes, ttl: Optional[float], generation: int) -> bool:
+        """Сохранение прочитанного значения, если ключ не менялся с generation"""
+        if self.generation(key) != generation:
+            L1_STALE_FILLS.inc()
+            return False
+        self.set(key, data, ttl)
+        return True
+
+    def set(self, key: str, data: bytes, ttl: Optional[float] = None) -> None:
+        """Сохранение значения"""
+        self._bump(key)
+        if len(data) > self.max_bytes:
+            self.invalidate(key)
+            return
+        if key in self._items:
+            self._remove(key)
+        expires = time.monotonic() + min(ttl or self.ttl, self.ttl)
+        self._items[key] = (data, expires)
+        self.size_bytes += len(data)
+        while len(self._items) > self.max_items or self.size_bytes > self.max_bytes:
+            self._remove(next(iter(self._items)))
+        L1_BYTES.set(self.size_bytes)
+
+    def invalidate(self, key: str) -> None:
+        """Удаление значения по сигналу инвалидации"""
+        self._bump(key)
+        if key in self._items:
+            self._remove(key)
+            L1_INVALIDATIONS.inc()
+            L1_BYTES.set(self.size_bytes)
+
+    def clear(self) -> None:
+        self._generations = [generation + 1 for generation in self._generations]
+        self._items.clear()
+        self.size_bytes = 0
+        L1_BYTES.set(0)
+
+    def get_stats(self) -> Dict[str, float]:
+        """Статистика кэша, включая долю попаданий"""
+        total = self.hits + self.misses
+        return {
+            'items': len(self._items),
+            'bytes': self.size_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0
+        }
+
+    def _bump(self, key: str) -> None:
+        self._generations[hash(key) % GENERATION_SLOTS] += 1
+
+    def _remove(self, key: str) -> None:
+        data, _ = self._items.pop(key)
+        self.size_bytes -= len(data)
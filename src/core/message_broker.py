@@ -1,80 +1,163 @@
-from redis import Redis
-from rq import Queue
-import aioredis
-import json
+import asyncio
 import logging
-from typing import Dict, Any, Optional
+import uuid
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+from config.settings import (
+    REDIS_URL, REDIS_PASSWORD, BROKER_BACKEND, MEMORY_CACHE_MAX_ITEMS,
+    QUEUE_WEIGHTS, QUEUE_CONCURRENCY, QUEUE_AGING_SECONDS, WORKER_COUNT,
+    CACHE_CODEC, CACHE_COMPRESS_THRESHOLD,
+    L1_CACHE_MAX_ITEMS, L1_CACHE_MAX_BYTES, L1_CACHE_TTL, CACHE_INVALIDATION_CHANNEL
+)
+from .broker_backends import BrokerBackend, create_backend
+from .codec import CacheCodec
+from .local_cache import LocalCache
+from .scheduler import FairScheduler
 
 class MessageBroker:
-    def __init__(self):
+    def __init__(self, backend: Optional[BrokerBackend] = None):
         try:
-            # Основная очередь для анализа сообщений
-            self.redis = Redis(host='localhost', port=6379, db=0)
-            self.analysis_queue = Queue('analysis', connection=self.redis)
+            # Хранилище очередей analysis/priority/moderation, кэша и pub/sub
+            self.backend = backend or create_backend(
+                BROKER_BACKEND, REDIS_URL, REDIS_PASSWORD, MEMORY_CACHE_MAX_ITEMS
+            )
             
-            # Очередь для срочных сообщений (VIP пользователи)
-            self.priority_queue = Queue('priority', connection=self.redis)
+            # Планировщик, распределяющий воркеры между очередями
+            self.scheduler = FairScheduler(
+                weights=QUEUE_WEIGHTS,
+                limits=QUEUE_CONCURRENCY,
+                workers=WORKER_COUNT,
+                aging_seconds=QUEUE_AGING_SECONDS
+            )
             
-            # Очередь для модерации
-            self.moderation_queue = Queue('moderation', connection=self.redis)
+            # Кодек значений кэша
+            self.codec = CacheCodec(CACHE_CODEC, CACHE_COMPRESS_THRESHOLD)
             
-            # Асинхронное подключение для кэширования
-            self.aioredis = aioredis.from_url('redis://localhost')
+            # Локальный кэш процесса нужен только поверх удаленного хранилища
+            self.local_cache = LocalCache(L1_CACHE_MAX_ITEMS, L1_CACHE_MAX_BYTES, L1_CACHE_TTL) \
+                if self.backend.remote else None
+            self.instance_id = uuid.uuid4().hex
+            self._invalidation_task = None
             
-            logging.info("Successfully connected to Redis")
+            logging.info(f"Message broker initialized with {type(self.backend).__name__}")
         except Exception as e:
-            logging.error(f"Failed to connect to Redis: {e}")
+            logging.error(f"Failed to initialize message broker: {e}")
             raise
     
     async def push_message(self, message: Dict[str, Any], priority: bool = False) -> Optional[str]:
         """Отправка сообщения в очередь"""
         try:
-            queue = self.priority_queue if priority else self.analysis_queue
-            job = queue.enqueue(
-                'workers.analyze_message',
-                message,
-                timeout=300,  # 5 минут таймаут
-                result_ttl=3600  # Хранить результат 1 час
-            )
-            return job.id
+            return await self.backend.enqueue('priority' if priority else 'analysis', message)
         except Exception as e:
             logging.error(f"Failed to push message to queue: {e}")
             return None
     
+    async def submit(self, queue: str, user_id: Any, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Выполнение задачи через планировщик очередей"""
+        return await self.scheduler.submit(queue, user_id, func)
+    
     async def get_result(self, job_id: str) -> Optional[Dict]:
         """Получение результата обработки"""
         try:
-            job = self.analysis_queue.fetch_job(job_id)
-            if job is None:
-                job = self.priority_queue.fetch_job(job_id)
-            
-            if job and job.is_finished:
-                return job.result
-            return None
+            return await self.backend.fetch_result(job_id)
         except Exception as e:
             logging.error(f"Failed to get job result: {e}")
             return None
     
+    async def start(self):
+        """Запуск планировщика и подписки на инвалидацию кэша"""
+        self.scheduler.start()
+        if self.local_cache is not None and self._invalidation_task is None:
+            self._invalidation_task = asyncio.create_task(self._listen_invalidations())
+    
     async def cache_set(self, key: str, value: Any, expire: int = 3600):
         """Сохранение в кэш"""
         try:
-            await self.aioredis.set(key, json.dumps(value), ex=expire)
+            data = self.codec.encode(value)
+            await self.backend.set(key, data, expire)
+            if self.local_cache is not None:
+                self.local_cache.set(key, data, expire)
+                await self._publish_invalidation(key)
         except Exception as e:
+            if self.local_cache is not None:
+                self.local_cache.invalidate(key)
             logging.error(f"Failed to set cache: {e}")
     
     async def cache_get(self, key: str) -> Optional[Any]:
         """Получение из кэша"""
         try:
-            value = await self.aioredis.get(key)
-            return json.loads(value) if value else None
+            generation = None
+            if self.local_cache is not None:
+                data = self.local_cache.get(key)
+                if data is not None:
+                    return self.codec.decode(data)[0]
+                # Инвалидация во время чтения из хранилища отменит заполнение
+                generation = self.local_cache.generation(key)
+            
+            data, ttl = await self.backend.get(key)
+            if not data:
+                return None
+            value, is_legacy = self.codec.decode(data)
+            if is_legacy:
+                data = await self._migrate_value(key, value, ttl)
+            if self.local_cache is not None:
+                self.local_cache.fill(key, data, ttl if ttl > 0 else None, generation)
+            return value
         except Exception as e:
             logging.error(f"Failed to get from cache: {e}")
             return None
     
+    async def cache_delete(self, key: str):
+        """Удаление из кэша"""
+        try:
+            await self.backend.delete(key)
+            if self.local_cache is not None:
+                self.local_cache.invalidate(key)
+                await self._publish_invalidation(key)
+        except Exception as e:
+            logging.error(f"Failed to delete from cache: {e}")
+    
+    def get_cache_stats(self) -> Dict[str, float]:
+        """Статистика локального кэша"""
+        if self.local_cache is None:
+            return {'items': 0, 'bytes': 0, 'hits': 0, 'misses': 0, 'hit_ratio': 0.0}
+        return self.local_cache.get_stats()
+    
+    async def _publish_invalidation(self, key: str):
+        """Оповещение других реплик об изменении ключа"""
+        await self.backend.publish(CACHE_INVALIDATION_CHANNEL, f"{self.instance_id}:{key}")
+    
+    async def _listen_invalidations(self):
+        """Удаление из локального кэша ключей, измененных другими репликами"""
+        while True:
+            # Пока подписки не было, изменения могли быть пропущены
+            self.local_cache.clear()
+            try:
+                async for data in self.backend.subscribe(CACHE_INVALIDATION_CHANNEL):
+                    origin, _, key = data.partition(':')
+                    if origin != self.instance_id:
+                        self.local_cache.invalidate(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Cache invalidation listener failed: {e}")
+                await asyncio.sleep(1)
+    
+    async def _migrate_value(self, key: str, value: Any, ttl: int) -> bytes:
+        """Перезапись значения старого формата текущим кодеком с сохранением TTL"""
+        data = self.codec.encode(value)
+        try:
+            await self.backend.set(key, data, ttl if ttl > 0 else None)
+        except Exception as e:
+            logging.error(f"Failed to migrate cache value {key}: {e}")
+        return data
+    
     async def close(self):
         """Закрытие соединений"""
         try:
-            await self.aioredis.close()
-            self.redis.close()
+            if self._invalidation_task:
+                self._invalidation_task.cancel()
+            await self.scheduler.stop()
+            await self.backend.close()
         except Exception as e:
-            logging.error(f"Failed to close Redis connections: {e}") 
\ No newline at end of file
+            logging.error(f"Failed to close broker connections: {e}") 
\ No newline at end of file
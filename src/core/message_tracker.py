@@ -5,6 +5,39 @@ import re
 import logging
 import json
 
+# Версия схемы записей в кэше:
+# 1 - JSON со словарями полных ключей и временем в ISO-формате
+# 2 - компактные ключи и время в секундах epoch
+HISTORY_SCHEMA_VERSION = 2
+
+
+def encode_edit(edit: Dict[str, Any]) -> Dict[str, Any]:
+    """Преобразование записи об изменении в компактную схему"""
+    return {
+        'v': HISTORY_SCHEMA_VERSION,
+        'ts': datetime.fromisoformat(edit['timestamp']).timestamp(),
+        'o': edit['old_text'],
+        'n': edit['new_text'],
+        'd': edit['sentiment_change'],
+        'neg': edit['is_negative'],
+        'a': edit.get('analysis')
+    }
+
+
+def decode_edit(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Чтение записи об изменении любой версии схемы"""
+    if record.get('v', 1) == 1:
+        return record
+    return {
+        'timestamp': datetime.fromtimestamp(record['ts']).isoformat(),
+        'old_text': record['o'],
+        'new_text': record['n'],
+        'sentiment_change': record['d'],
+        'is_negative': record['neg'],
+        'analysis': record.get('a')
+    }
+
+
 @dataclass
 class MessageHistory:
     original_text: str
@@ -14,6 +47,39 @@ class MessageHistory:
     user_id: int
     username: str
 
+    def to_record(self) -> Dict[str, Any]:
+        """Сериализация в компактную схему для кэша"""
+        return {
+            'v': HISTORY_SCHEMA_VERSION,
+            't': self.original_text,
+            'e': [encode_edit(edit) for edit in self.edit_history],
+            's': self.original_sentiment_score,
+            'c': self.last_check.timestamp(),
+            'u': self.user_id,
+            'n': self.username
+        }
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> 'MessageHistory':
+        """Чтение записи из кэша любой версии схемы"""
+        if record.get('v', 1) == 1:
+            return cls(
+                original_text=record['original_text'],
+                edit_history=[decode_edit(edit) for edit in record['edit_history']],
+                original_sentiment_score=record['original_sentiment_score'],
+                last_check=datetime.fromisoformat(record['last_check']),
+                user_id=record['user_id'],
+                username=record['username']
+            )
+        return cls(
+            original_text=record['t'],
+            edit_history=[decode_edit(edit) for edit in record['e']],
+            original_sentiment_score=record['s'],
+            last_check=datetime.fromtimestamp(record['c']),
+            user_id=record['u'],
+            username=record['n']
+        )
+
 class MessageTracker:
     def __init__(self, text_analyzer, message_broker):
         self.text_analyzer = text_analyzer
@@ -45,23 +111,7 @@ class MessageTracker:
                           username: str) -> None:
         """Начать отслеживание сообщения"""
         try:
-            # Сохраняем в Redis для отказоустойчивости
-            message_data = {
-                'original_text': text,
-                'edit_history': [],
-                'original_sentiment_score': sentiment_score,
-                'last_check': datetime.now().isoformat(),
-                'user_id': user_id,
-                'username': username
-            }
-            
-            await self.message_broker.cache_set(
-                f"message_history:{message_id}",
-                message_data
-            )
-            
-            # Сохраняем в памяти
-            self.message_history[message_id] = MessageHistory(
+            history = MessageHistory(
                 original_text=text,
                 edit_history=[],
                 original_sentiment_score=sentiment_score,
@@ -70,6 +120,15 @@ class MessageTracker:
                 username=username
             )
             
+            # Сохраняем в Redis для отказоустойчивости
+            await self.message_broker.cache_set(
+                f"message_history:{message_id}",
+                history.to_record()
+            )
+            
+            # Сохраняем в памяти
+            self.message_history[message_id] = history
+            
             logging.info(f"Started tracking message {message_id} from user {username}")
         except Exception as e:
             logging.error(f"Failed to track message: {e}")
@@ -83,7 +142,7 @@ class MessageTracker:
             if not cached_history and message_id not in self.message_history:
                 return None
                 
-            history = self.message_history.get(message_id) or MessageHistory(**cached_history)
+            history = self.message_history.get(message_id) or MessageHistory.from_record(cached_history)
             
             # Анализируем новый текст
             is_negative, new_score, analysis = await self.text_analyzer.is_negative(new_text)
@@ -115,7 +174,7 @@ class MessageTracker:
                 # Сохраняем информацию о подозрительном изменении в Redis
                 await self.message_broker.cache_set(
                     f"suspicious_edit:{message_id}:{len(self.suspicious_edits[message_id])}",
-                    edit_info
+                    encode_edit(edit_info)
                 )
             
             # Обновляем историю
@@ -125,14 +184,7 @@ class MessageTracker:
             # Обновляем кэш
             await self.message_broker.cache_set(
                 f"message_history:{message_id}",
-                {
-                    'original_text': history.original_text,
-                    'edit_history': history.edit_history,
-                    'original_sentiment_score': history.original_sentiment_score,
-                    'last_check': history.last_check.isoformat(),
-                    'user_id': history.user_id,
-                    'username': history.username
-                }
+                history.to_record()
             )
             
             return {
@@ -146,6 +198,39 @@ class MessageTracker:
             logging.error(f"Error checking message edit: {e}")
             return None
 
+    async def record_edit(self, message_id: int, new_text: str,
+                          sentiment_score: Optional[float] = None,
+                          is_negative: Optional[bool] = None) -> bool:
+        """Записать изменение в историю без анализа (None - версия не анализировалась)"""
+        try:
+            history = self.message_history.get(message_id)
+            if history is None:
+                cached_history = await self.message_broker.cache_get(f"message_history:{message_id}")
+                if not cached_history:
+                    return False
+                history = self.message_history[message_id] = MessageHistory.from_record(cached_history)
+
+            previous_text = history.edit_history[-1]['new_text'] if history.edit_history else history.original_text
+            history.edit_history.append({
+                'timestamp': datetime.now().isoformat(),
+                'old_text': previous_text,
+                'new_text': new_text,
+                'sentiment_change': None if sentiment_score is None
+                else sentiment_score - history.original_sentiment_score,
+                'is_negative': is_negative,
+                'analysis': None
+            })
+            history.last_check = datetime.now()
+
+            await self.message_broker.cache_set(
+                f"message_history:{message_id}",
+                history.to_record()
+            )
+            return True
+        except Exception as e:
+            logging.error(f"Failed to record message edit: {e}")
+            return False
+
     async def _check_suspicious_factors(self, new_text: str, 
                                       sentiment_change: float,
                                       is_negative: bool) -> bool:
@@ -187,7 +272,7 @@ class MessageTracker:
                 if (current_time - history.last_check) > timedelta(days=7):
                     to_remove.append(message_id)
                     # Удаляем также из Redis
-                    await self.message_broker.aioredis.delete(f"message_history:{message_id}")
+                    await self.message_broker.cache_delete(f"message_history:{message_id}")
                     
             for message_id in to_remove:
                 del self.message_history[message_id]
@@ -0,0 +1,220 @@
+import re
+import time
+import zlib
+from collections import deque
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+from prometheus_client import Counter, Gauge
+
+NEAR_DUP_LOOKUPS = Counter('near_duplicate_lookups_total', 'Поиск похожих комментариев', ['result'])
+NEAR_DUP_ENTRIES = Gauge('near_duplicate_entries', 'Отпечатки в окне поиска дубликатов')
+NEAR_DUP_CLUSTERS = Gauge('near_duplicate_clusters', 'Кластеры похожих комментариев в окне')
+
+_NON_WORD = re.compile(r'[\W_]+')
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+
+class ClusterMatch(NamedTuple):
+    """Кластер, к которому отнесен комментарий"""
+    cluster_id: int
+    size: int
+    # Вердикт анализа, если кластер признан рассылкой и его можно применить к этому тексту
+    verdict: Optional[Any]
+    # Текст похож на первый комментарий кластера, а не только на соседний
+    near_seed: bool
+
+
+class _Cluster:
+    __slots__ = ('size', 'live', 'users', 'first_seen', 'last_seen', 'verdict', 'sample', 'seed')
+
+    def __init__(self, now: float, sample: str, seed: np.ndarray):
+        self.size = 0
+        self.live = 0
+        self.users: Set[int] = set()
+        self.first_seen = now
+        self.last_seen = now
+        self.verdict = None
+        self.sample = sample
+        # Подпись первого комментария: кластер растет по цепочке похожих
+        # текстов и может уйти от исходного
+        self.seed = seed
+
+
+class NearDuplicateIndex:
+    """Потоковый поиск почти одинаковых комментариев (MinHash + LSH)
+
+    Текст нормализуется и разбивается на символьные k-граммы, по ним строится
+    MinHash-подпись из num_perm значений. Подпись делится на bands полос,
+    каждая полоса - ключ корзины LSH: тексты с оценкой сходства Жаккара выше
+    threshold почти наверняка попадают хотя бы в одну общую корзину. Поиск
+    проверяет не больше bands * bucket_size кандидатов и не зависит от числа
+    отпечатков в индексе. Отпечатки старше window_seconds и сверх max_entries
+    вытесняются.
+
+    Вердикт кластера применяется к новому тексту без анализа, только если в
+    кластере не меньше min_cluster_size комментариев от min_cluster_users
+    разных пользователей и текст похож на первый комментарий кластера.
+    """
+
+    def __init__(self, window_seconds: float = 3600, max_entries: int = 20000,
+                 threshold: float = 0.6, num_perm: int = 64, bands: int = 16,
+                 shingle_size: int = 5, min_length: int = 30, bucket_size: int = 32,
+                 min_cluster_size: int = 5, min_cluster_users: int = 3):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.min_length = min_length
+        self.bucket_size = bucket_size
+        self.min_cluster_size = min_cluster_size
+        self.min_cluster_users = min_cluster_users
+        # Хеши семейства multiply-shift: (a * x + b) >> 32, a нечетное
+        rng = np.random.default_rng(0x5EED)
+        self._a = rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+        self._buckets: Dict[int, Deque[int]] = {}
+        # entry_id -> (подпись, ключи корзин, cluster_id)
+        self._entries: Dict[int, Tuple[np.ndarray, Tuple[int, ...], int]] = {}
+        self._order: Deque[Tuple[float, int]] = deque()
+        self._clusters: Dict[int, _Cluster] = {}
+        self._next_id = 0
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash-подпись текста; None для слишком коротких текстов"""
+        normalized = _NON_WORD.sub(' ', text.lower()).strip()
+        if len(normalized) < self.min_length:
+            return None
+        k = self.shingle_size
+        shingles = {normalized[i:i + k] for i in range(len(normalized) - k + 1)}
+        hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+        with np.errstate(over='ignore'):
+            values = (self._a[:, None] * hashes[None, :] + self._b[:, None]) >> np.uint64(32)
+        return (values & _MASK32).min(axis=1).astype(np.uint32)
+
+    def observe(self, text: str, user_id: int, now: float = None) -> Optional[ClusterMatch]:
+        """Добавить комментарий в индекс и вернуть его кластер
+
+        None - текст слишком короткий для надежного сравнения.
+        """
+        now = time.monotonic() if now is None else now
+        signature = self.signature(text)
+        if signature is None:
+            NEAR_DUP_LOOKUPS.labels('skipped').inc()
+            return None
+        self._expire(now)
+
+        keys = self._band_keys(signature)
+        cluster_id, similarity = None, 0.0
+        candidates = {entry_id for key in keys for entry_id in self._buckets.get(key, ())}
+        for entry_id in candidates:
+            candidate_signature, _, candidate_cluster = self._entries[entry_id]
+            estimate = self._similarity(candidate_signature, signature)
+            if estimate >= self.threshold and estimate > similarity:
+                cluster_id, similarity = candidate_cluster, estimate
+
+        entry_id = self._next_id
+        self._next_id += 1
+        if cluster_id is None:
+            # Кластер получает номер своего первого комментария
+            cluster_id = entry_id
+            self._clusters[cluster_id] = _Cluster(now, text[:200], signature)
+        cluster = self._clusters[cluster_id]
+        cluster.size += 1
+        cluster.live += 1
+        cluster.last_seen = now
+        if len(cluster.users) < 1000:
+            cluster.users.add(user_id)
+
+        self._entries[entry_id] = (signature, keys, cluster_id)
+        self._order.append((now, entry_id))
+        for key in keys:
+            self._buckets.setdefault(key, deque(maxlen=self.bucket_size)).append(entry_id)
+        if len(self._entries) > self.max_entries:
+            self._evict(self._order.popleft()[1])
+
+        near_seed = self._similarity(cluster.seed, signature) >= self.threshold
+        verdict = None
+        if cluster.verdict is not None and near_seed and cluster.size >= self.min_cluster_size \
+                and len(cluster.users) >= self.min_cluster_users:
+            verdict = cluster.verdict
+            NEAR_DUP_LOOKUPS.labels('verdict_reused').inc()
+        else:
+            NEAR_DUP_LOOKUPS.labels('matched' if cluster.size > 1 else 'new').inc()
+        self._update_gauges()
+        return ClusterMatch(cluster_id, cluster.size, verdict, near_seed)
+
+    def mark_spam(self, cluster_id: int, verdict: Any) -> None:
+        """Запомнить вердикт для кластера: следующие копии получат его без анализа,
+        когда кластер станет достаточно большим. Вызывается только для текстов,
+        похожих на первый комментарий кластера (ClusterMatch.near_seed)."""
+        cluster = self._clusters.get(cluster_id)
+        if cluster is not None:
+            cluster.verdict = verdict
+
+    def top_clusters(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Крупнейшие кластеры в окне"""
+        now = time.monotonic()
+        self._expire(now)
+        clusters = sorted(self._clusters.values(), key=lambda c: c.size, reverse=True)[:limit]
+        return [
+            {
+                'size': cluster.size,
+                'users': len(cluster.users),
+                'spam': cluster.verdict is not None,
+                'age': now - cluster.first_seen,
+                'idle': now - cluster.last_seen,
+                'sample': cluster.sample
+            }
+            for cluster in clusters if cluster.size > 1
+        ]
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self._entries),
+            'clusters': len(self._clusters),
+            'spam_clusters': sum(1 for c in self._clusters.values() if c.verdict is not None)
+        }
+
+    def _similarity(self, first: np.ndarray, second: np.ndarray) -> float:
+        """Оценка сходства Жаккара по доле совпавших значений MinHash"""
+        return float(np.count_nonzero(first == second)) / self.num_perm
+
+    def _band_keys(self, signature: np.ndarray) -> Tuple[int, ...]:
+        rows = self.rows
+        return tuple(hash((band, signature[band * rows:(band + 1) * rows].tobytes()))
+                     for band in range(self.bands))
+
+    def _expire(self, now: float) -> None:
+        cutoff = now - self.window_seconds
+        if self._order and self._order[0][0] < cutoff:
+            while self._order and self._order[0][0] < cutoff:
+                self._evict(self._order.popleft()[1])
+            self._update_gauges()
+
+    def _evict(self, entry_id: int) -> None:
+        _, keys, cluster_id = self._entries.pop(entry_id)
+        for key in keys:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                continue
+            try:
+                bucket.remove(entry_id)
+            except ValueError:
+                # Уже вытеснен из переполненной корзины
+                pass
+            if not bucket:
+                del self._buckets[key]
+        cluster = self._clusters[cluster_id]
+        cluster.live -= 1
+        if cluster.live == 0:
+            del self._clusters[cluster_id]
+
+    def _update_gauges(self) -> None:
+        NEAR_DUP_ENTRIES.set(len(self._entries))
+        NEAR_DUP_CLUSTERS.set(len(self._clusters))
@@ -0,0 +1,257 @@
+import asyncio
+import itertools
+import logging
+import random
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+from prometheus_client import Counter, Gauge
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+from .rate_limit import TokenBucket
+
+# Удаления выполняются раньше уведомлений
+PRIORITY_DELETE = 0
+PRIORITY_NOTIFY = 1
+
+# Максимум сообщений в одном вызове deleteMessages
+DELETE_BATCH_SIZE = 100
+
+# Удаления не расходуют лимит чата: он ограничивает отправку сообщений
+CHAT_EXEMPT_METHODS = frozenset({'delete_message', 'delete_messages'})
+
+OUTBOUND_QUEUE_DEPTH = Gauge('outbound_queue_depth', 'Исходящие действия в очереди')
+OUTBOUND_SENT = Counter('outbound_sent_total', 'Выполненные исходящие действия', ['method'])
+OUTBOUND_DROPPED = Counter('outbound_dropped_total', 'Отброшенные исходящие действия', ['reason'])
+OUTBOUND_RETRY_AFTER = Counter('outbound_retry_after_total', 'Ответы RetryAfter от Telegram')
+OUTBOUND_DEFERRED = Gauge('outbound_deferred', 'Действия, ожидающие маркер лимита чата')
+
+
+@dataclass
+class OutboundAction:
+    method: str
+    chat_id: Any
+    kwargs: Dict[str, Any]
+    priority: int
+    future: asyncio.Future
+    attempts: int = 0
+    created_at: float = field(default_factory=time.monotonic)
+    # Маркер лимита чата уже получен в очереди чата
+    chat_token: bool = False
+
+
+class OutboundDispatcher:
+    """Единая очередь исходящих запросов к Telegram
+
+    Соблюдает общий лимит и лимит на чат (маркерные корзины), выполняет
+    удаления раньше уведомлений, выдерживает паузу RetryAfter и повторяет
+    запросы при сетевых ошибках с экспоненциальной задержкой и jitter.
+    Обработчики ставят действия в очередь и не ждут их выполнения.
+
+    Лимит чата касается только отправки сообщений. Если маркеров чата нет,
+    действие переходит в очередь этого чата, а воркер берет следующее; очередь
+    чата возвращает действия в общую по мере появления маркеров.
+    """
+
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, chat_burst: float = 3,
+                 workers: int = 4, max_queue: int = 10000, max_retries: int = 5,
+                 max_chats: int = 10000):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self.bot = None
+        self.dropped = 0
+        self._chat_buckets: "OrderedDict[Any, TokenBucket]" = OrderedDict()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._tasks: list[asyncio.Task] = []
+        self._retries: set[asyncio.Task] = set()
+        self._lanes: Dict[Any, Deque[OutboundAction]] = {}
+        self.deferred = 0
+
+    def start(self, bot) -> None:
+        """Запуск воркеров отправки"""
+        self.bot = bot
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._worker(), name=f"outbound-worker-{i}")
+                for i in range(self.workers)
+            ]
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Отправка оставшихся действий и остановка воркеров"""
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._drain(), timeout)
+            except asyncio.TimeoutError:
+                logging.warning(f"Outbound queue not drained, {self._queue.qsize()} actions left")
+        for task in self._tasks + list(self._retries):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._retries, return_exceptions=True)
+        self._tasks = []
+
+    async def _drain(self) -> None:
+        await self._queue.join()
+        while self._retries:
+            await asyncio.gather(*self._retries, return_exceptions=True)
+            await self._queue.join()
+
+    def submit(self, method: str, chat_id: Any, priority: int = PRIORITY_NOTIFY,
+               **kwargs) -> asyncio.Future:
+        """Поставить вызов метода бота в очередь; результат доступен через future"""
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        future = asyncio.get_running_loop().create_future()
+        if self._queue.qsize() + self.deferred >= self.max_queue and priority != PRIORITY_DELETE:
+            self._drop('queue_full', future)
+            return future
+        action = OutboundAction(method, chat_id, dict(kwargs, chat_id=chat_id), priority, future)
+        self._put(action)
+        return future
+
+    def delete_message(self, chat_id: Any, message_id: int) -> asyncio.Future:
+        return self.submit('delete_message', chat_id, PRIORITY_DELETE, message_id=message_id)
+
+    def delete_messages(self, chat_id: Any, message_ids: List[int]) -> List[asyncio.Future]:
+        """Массовое удаление через deleteMessages пачками по DELETE_BATCH_SIZE"""
+        ids = sorted(set(message_ids))
+        return [
+            self.submit('delete_messages', chat_id, PRIORITY_DELETE,
+                        message_ids=ids[i:i + DELETE_BATCH_SIZE])
+            for i in range(0, len(ids), DELETE_BATCH_SIZE)
+        ]
+
+    def send_message(self, chat_id: Any, text: str, **kwargs) -> asyncio.Future:
+        return self.submit('send_message', chat_id, PRIORITY_NOTIFY, text=text, **kwargs)
+
+    def edit_message_text(self, chat_id: Any, message_id: int, text: str, **kwargs) -> asyncio.Future:
+        return self.submit('edit_message_text', chat_id, PRIORITY_NOTIFY,
+                           message_id=message_id, text=text, **kwargs)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'queue_depth': self._queue.qsize() if self._queue else 0,
+            'deferred': self.deferred,
+            'dropped': self.dropped
+        }
+
+    def _put(self, action: OutboundAction) -> None:
+        self._queue.put_nowait((action.priority, next(self._seq), action))
+        OUTBOUND_QUEUE_DEPTH.set(self._queue.qsize())
+
+    def _drop(self, reason: str, future: asyncio.Future) -> None:
+        self.dropped += 1
+        OUTBOUND_DROPPED.labels(reason).inc()
+        if not future.done():
+            future.set_result(None)
+
+    async def _retry_later(self, action: OutboundAction, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._put(action)
+
+    def _track(self, task: asyncio.Task) -> None:
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
+
+    def _take_chat_token(self, action: OutboundAction) -> bool:
+        """Маркер лимита чата; без него действие уходит в очередь чата"""
+        if action.chat_token or action.method in CHAT_EXEMPT_METHODS:
+            return True
+        lane = self._lanes.get(action.chat_id)
+        # Пока у чата есть отложенные действия, новые встают за ними по порядку
+        if lane is None and self._chat_bucket(action.chat_id).try_acquire():
+            return True
+        if lane is None:
+            lane = self._lanes[action.chat_id] = deque()
+            self._track(asyncio.create_task(self._run_lane(action.chat_id, lane)))
+        lane.append(action)
+        self._set_deferred(1)
+        return False
+
+    async def _run_lane(self, chat_id: Any, lane: Deque[OutboundAction]) -> None:
+        """Возврат отложенных действий чата в общую очередь по мере появления маркеров"""
+        bucket = self._chat_bucket(chat_id)
+        try:
+            while lane:
+                await asyncio.sleep(bucket.delay())
+                if bucket.try_acquire():
+                    action = lane.popleft()
+                    self._set_deferred(-1)
+                    action.chat_token = True
+                    self._put(action)
+        finally:
+            del self._lanes[chat_id]
+            for action in lane:
+                self._set_deferred(-1)
+                self._drop('shutdown', action.future)
+
+    def _set_deferred(self, delta: int) -> None:
+        self.deferred += delta
+        OUTBOUND_DEFERRED.set(self.deferred)
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+            if len(self._chat_buckets) > self.max_chats:
+                self._chat_buckets.popitem(last=False)
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, action = await self._queue.get()
+            OUTBOUND_QUEUE_DEPTH.set(self._queue.qsize())
+            try:
+                await self._execute(action)
+            except Exception as e:
+                logging.error(f"Outbound worker error: {e}")
+                self._drop('error', action.future)
+            finally:
+                self._queue.task_done()
+
+    async def _execute(self, action: OutboundAction) -> None:
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        if not self._take_chat_token(action):
+            return
+        await self.global_bucket.acquire()
+
+        try:
+            result = await getattr(self.bot, action.method)(**action.kwargs)
+            OUTBOUND_SENT.labels(action.method).inc()
+            if not action.future.done():
+                action.future.set_result(result)
+        except RetryAfter as e:
+            # Лимит превышен: приостанавливаем все воркеры и возвращаем действие в очередь
+            OUTBOUND_RETRY_AFTER.inc()
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') \
+                else float(e.retry_after)
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            logging.warning(f"Telegram flood limit hit, pausing outbound queue for {retry_after}s")
+            self._put(action)
+        except (BadRequest, Forbidden) as e:
+            logging.error(f"Outbound {action.method} to {action.chat_id} rejected: {e}")
+            self._drop('rejected', action.future)
+        except NetworkError as e:
+            action.attempts += 1
+            if action.attempts > self.max_retries:
+                logging.error(f"Outbound {action.method} to {action.chat_id} failed: {e}")
+                self._drop('retries_exhausted', action.future)
+                return
+            delay = min(30.0, 0.5 * 2 ** action.attempts) * random.uniform(0.5, 1.5)
+            self._track(asyncio.create_task(self._retry_later(action, delay)))
+        except TelegramError as e:
+            logging.error(f"Outbound {action.method} to {action.chat_id} failed: {e}")
+            self._drop('error', action.future)
@@ -0,0 +1,198 @@
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from prometheus_client import Counter, Gauge
+
+from .broker_backends import BrokerBackend
+
+RAID_ACTIVE = Gauge('raid_mode_active', 'Области (канал или пост) в режиме рейда')
+RAID_EVENTS = Counter('raid_events_total', 'Переключения режима рейда', ['event'])
+RAID_DELETED = Counter('raid_deleted_total', 'Сообщения, удаленные в режиме рейда без анализа', ['reason'])
+
+
+class WindowStats(NamedTuple):
+    """Статистика области за скользящее окно"""
+    messages: int
+    authors: int
+    new_accounts: int
+    negative: int
+
+    @property
+    def new_ratio(self) -> float:
+        return self.new_accounts / self.messages if self.messages else 0.0
+
+    @property
+    def negative_ratio(self) -> float:
+        return self.negative / self.messages if self.messages else 0.0
+
+
+class RaidEvent(NamedTuple):
+    scope: str
+    # started или ended
+    event: str
+    stats: WindowStats
+    # Новые аккаунты, писавшие в области за окно подозрительные сообщения (для массового удаления)
+    participants: List[int]
+
+
+class RaidDetector:
+    """Обнаружение рейдов на канал и отдельные посты
+
+    Счетчики сообщений, новых аккаунтов и негативных сообщений ведутся в
+    хранилище брокера по корзинам bucket_seconds, уникальные авторы - в
+    HyperLogLog; окно складывается из последних корзин, поэтому статистика
+    общая для всех реплик. Режим рейда включается, когда в окне достаточно
+    сообщений и авторов и велика доля негатива; при большой доле новых
+    аккаунтов достаточно меньшей доли негатива (new_negative_ratio), одних
+    новых аккаунтов мало: после запуска или под популярным постом все авторы
+    выглядят новыми. Первые warmup_seconds после запуска новые аккаунты не
+    учитываются. Режим выключается после calm_seconds без превышения порогов.
+    Проверка режима на пути обработки сообщения читает только локальное
+    состояние.
+    """
+
+    def __init__(self, backend: BrokerBackend, window_seconds: int = 300, bucket_seconds: int = 10,
+                 min_messages: int = 30, min_authors: int = 15, new_ratio: float = 0.5,
+                 negative_ratio: float = 0.4, new_negative_ratio: float = 0.2, calm_seconds: float = 120,
+                 warmup_seconds: float = 0, eval_interval: float = 2, max_participants: int = 1000,
+                 prefix: str = 'raid:'):
+        self.backend = backend
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.min_messages = min_messages
+        self.min_authors = min_authors
+        self.new_ratio = new_ratio
+        self.negative_ratio = negative_ratio
+        self.new_negative_ratio = new_negative_ratio
+        self.calm_seconds = calm_seconds
+        self.warm_at = time.monotonic() + warmup_seconds
+        self.eval_interval = eval_interval
+        self.max_participants = max_participants
+        self.prefix = prefix
+        # scope -> (время начала рейда, последняя статистика)
+        self._active: Dict[str, Tuple[float, WindowStats]] = {}
+        self._calm_since: Dict[str, float] = {}
+        self._last_eval: Dict[str, float] = {}
+        self._participants: Dict[str, Deque[Tuple[float, int]]] = {}
+
+    @staticmethod
+    def scopes(chat_id: int, thread_id: Optional[int] = None) -> Tuple[str, ...]:
+        """Области сообщения: чат целиком и пост, к которому оставлен комментарий"""
+        if thread_id:
+            return f"chat:{chat_id}", f"post:{chat_id}:{thread_id}"
+        return f"chat:{chat_id}",
+
+    def is_active(self, scopes: Sequence[str]) -> bool:
+        return any(scope in self._active for scope in scopes)
+
+    def active_raids(self) -> Dict[str, Tuple[float, WindowStats]]:
+        """Области в режиме рейда: время начала (monotonic) и статистика"""
+        return dict(self._active)
+
+    async def observe(self, scopes: Sequence[str], user_id: int, is_new: bool,
+                      suspicious: bool = False) -> List[RaidEvent]:
+        """Учет сообщения и проверка порогов; возвращает переключения режима
+
+        suspicious - сообщение не прошло дешевую проверку правилами: только
+        такие новые аккаунты попадают в участники рейда.
+        """
+        now = time.monotonic()
+        expire = self.window_seconds + self.bucket_seconds
+        # Во время прогрева все авторы выглядят новыми
+        is_new = is_new and now >= self.warm_at
+        for scope in scopes:
+            key = self._key(scope, self._bucket())
+            await self.backend.incr(f"{key}:messages", expire=expire)
+            await self.backend.pfadd(f"{key}:authors", user_id, expire=expire)
+            if is_new:
+                await self.backend.incr(f"{key}:new", expire=expire)
+                if suspicious:
+                    participants = self._participants.setdefault(scope, deque(maxlen=self.max_participants))
+                    participants.append((now, user_id))
+
+        events = []
+        # Активные рейды проверяются и при сообщениях в других областях, чтобы
+        # затихший пост вышел из режима рейда
+        for scope in dict.fromkeys([*scopes, *self._active]):
+            # Окно пересчитывается не чаще eval_interval на область
+            if now - self._last_eval.get(scope, 0.0) < self.eval_interval:
+                continue
+            self._last_eval[scope] = now
+            event = self._transition(scope, await self.window_stats(scope), now)
+            if event is not None:
+                events.append(event)
+        self._prune(now)
+        return events
+
+    async def record_negative(self, scopes: Sequence[str]) -> None:
+        expire = self.window_seconds + self.bucket_seconds
+        bucket = self._bucket()
+        for scope in scopes:
+            await self.backend.incr(f"{self._key(scope, bucket)}:negative", expire=expire)
+
+    async def window_stats(self, scope: str) -> WindowStats:
+        last = self._bucket()
+        keys = [self._key(scope, bucket) for bucket in
+                range(last - self.window_seconds // self.bucket_seconds + 1, last + 1)]
+        counters = await self.backend.get_counters(
+            [f"{key}:{name}" for name in ('messages', 'new', 'negative') for key in keys]
+        )
+        size = len(keys)
+        authors = await self.backend.pfcount(*(f"{key}:authors" for key in keys))
+        return WindowStats(sum(counters[:size]), authors, sum(counters[size:2 * size]), sum(counters[2 * size:]))
+
+    async def claim_alert(self, scope: str) -> bool:
+        """Только одна реплика отправляет уведомление о начале рейда"""
+        try:
+            return await self.backend.incr(f"{self.prefix}{scope}:alert", expire=self.window_seconds) == 1
+        except Exception as e:
+            logging.warning(f"Failed to claim raid alert: {e}")
+            return True
+
+    def _is_raid(self, stats: WindowStats) -> bool:
+        return (stats.messages >= self.min_messages and stats.authors >= self.min_authors and
+                (stats.negative_ratio >= self.negative_ratio or
+                 (stats.new_ratio >= self.new_ratio and stats.negative_ratio >= self.new_negative_ratio)))
+
+    def _transition(self, scope: str, stats: WindowStats, now: float) -> Optional[RaidEvent]:
+        if self._is_raid(stats):
+            self._calm_since.pop(scope, None)
+            if scope in self._active:
+                self._active[scope] = (self._active[scope][0], stats)
+                return None
+            self._active[scope] = (now, stats)
+            RAID_EVENTS.labels('started').inc()
+            RAID_ACTIVE.set(len(self._active))
+            participants = sorted({user_id for _, user_id in self._participants.get(scope, ())})
+            return RaidEvent(scope, 'started', stats, participants)
+
+        if scope not in self._active:
+            return None
+        calm_since = self._calm_since.setdefault(scope, now)
+        if now - calm_since < self.calm_seconds:
+            return None
+        del self._active[scope]
+        del self._calm_since[scope]
+        RAID_EVENTS.labels('ended').inc()
+        RAID_ACTIVE.set(len(self._active))
+        return RaidEvent(scope, 'ended', stats, [])
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - self.window_seconds
+        for scope in list(self._participants):
+            participants = self._participants[scope]
+            while participants and participants[0][0] < cutoff:
+                participants.popleft()
+            if not participants:
+                del self._participants[scope]
+        for scope in [scope for scope, at in self._last_eval.items() if at < cutoff]:
+            del self._last_eval[scope]
+
+    def _bucket(self) -> int:
+        # Номер корзины по общему для реплик времени
+        return int(time.time() // self.bucket_seconds)
+
+    def _key(self, scope: str, bucket: int) -> str:
+        return f"{self.prefix}{scope}:{bucket}"
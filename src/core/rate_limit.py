@@ -0,0 +1,38 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Маркерная корзина: rate маркеров в секунду, не более capacity"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def try_acquire(self, tokens: float = 1, now: Optional[float] = None) -> bool:
+        """Забрать маркеры без ожидания; False, если их недостаточно"""
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def delay(self, tokens: float = 1) -> float:
+        """Время в секундах до появления нужного числа маркеров"""
+        self._refill(time.monotonic())
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+    async def acquire(self, tokens: float = 1) -> None:
+        """Дождаться и забрать маркеры"""
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(self.delay(tokens))
@@ -0,0 +1,35 @@
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List
+
+
+class RecentMessages:
+    """Кольцевые буферы последних сообщений пользователей по чатам
+
+    Для каждого пользователя хранится не более per_user идентификаторов
+    сообщений в каждом чате; число пользователей ограничено max_users,
+    давно не писавшие вытесняются первыми.
+    """
+
+    def __init__(self, per_user: int = 200, max_users: int = 50000):
+        self.per_user = per_user
+        self.max_users = max_users
+        self._users: "OrderedDict[int, Dict[Any, Deque[int]]]" = OrderedDict()
+
+    def record(self, chat_id: Any, user_id: int, message_id: int) -> None:
+        """Запомнить сообщение пользователя"""
+        chats = self._users.get(user_id)
+        if chats is None:
+            chats = self._users[user_id] = {}
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+        chats.setdefault(chat_id, deque(maxlen=self.per_user)).append(message_id)
+
+    def take(self, user_id: int) -> Dict[Any, List[int]]:
+        """Забрать все запомненные сообщения пользователя, сгруппированные по чатам"""
+        chats = self._users.pop(user_id, {})
+        return {chat_id: list(ids) for chat_id, ids in chats.items() if ids}
+
+    def __len__(self) -> int:
+        return len(self._users)
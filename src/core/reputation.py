@@ -0,0 +1,90 @@
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from prometheus_client import Counter
+
+TRUST_FAST_PATH = Counter('trust_fast_path_total', 'Комментарии доверенных пользователей', ['tier', 'outcome'])
+TRUST_COMPUTE_SAVED = Counter('trust_compute_saved_seconds_total', 'Оценка сэкономленного времени инференса')
+
+# Полный вес стажа и истории набирается за столько дней и одобренных комментариев
+FULL_AGE_DAYS = 90
+FULL_HISTORY_COMMENTS = 50
+
+
+class TrustTier(NamedTuple):
+    name: str
+    min_score: float
+    # Доля комментариев уровня, которые все равно проходят полный анализ (в фоне)
+    sample_rate: float
+
+
+def reputation_score(warning_count: int, comments: int, rejected: int, age_days: float) -> float:
+    """Репутация пользователя от 0 до 1
+
+    Половина веса - стаж аккаунта, половина - число принятых комментариев;
+    каждое предупреждение и отклоненный комментарий уменьшают оценку вдвое.
+    """
+    age = min(max(age_days, 0) / FULL_AGE_DAYS, 1.0)
+    history = min(max(comments - rejected, 0) / FULL_HISTORY_COMMENTS, 1.0)
+    return (0.5 * age + 0.5 * history) * 0.5 ** (warning_count + rejected)
+
+
+class ReputationCache:
+    """Предрасчитанные уровни доверия пользователей
+
+    Уровень по оценке репутации хранится в памяти с TTL; пока записи нет или
+    она устарела, пользователь проверяется как новый. Размер ограничен
+    max_users, давно не писавшие вытесняются первыми. Здесь же ведется учет
+    пропущенных полных анализов.
+    """
+
+    def __init__(self, tiers: Sequence[Tuple[str, float, float]], ttl: float = 3600,
+                 max_users: int = 100000):
+        self.tiers: List[TrustTier] = sorted((TrustTier(*tier) for tier in tiers),
+                                             key=lambda tier: tier.min_score, reverse=True)
+        self.ttl = ttl
+        self.max_users = max_users
+        self._users: "OrderedDict[int, Tuple[Optional[TrustTier], float]]" = OrderedDict()
+        # Скользящее среднее длительности полного анализа
+        self._analysis_seconds = 0.0
+        self.stats: Dict[str, float] = {'skipped': 0, 'sampled': 0, 'escalated': 0, 'saved_seconds': 0.0}
+
+    def get(self, user_id: int) -> Optional[TrustTier]:
+        """Уровень доверия; None - нет актуальной оценки или доверия недостаточно"""
+        entry = self._users.get(user_id)
+        if entry is None or entry[1] < time.monotonic():
+            return None
+        self._users.move_to_end(user_id)
+        return entry[0]
+
+    def is_fresh(self, user_id: int) -> bool:
+        entry = self._users.get(user_id)
+        return entry is not None and entry[1] >= time.monotonic()
+
+    def update(self, user_id: int, score: float) -> Optional[TrustTier]:
+        tier = next((tier for tier in self.tiers if score >= tier.min_score), None)
+        self._users[user_id] = (tier, time.monotonic() + self.ttl)
+        self._users.move_to_end(user_id)
+        if len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        return tier
+
+    def invalidate(self, user_id: int) -> None:
+        """Сброс доверия, например после найденного нарушения"""
+        self._users.pop(user_id, None)
+
+    def observe_analysis(self, seconds: float) -> None:
+        self._analysis_seconds = seconds if not self._analysis_seconds else \
+            0.9 * self._analysis_seconds + 0.1 * seconds
+
+    def record(self, tier: TrustTier, outcome: str) -> None:
+        """Учет исхода быстрой проверки: skipped, sampled или escalated"""
+        TRUST_FAST_PATH.labels(tier.name, outcome).inc()
+        self.stats[outcome] += 1
+        if outcome == 'skipped':
+            TRUST_COMPUTE_SAVED.inc(self._analysis_seconds)
+            self.stats['saved_seconds'] += self._analysis_seconds
+
+    def __len__(self) -> int:
+        return len(self._users)
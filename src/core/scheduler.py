@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from prometheus_client import Gauge, Histogram
+
+QUEUE_WAIT_SECONDS = Histogram(
+    'scheduler_queue_wait_seconds',
+    'Время ожидания задачи в очереди до начала выполнения',
+    ['queue'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+QUEUE_DEPTH = Gauge('scheduler_queue_depth', 'Количество задач в очереди', ['queue'])
+QUEUE_RUNNING = Gauge('scheduler_queue_running', 'Количество выполняемых задач', ['queue'])
+
+
+@dataclass
+class _Job:
+    queue: str
+    user_id: Any
+    func: Callable[[], Awaitable[Any]]
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+    taken: bool = False
+
+
+class _QueueState:
+    def __init__(self, name: str, weight: int, limit: int):
+        self.name = name
+        self.weight = max(1, weight)
+        self.limit = max(1, limit)
+        self.credit = 0
+        self.running = 0
+        self.size = 0
+        # Когда очередь последний раз получала воркер (или начала ждать его)
+        self.last_served = time.monotonic()
+        # Очередь задач каждого пользователя, пользователи обслуживаются по кругу
+        self.users: "OrderedDict[Any, Deque[_Job]]" = OrderedDict()
+        # Общий FIFO для определения возраста самой старой задачи
+        self.fifo: Deque[_Job] = deque()
+
+    def oldest(self) -> Optional[_Job]:
+        while self.fifo and self.fifo[0].taken:
+            self.fifo.popleft()
+        return self.fifo[0] if self.fifo else None
+
+    def push(self, job: _Job) -> None:
+        if self.size == 0:
+            self.last_served = job.enqueued_at
+        self.users.setdefault(job.user_id, deque()).append(job)
+        self.fifo.append(job)
+        self.size += 1
+
+    def pop(self) -> _Job:
+        user_id, jobs = next(iter(self.users.items()))
+        job = jobs.popleft()
+        if jobs:
+            self.users.move_to_end(user_id)
+        else:
+            del self.users[user_id]
+        job.taken = True
+        self.size -= 1
+        self.last_served = time.monotonic()
+        return job
+
+    @property
+    def runnable(self) -> bool:
+        return self.size > 0 and self.running < self.limit
+
+
+class FairScheduler:
+    """Взвешенный справедливый планировщик очередей обработки
+
+    Очереди выбираются по алгоритму smooth weighted round-robin с учетом
+    лимита параллельных задач каждой очереди. Очередь, не получавшая воркер
+    дольше aging_seconds, обслуживается вне круга, чтобы низкоприоритетные
+    задачи не голодали; старение касается очереди, а не отдельных задач,
+    поэтому при общей перегрузке веса очередей сохраняются. Внутри очереди
+    пользователи всегда обслуживаются по кругу, поэтому один пользователь не
+    может занять все ресурсы анализа.
+    """
+
+    def __init__(self, weights: Dict[str, int], limits: Dict[str, int],
+                 workers: int = 4, aging_seconds: float = 5.0):
+        self.queues = {
+            name: _QueueState(name, weight, limits.get(name, workers))
+            for name, weight in weights.items()
+        }
+        self.workers = max(1, workers)
+        self.aging_seconds = aging_seconds
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: list[asyncio.Task] = []
+
+    async def submit(self, queue: str, user_id: Any,
+                     func: Callable[[], Awaitable[Any]]) -> Any:
+        """Поставить задачу в очередь и дождаться результата"""
+        state = self.queues[queue]
+        job = _Job(queue, user_id, func, asyncio.get_running_loop().create_future())
+        state.push(job)
+        QUEUE_DEPTH.labels(queue).set(state.size)
+        self._notify()
+        return await job.future
+
+    def start(self) -> None:
+        """Запуск воркеров"""
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"scheduler-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logging.info(f"Scheduler started with {self.workers} workers")
+
+    async def stop(self) -> None:
+        """Остановка воркеров"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """Глубина, число выполняемых задач и возраст старейшей задачи по очередям"""
+        now = time.monotonic()
+        stats = {}
+        for name, state in self.queues.items():
+            oldest = state.oldest()
+            stats[name] = {
+                'depth': state.size,
+                'running': state.running,
+                'oldest_age': now - oldest.enqueued_at if oldest else 0.0
+            }
+        return stats
+
+    def _notify(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _next_job(self) -> Optional[_Job]:
+        runnable = [state for state in self.queues.values() if state.runnable]
+        if not runnable:
+            return None
+
+        # Старение: очередь, дольше всех не получавшая воркер, идет первой
+        now = time.monotonic()
+        starved = [state for state in runnable if now - state.last_served >= self.aging_seconds]
+        if starved:
+            return min(starved, key=lambda state: state.last_served).pop()
+
+        # Smooth weighted round-robin среди очередей, в которых есть работа
+        total = 0
+        best = None
+        for state in runnable:
+            state.credit += state.weight
+            total += state.weight
+            if best is None or state.credit > best.credit:
+                best = state
+        best.credit -= total
+        return best.pop()
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job = self._next_job()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            state = self.queues[job.queue]
+            state.running += 1
+            QUEUE_DEPTH.labels(job.queue).set(state.size)
+            QUEUE_RUNNING.labels(job.queue).set(state.running)
+            QUEUE_WAIT_SECONDS.labels(job.queue).observe(time.monotonic() - job.enqueued_at)
+            try:
+                if not job.future.cancelled():
+                    result = await job.func()
+                    if not job.future.done():
+                        job.future.set_result(result)
+            except asyncio.CancelledError:
+                if not job.future.done():
+                    job.future.cancel()
+                raise
+            except Exception as e:
+                logging.error(f"Scheduler job in queue {job.queue} failed: {e}")
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                state.running -= 1
+                QUEUE_RUNNING.labels(job.queue).set(state.running)
+                self._notify()
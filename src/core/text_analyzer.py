@@ -1,25 +1,43 @@
 from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
-from typing import Tuple, Dict, Any
+from typing import Tuple, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import logging
+import re
+import numpy as np
 from config.settings import (
     BERT_MODEL_PATH,
     TOXIC_MODEL_PATH,
     EMOTION_MODEL_PATH,
-    NEGATIVE_THRESHOLD
+    NEGATIVE_THRESHOLD,
+    NEGATIVE_WORDS,
+    WORKER_COUNT
 )
 from tqdm import tqdm
 import torch
 from huggingface_hub import model_info
 import traceback
 
+# Режимы анализа: полный и упрощенные для работы под нагрузкой
+ANALYSIS_MODES = ('full', 'no_emotion', 'toxicity_only')
+NEUTRAL_SENTIMENT = {'label': 'NEUTRAL', 'score': 0.0}
+NEUTRAL_EMOTION = {'label': 'neutral', 'score': 0.0}
+
+# Ссылки и упоминания - частый признак спама
+LINK_PATTERN = re.compile(r'https?://|www\.|t\.me/|@\w{4,}', re.IGNORECASE)
+
 class TextAnalyzer:
     MODELS = {
         'sentiment': 'blanchefort/rubert-base-cased-sentiment',
         'toxic': 'SkolkovoInstitute/russian_toxicity_classifier',
         'emotion': 'Aniemore/rubert-tiny2-russian-emotion-detection'
     }
+    TOXIC_LABELS = ['toxic', 'insult', 'threat', 'obscene']
+    NEGATIVE_EMOTIONS = ['anger', 'sadness', 'fear', 'disgust']
 
     def __init__(self):
+        # Инференс выполняется в пуле потоков, чтобы не блокировать цикл событий
+        self.executor = ThreadPoolExecutor(max_workers=WORKER_COUNT, thread_name_prefix='inference')
         try:
             logging.info("Initializing text analyzers...")
             print("Загрузка моделей из HuggingFace...")
@@ -70,40 +88,111 @@ class TextAnalyzer:
             self.emotion_analyzer = MockEmotionAnalyzer()
             self.using_mock = True
 
-    async def is_negative(self, text: str) -> bool:
-        """Анализ текста на негативность"""
+    def _run_toxicity(self, text: str) -> Tuple[Dict[str, Any], Optional[np.ndarray]]:
+        """Оценка токсичности и вектор текста за один прогон энкодера
+
+        Вектор - выход пулера энкодера модели токсичности (или среднее скрытых
+        состояний, если пулера нет), в float16. Для заглушек вектор не строится.
+        """
+        if self.using_mock:
+            return self.toxicity_analyzer(text)[0], None
+        tokenizer, model = self.toxicity_analyzer.tokenizer, self.toxicity_analyzer.model
+        inputs = tokenizer(text, return_tensors='pt', truncation=True, max_length=512)
+        with torch.no_grad():
+            outputs = model(**inputs, output_hidden_states=True)
+            hidden = outputs.hidden_states[-1]
+            pooler = getattr(model.base_model, 'pooler', None)
+            pooled = pooler(hidden)[0] if pooler is not None else hidden[0].mean(dim=0)
+        toxic = self.toxicity_analyzer.postprocess({'logits': outputs.logits})
+        return toxic, pooled.numpy().astype(np.float16)
+
+    def _run_models(self, text: str, exemplars=None, exemplar_threshold: float = 1.0,
+                    mode: str = 'full') -> Dict[str, Any]:
+        """Прогон текста через модели
+
+        Если текст близок к отклоненному образцу из exemplars, модели
+        тональности и эмоций не запускаются. mode из ANALYSIS_MODES
+        отключает модели под нагрузкой: вместо их результата - нейтральный.
+        """
+        toxic, embedding = self._run_toxicity(text)
+        if exemplars is not None and embedding is not None:
+            match = exemplars.best_match(embedding, exemplar_threshold)
+            if match:
+                return {'toxic': toxic, 'exemplar': match}
+        return {
+            'sentiment': self.sentiment_analyzer(text)[0] if mode != 'toxicity_only' else NEUTRAL_SENTIMENT,
+            'toxic': toxic,
+            'emotion': self.emotion_analyzer(text)[0] if mode == 'full' else NEUTRAL_EMOTION
+        }
+
+    def _classify(self, sentiment: Dict[str, Any], toxic: Dict[str, Any], emotion: Dict[str, Any]) -> bool:
+        # Сообщение считается негативным если:
+        # 1. Оно токсичное (любая токсичная метка со score > 0.8)
+        # 2. ИЛИ имеет негативную тональность (NEGATIVE) И эмоцию anger/sadness/fear/disgust с высоким score (> 0.7)
+        return (
+            (toxic['label'] in self.TOXIC_LABELS and toxic['score'] > 0.8) or
+            (sentiment['label'] == 'NEGATIVE' and
+             emotion['label'] in self.NEGATIVE_EMOTIONS and
+             emotion['score'] > 0.7)
+        )
+
+    async def analyze(self, text: str, exemplars=None, exemplar_threshold: float = 1.0,
+                      mode: str = 'full') -> Dict[str, Any]:
+        """Полный анализ текста за один прогон моделей в пуле потоков
+
+        exemplars - индекс отклоненных комментариев (ExemplarIndex): при
+        совпадении с образцом текст сразу признается негативным, а в результат
+        добавляется ключ 'exemplar' с найденным образцом; toxicity_score
+        остается оценкой модели токсичности. mode: full,
+        no_emotion (без модели эмоций) или toxicity_only.
+        """
+        result = {'is_negative': False, 'toxicity_score': 0.0, 'emotion': 'neutral'}
+        if not text:
+            return result
         try:
-            if not text:
-                return False
-            
-            # Анализ тональности
-            sentiment = self.sentiment_analyzer(text)[0]
-            
-            # Анализ токсичности
-            toxic = self.toxicity_analyzer(text)[0]
-            
-            # Анализ эмоций
-            emotion = self.emotion_analyzer(text)[0]
-            
-            # Логируем результаты анализа
+            loop = asyncio.get_running_loop()
+            outputs = await loop.run_in_executor(
+                self.executor, self._run_models, text, exemplars, exemplar_threshold, mode
+            )
+            toxic = outputs['toxic']
+            toxicity_score = toxic['score'] if toxic['label'] in self.TOXIC_LABELS else 0.0
+            if 'exemplar' in outputs:
+                match = outputs['exemplar']
+                logging.info(f"Text matches rejected comment {match['comment_id']} (score {match['score']:.3f})")
+                result.update(is_negative=True, toxicity_score=toxicity_score, exemplar=match, toxic=toxic)
+                return result
+            sentiment, emotion = outputs['sentiment'], outputs['emotion']
             logging.info(f"Text analysis results: sentiment={sentiment}, toxic={toxic}, emotion={emotion}")
-            
-            # Сообщение считается негативным если:
-            # 1. Оно токсичное (любая токсичная метка со score > 0.8)
-            # 2. ИЛИ имеет негативную тональность (NEGATIVE) И эмоцию anger/sadness/fear/disgust с высоким score (> 0.7)
-            toxic_labels = ['toxic', 'insult', 'threat', 'obscene']
-            is_negative = (
-                (toxic['label'] in toxic_labels and toxic['score'] > 0.8) or
-                (sentiment['label'] == 'NEGATIVE' and 
-                 emotion['label'] in ['anger', 'sadness', 'fear', 'disgust'] and
-                 emotion['score'] > 0.7)
+            result.update(
+                is_negative=self._classify(sentiment, toxic, emotion),
+                toxicity_score=toxicity_score,
+                emotion=emotion['label'],
+                sentiment=sentiment,
+                toxic=toxic
             )
-            
-            return is_negative
-            
         except Exception as e:
             logging.error(f"Error analyzing text: {e}")
+        return result
+
+    def quick_screen(self, text: str) -> bool:
+        """Дешевая проверка без моделей: словарь негативных слов и ссылки.
+        True - текст требует полного анализа."""
+        if not text:
             return False
+        lowered = text.lower()
+        return bool(LINK_PATTERN.search(lowered)) or any(word in lowered for word in NEGATIVE_WORDS)
+
+    async def embed(self, text: str) -> Optional[np.ndarray]:
+        """Вектор текста (float16) из энкодера модели токсичности; None для заглушек"""
+        if not text or self.using_mock:
+            return None
+        loop = asyncio.get_running_loop()
+        _, embedding = await loop.run_in_executor(self.executor, self._run_toxicity, text)
+        return embedding
+
+    async def is_negative(self, text: str) -> bool:
+        """Анализ текста на негативность"""
+        return (await self.analyze(text))['is_negative']
 
     async def get_toxicity_score(self, text: str) -> float:
         """Возвращает оценку токсичности текста"""
@@ -111,8 +200,7 @@ class TextAnalyzer:
             result = self.toxicity_analyzer(text)[0]
             logging.info(f"Toxicity analysis result: {result}")
             # Возвращаем score для любых токсичных меток
-            toxic_labels = ['toxic', 'insult', 'threat', 'obscene']
-            return result['score'] if result['label'] in toxic_labels else 0.0
+            return result['score'] if result['label'] in self.TOXIC_LABELS else 0.0
         except Exception as e:
             logging.error(f"Error in toxicity analysis: {e}")
             return 0.0
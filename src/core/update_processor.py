@@ -0,0 +1,131 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Hashable, Optional
+
+from prometheus_client import Gauge
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+UPDATES_IN_FLIGHT = Gauge('updates_in_flight', 'Количество обрабатываемых обновлений')
+UPDATES_QUEUED = Gauge('updates_queued', 'Количество обновлений, ожидающих обработки')
+
+
+class PendingLimitQueue(asyncio.Queue):
+    """Очередь входящих обновлений приложения с ограничением принятых в работу
+
+    PTB создает задачу на каждое обновление, взятое из очереди, еще до любых
+    семафоров обработчика, поэтому ограничение действует здесь: очередное
+    обновление выдается, только когда в работе меньше max_pending. Пока
+    лимит исчерпан, очередь заполняется до max_pending, и дальше получение
+    обновлений (getUpdates или ответ на webhook) ждет свободного места.
+    """
+
+    def __init__(self, max_pending: int):
+        super().__init__(maxsize=max_pending)
+        self._slots = asyncio.Semaphore(max_pending)
+
+    async def get(self) -> Any:
+        await self._slots.acquire()
+        try:
+            return await super().get()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self) -> None:
+        """Освобождение места после обработки обновления"""
+        self._slots.release()
+
+
+class OrderedUpdateProcessor(BaseUpdateProcessor):
+    """Обработчик обновлений: параллельно между чатами и сообщениями,
+    строго по порядку для одного (chat_id, message_id)
+
+    Сообщение и его изменения имеют общий ключ, поэтому изменение не будет
+    обработано раньше исходного сообщения. max_concurrency ограничивает число
+    одновременно выполняемых обработчиков, max_pending - общее число принятых
+    в работу обновлений, включая ожидающие; лимит соблюдается, только если
+    приложению передана очередь update_queue этого обработчика.
+    """
+
+    def __init__(self, max_concurrency: int = 64, max_pending: int = 1024):
+        super().__init__(max(max_pending, max_concurrency))
+        self.max_concurrency = max_concurrency
+        self.update_queue = PendingLimitQueue(max(max_pending, max_concurrency))
+        self._limit: Optional[asyncio.Semaphore] = None
+        # Последнее принятое обновление каждого ключа; следующее ждет его завершения
+        self._tails: Dict[Hashable, asyncio.Future] = {}
+        self.in_flight = 0
+        self.queued = 0
+
+    async def initialize(self) -> None:
+        self._limit = asyncio.Semaphore(self.max_concurrency)
+
+    async def shutdown(self) -> None:
+        self._tails.clear()
+
+    @staticmethod
+    def order_key(update: object) -> Optional[Hashable]:
+        """Ключ упорядочивания обновления: (chat_id, message_id)"""
+        if not isinstance(update, Update):
+            return None
+        message = update.effective_message
+        if message is None:
+            return None
+        return message.chat_id, message.message_id
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        try:
+            await super().process_update(update, coroutine)
+        finally:
+            self.update_queue.release()
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        if self._limit is None:
+            await self.initialize()
+
+        key = self.order_key(update)
+        previous = self._tails.get(key) if key is not None else None
+        done = asyncio.get_running_loop().create_future()
+        if key is not None:
+            self._tails[key] = done
+
+        self._set_queued(1)
+        started = False
+        try:
+            if previous is not None:
+                await previous
+            async with self._limit:
+                self._set_queued(-1)
+                started = True
+                self._set_in_flight(1)
+                try:
+                    await coroutine
+                finally:
+                    self._set_in_flight(-1)
+        except Exception as e:
+            logging.error(f"Error processing update {key}: {e}")
+        finally:
+            if not started:
+                self._set_queued(-1)
+                if asyncio.iscoroutine(coroutine):
+                    coroutine.close()
+            done.set_result(None)
+            if key is not None and self._tails.get(key) is done:
+                del self._tails[key]
+
+    def get_stats(self) -> Dict[str, int]:
+        """Текущее число обрабатываемых и ожидающих обновлений"""
+        return {
+            'in_flight': self.in_flight,
+            'queued': self.queued,
+            'ordered_keys': len(self._tails)
+        }
+
+    def _set_in_flight(self, delta: int) -> None:
+        self.in_flight += delta
+        UPDATES_IN_FLIGHT.set(self.in_flight)
+
+    def _set_queued(self, delta: int) -> None:
+        self.queued += delta
+        UPDATES_QUEUED.set(self.queued)
@@ -0,0 +1,79 @@
+import hmac
+import logging
+from typing import Optional
+
+from aiohttp import web
+from prometheus_client import Counter
+from telegram import Update
+from telegram.ext import Application
+
+WEBHOOK_REQUESTS = Counter('webhook_requests_total', 'Запросы к webhook', ['status'])
+
+
+class WebhookServer:
+    """HTTP-сервер aiohttp для приема обновлений Telegram через webhook
+
+    Запрос проверяется по секретному токену, обновление кладется во
+    внутреннюю очередь приложения, и ответ отправляется, не дожидаясь
+    обработки (но после освобождения места в очереди).
+    """
+
+    def __init__(self, application: Application, path: str, secret_token: str,
+                 host: str = '0.0.0.0', port: int = 8080):
+        if not secret_token:
+            raise ValueError("Webhook secret token must not be empty")
+        self.application = application
+        self.path = path
+        self.secret_token = secret_token
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    def build_app(self) -> web.Application:
+        """Создание aiohttp-приложения с маршрутами webhook и проверки здоровья"""
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get('/healthz', self.handle_health)
+        return app
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.build_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logging.info(f"Webhook server listening on {self.host}:{self.port}{self.path}")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        """Прием обновления от Telegram"""
+        token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+        if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            WEBHOOK_REQUESTS.labels('forbidden').inc()
+            return web.Response(status=403)
+
+        try:
+            data = await request.json()
+            update = Update.de_json(data, self.application.bot)
+        except Exception as e:
+            logging.error(f"Invalid webhook payload: {e}")
+            WEBHOOK_REQUESTS.labels('invalid').inc()
+            return web.Response(status=400)
+
+        if update is None:
+            WEBHOOK_REQUESTS.labels('invalid').inc()
+            return web.Response(status=400)
+
+        # Очередь ограничена: пока она заполнена, ответ Telegram задерживается,
+        # и новые обновления не поступают сверх лимита
+        await self.application.update_queue.put(update)
+        WEBHOOK_REQUESTS.labels('accepted').inc()
+        return web.Response()
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            'status': 'ok',
+            'update_queue': self.application.update_queue.qsize()
+        })
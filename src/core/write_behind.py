@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import Table
+from sqlalchemy.exc import CompileError, DataError, IntegrityError, ProgrammingError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+WRITE_BEHIND_FLUSH_ROWS = Histogram(
+    'write_behind_flush_rows',
+    'Количество строк в одной записи буфера',
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+)
+WRITE_BEHIND_LAG = Histogram(
+    'write_behind_lag_seconds',
+    'Время от постановки строки в буфер до записи в БД',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+WRITE_BEHIND_PENDING = Gauge('write_behind_pending_rows', 'Строки, ожидающие записи')
+WRITE_BEHIND_DROPPED = Counter('write_behind_dropped_total', 'Строки, отброшенные при переполнении буфера')
+WRITE_BEHIND_ERRORS = Counter('write_behind_flush_errors_total', 'Ошибки записи буфера')
+WRITE_BEHIND_DEAD_LETTERS = Counter('write_behind_dead_letters_total', 'Строки, которые не удалось записать')
+
+# Ошибки самой строки: повтор не поможет, в отличие от недоступности БД
+PERMANENT_ERRORS = (IntegrityError, DataError, ProgrammingError, CompileError)
+
+# Сколько последних незаписанных строк хранить для разбора
+DEAD_LETTERS_KEPT = 1000
+
+
+class WriteBehindBuffer:
+    """Отложенная пакетная запись строк в БД
+
+    Строки накапливаются в памяти и записываются многострочными INSERT
+    раз в flush_interval секунд или при накоплении max_rows строк, одной
+    транзакцией на пакет. Счетчики (increment) суммируются в памяти и
+    записываются в той же транзакции через INSERT ... ON CONFLICT DO UPDATE.
+    При ошибке пакет возвращается в начало буфера, а на следующем цикле
+    строки и счетчики пишутся по одной (каждая в своей точке сохранения):
+    строка с ошибкой данных попадает в журнал незаписанных (dead_letters) и
+    не задерживает остальные. При остановке буфер записывается полностью.
+    """
+
+    def __init__(self, engine, flush_interval: float = 0.2, max_rows: int = 500,
+                 max_pending: int = 50000):
+        self.engine = engine
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.max_pending = max_pending
+        self.flushed = 0
+        self.dropped = 0
+        self.dead_letters: Deque[Tuple[str, Dict[str, Any], str]] = deque(maxlen=DEAD_LETTERS_KEPT)
+        self._split_next = False
+        self._rows: Deque[Tuple[Table, Dict[str, Any], float]] = deque()
+        # (таблица, колонка счетчика, ключ строки) -> накопленное приращение
+        self._increments: Dict[Tuple[Table, str, Tuple[Tuple[str, Any], ...]], int] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+
+    def start(self) -> None:
+        if self._task is None:
+            self._running = True
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        """Остановка с записью всех накопленных строк"""
+        if self._task is not None:
+            # Цикл не отменяется, чтобы не прервать запись пакета на середине
+            self._running = False
+            self._wakeup.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        while self._rows or self._increments:
+            # Повторная попытка пишет строки по одной
+            if not await self.flush() and not await self.flush():
+                logging.error(f"Write-behind buffer not drained, {len(self._rows)} rows lost")
+                break
+
+    def add(self, table: Table, row: Dict[str, Any]) -> None:
+        """Поставить строку в очередь на запись"""
+        if len(self._rows) >= self.max_pending:
+            dropped_table, dropped_row, _ = self._rows.popleft()
+            self.dropped += 1
+            WRITE_BEHIND_DROPPED.inc()
+            if self.dropped % 1000 == 1:
+                logging.warning(f"Write-behind buffer full ({self.max_pending} rows), dropping oldest rows; "
+                                f"{self.dropped} dropped so far, e.g. {dropped_table.name} {dropped_row}")
+        self._rows.append((table, row, time.monotonic()))
+        WRITE_BEHIND_PENDING.set(len(self._rows))
+        if len(self._rows) >= self.max_rows and self._wakeup is not None:
+            self._wakeup.set()
+
+    def increment(self, table: Table, key: Dict[str, Any], column: str = 'count', amount: int = 1) -> None:
+        """Увеличить счетчик в строке с первичным ключом key"""
+        slot = (table, column, tuple(sorted(key.items())))
+        self._increments[slot] = self._increments.get(slot, 0) + amount
+
+    async def flush(self) -> bool:
+        """Запись одного пакета; False при ошибке"""
+        async with self._lock:
+            batch = [self._rows.popleft() for _ in range(min(self.max_rows, len(self._rows)))]
+            increments, self._increments = self._increments, {}
+            if not batch and not increments:
+                return True
+
+            split, self._split_next = self._split_next, False
+            written = len(batch)
+            try:
+                async with self.engine.begin() as conn:
+                    if split:
+                        written -= await self._write_each(conn, batch, increments)
+                    else:
+                        await self._write_batch(conn, batch, increments)
+            except Exception as e:
+                WRITE_BEHIND_ERRORS.inc()
+                logging.error(f"Write-behind flush of {len(batch)} rows failed: {e}")
+                # Повтор по одной строке, чтобы ошибочная строка не блокировала буфер
+                self._split_next = True
+                self._rows.extendleft(reversed(batch))
+                for slot, amount in increments.items():
+                    self._increments[slot] = self._increments.get(slot, 0) + amount
+                return False
+            finally:
+                WRITE_BEHIND_PENDING.set(len(self._rows))
+
+            if not batch:
+                return True
+            now = time.monotonic()
+            self.flushed += written
+            WRITE_BEHIND_FLUSH_ROWS.observe(len(batch))
+            WRITE_BEHIND_LAG.observe(now - batch[0][2])
+            return True
+
+    @staticmethod
+    def _ordered(increments: Dict) -> List:
+        # Фиксированный порядок обновлений исключает взаимные блокировки реплик
+        return sorted(increments.items(), key=lambda item: (item[0][0].name, item[0][1], repr(item[0][2])))
+
+    @staticmethod
+    def _upsert(table: Table, column: str, key: Tuple[Tuple[str, Any], ...], amount: int):
+        upsert = pg_insert(table).values(**dict(key), **{column: amount})
+        return upsert.on_conflict_do_update(
+            index_elements=[name for name, _ in key],
+            set_={column: table.c[column] + upsert.excluded[column]}
+        )
+
+    async def _write_batch(self, conn, batch: List, increments: Dict) -> None:
+        # Многострочный INSERT требует одинакового набора колонок
+        groups: Dict[Tuple[Table, Tuple[str, ...]], List[Dict[str, Any]]] = {}
+        for table, row, _ in batch:
+            groups.setdefault((table, tuple(sorted(row))), []).append(row)
+        for (table, _), rows in groups.items():
+            await conn.execute(table.insert(), rows)
+        for (table, column, key), amount in self._ordered(increments):
+            await conn.execute(self._upsert(table, column, key, amount))
+
+    async def _write_each(self, conn, batch: List, increments: Dict) -> int:
+        """Запись по одной строке; ошибки данных - в журнал незаписанных.
+        Возвращает число незаписанных строк пакета."""
+        failed = 0
+        for table, row, _ in batch:
+            try:
+                async with conn.begin_nested():
+                    await conn.execute(table.insert(), [row])
+            except PERMANENT_ERRORS as e:
+                failed += 1
+                self._dead_letter(table, row, e)
+        for (table, column, key), amount in self._ordered(increments):
+            try:
+                async with conn.begin_nested():
+                    await conn.execute(self._upsert(table, column, key, amount))
+            except PERMANENT_ERRORS as e:
+                self._dead_letter(table, dict(key, **{column: amount}), e)
+        return failed
+
+    def _dead_letter(self, table: Table, row: Dict[str, Any], error: Exception) -> None:
+        self.dead_letters.append((table.name, row, str(error)))
+        WRITE_BEHIND_DEAD_LETTERS.inc()
+        logging.error(f"Write-behind row dropped after retry: {table.name} {row}: {error}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'pending': len(self._rows),
+            'pending_counters': len(self._increments),
+            'flushed': self.flushed,
+            'dropped': self.dropped,
+            'dead_letters': len(self.dead_letters),
+            'lag': time.monotonic() - self._rows[0][2] if self._rows else 0.0
+        }
+
+    async def _flush_loop(self) -> None:
+        while self._running:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            # Пакет за пакетом до опустошения буфера; при ошибке - до следующего цикла
+            while (self._rows or self._increments) and await self.flush():
+                pass
@@ -1,43 +1,66 @@
 import logging
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import SQLAlchemyError
-from dotenv import load_dotenv
 import os
 import sys
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, inspect
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from config.settings import DATABASE_URL
-from src.models import Base, User, Comment, MessageEdit, Warning
+from src.models import Base
 
 logger = logging.getLogger(__name__)
 
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+ALEMBIC_INI = os.path.join(ROOT_DIR, 'alembic.ini')
+
+
+def get_alembic_config(configure_logger: bool = False) -> Config:
+    """Конфигурация Alembic с адресом БД из настроек"""
+    config = Config(ALEMBIC_INI)
+    config.set_main_option('script_location', os.path.join(ROOT_DIR, 'migrations'))
+    config.set_main_option('sqlalchemy.url', DATABASE_URL.replace('%', '%%'))
+    config.attributes['configure_logger'] = configure_logger
+    return config
+
+
 def init_db():
-    """Инициализация базы данных"""
+    """Проверка ревизии схемы и применение недостающих миграций"""
     try:
-        # Создаем подключение к базе данных
+        config = get_alembic_config()
+        head = ScriptDirectory.from_config(config).get_current_head()
+
         engine = create_engine(DATABASE_URL)
-        
-        # Создаем все таблицы
-        Base.metadata.drop_all(engine)  # Удаляем старые таблицы
-        Base.metadata.create_all(engine)  # Создаем новые таблицы с обновленной схемой
-        
-        # Создаем фабрику сессий
-        Session = sessionmaker(bind=engine)
-        session = Session()
-        
-        # Изменяем тип колонки telegram_id на BIGINT
         try:
-            session.execute(text("ALTER TABLE users ALTER COLUMN telegram_id TYPE BIGINT"))
-            session.commit()
-            logger.info("Column telegram_id type changed to BIGINT")
-        except Exception as e:
-            logger.warning(f"Error changing column type (might be already BIGINT): {e}")
-            session.rollback()
-        
+            with engine.connect() as conn:
+                current = MigrationContext.configure(conn).get_current_revision()
+                if current == head:
+                    # Быстрый путь: схема актуальна, ничего не меняем
+                    logger.info(f"Database schema is up to date (revision {current})")
+                    return
+                legacy_tables = [] if current else [
+                    table for table in Base.metadata.tables
+                    if inspect(conn).has_table(table)
+                ]
+
+            if legacy_tables:
+                # Таблицы без истории миграций могут содержать данные: их схему
+                # должен сверить и отметить (alembic stamp) администратор
+                raise RuntimeError(
+                    f"Database has tables {legacy_tables} but no alembic_version. "
+                    f"Refusing to migrate automatically to avoid data loss: back up the "
+                    f"database, and if the tables match revision 0001 run "
+                    f"'alembic stamp 0001' and start the bot again"
+                )
+        finally:
+            engine.dispose()
+
+        logger.info(f"Upgrading database schema from {current} to {head}")
+        command.upgrade(config, 'head')
         logger.info("Database initialized successfully")
-        return Session
-        
+
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
         raise
@@ -45,4 +68,4 @@ def init_db():
 if __name__ == "__main__":
     print("Initializing database...")
     init_db()
-    print("Database initialized successfully!") 
\ No newline at end of file
+    print("Database initialized successfully!")
@@ -0,0 +1,156 @@
+import logging
+import re
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+# Таблицы, разбитые на помесячные разделы по created_at
+PARTITIONED_TABLES = ('moderator_logs', 'message_edits')
+ARCHIVE_SCHEMA = 'archive'
+
+PARTITION_NAME_RE = re.compile(r'^(?P<table>\w+)_(?:p(?P<year>\d{4})_(?P<month>\d{2})|default)$')
+
+
+def month_start(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def iter_months(first: datetime, last: datetime):
+    """Начала месяцев с first по last включительно"""
+    while first <= last:
+        yield first
+        first = add_months(first, 1)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def is_partition_name(name: str) -> bool:
+    """Имя принадлежит разделу одной из партиционированных таблиц"""
+    match = PARTITION_NAME_RE.match(name)
+    return bool(match) and match.group('table') in PARTITIONED_TABLES
+
+
+def list_partitions(conn: Connection, table: str) -> List[Tuple[str, datetime]]:
+    """Помесячные разделы таблицы: (имя, начало месяца), по возрастанию"""
+    rows = conn.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :table"
+    ), {'table': table}).scalars()
+    partitions = []
+    for name in rows:
+        match = PARTITION_NAME_RE.match(name)
+        if match and match.group('year'):
+            partitions.append((name, datetime(int(match.group('year')), int(match.group('month')), 1)))
+    return sorted(partitions, key=lambda item: item[1])
+
+
+def default_partition_months(conn: Connection, table: str) -> List[datetime]:
+    """Месяцы, строки которых попали в раздел по умолчанию (обычно он пуст)"""
+    default = f"{table}_default"
+    if conn.execute(text("SELECT to_regclass(:name)"), {'name': default}).scalar() is None:
+        return []
+    return list(conn.execute(text(
+        f"SELECT DISTINCT date_trunc('month', created_at) FROM {default} ORDER BY 1"
+    )).scalars())
+
+
+def create_partition(conn: Connection, table: str, month: datetime, move_default: bool = False) -> str:
+    """Создание раздела месяца; move_default - перенос строк месяца из раздела по умолчанию
+
+    Раздел нельзя создать, пока в разделе по умолчанию есть строки его
+    диапазона, поэтому они сначала переносятся во временную таблицу, а после
+    создания раздела вставляются в родительскую таблицу и попадают в новый
+    раздел. Все шаги выполняются в транзакции вызывающего кода.
+    """
+    name = partition_name(table, month)
+    bounds = f"created_at >= '{month:%Y-%m-%d}' AND created_at < '{add_months(month, 1):%Y-%m-%d}'"
+    if move_default:
+        conn.execute(text(f"CREATE TEMPORARY TABLE {name}_moved (LIKE {table})"))
+        conn.execute(text(
+            f"WITH moved AS (DELETE FROM {table}_default WHERE {bounds} RETURNING *) "
+            f"INSERT INTO {name}_moved SELECT * FROM moved"
+        ))
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+    ))
+    if move_default:
+        conn.execute(text(f"INSERT INTO {table} SELECT * FROM {name}_moved"))
+        conn.execute(text(f"DROP TABLE {name}_moved"))
+    return name
+
+
+def ensure_partitions(conn: Connection, table: str, months_ahead: int,
+                      now: Optional[datetime] = None, since: Optional[datetime] = None) -> List[str]:
+    """Создание разделов с текущего месяца (или с since) на months_ahead месяцев вперед
+
+    Для месяцев, строки которых уже лежат в разделе по умолчанию (обслуживание
+    долго не запускалось), разделы тоже создаются, и строки переносятся в них:
+    дальше они удаляются или архивируются вместе с разделом.
+    """
+    current = month_start(now or datetime.utcnow())
+    first = month_start(since) if since and since < current else current
+    existing = {name for name, _ in list_partitions(conn, table)}
+    in_default = set(default_partition_months(conn, table))
+    months = in_default.union(iter_months(first, add_months(current, months_ahead)))
+    created = []
+    for month in sorted(months):
+        if partition_name(table, month) in existing:
+            continue
+        created.append(create_partition(conn, table, month, move_default=month in in_default))
+    return created
+
+
+def drop_expired_partitions(conn: Connection, table: str, retention_months: int,
+                            archive: bool = False, now: Optional[datetime] = None) -> List[str]:
+    """Отсоединение разделов старше retention_months месяцев
+
+    DETACH меняет только каталог и не переписывает строки, поэтому удаление
+    месяца данных стоит столько же, сколько удаление пустой таблицы. При
+    archive=True раздел переносится в схему archive и остается доступным.
+    Устаревшие строки раздела по умолчанию сначала выносятся в разделы своих
+    месяцев и дальше обрабатываются так же.
+    """
+    cutoff = add_months(month_start(now or datetime.utcnow()), -retention_months)
+    existing = {name for name, _ in list_partitions(conn, table)}
+    for month in default_partition_months(conn, table):
+        if add_months(month, 1) <= cutoff and partition_name(table, month) not in existing:
+            create_partition(conn, table, month, move_default=True)
+    removed = []
+    for name, month in list_partitions(conn, table):
+        if add_months(month, 1) > cutoff:
+            break
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        if archive:
+            conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+            conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}"))
+        else:
+            conn.execute(text(f"DROP TABLE {name}"))
+        removed.append(name)
+    return removed
+
+
+def maintain_partitions(conn: Connection, months_ahead: int, retention_months: int,
+                        archive: bool = False, now: Optional[datetime] = None) -> None:
+    """Создание будущих разделов и удаление устаревших для всех таблиц"""
+    # DETACH берет эксклюзивную блокировку родительской таблицы: не ждем долго,
+    # повторим на следующем запуске
+    conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+    for table in PARTITIONED_TABLES:
+        created = ensure_partitions(conn, table, months_ahead, now)
+        removed = drop_expired_partitions(conn, table, retention_months, archive, now) if retention_months > 0 else []
+        if created or removed:
+            logger.info(f"Partitions of {table}: created {created}, {'archived' if archive else 'dropped'} {removed}")
@@ -1,28 +1,46 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Float, Text
-from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, ForeignKey, Float, Text, Index
+from sqlalchemy import text as sql_text
+from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from datetime import datetime
-from config.settings import DATABASE_URL
+from config.settings import (
+    ASYNC_DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING
+)
 
 Base = declarative_base()
 
-# Создаем подключение к базе данных
-engine = create_engine(DATABASE_URL)
+# Создаем асинхронное подключение к базе данных с общим пулом соединений
+engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING
+)
 
-# Создаем фабрику сессий
-Session = sessionmaker(bind=engine)
+# Создаем фабрику сессий: по одной короткой сессии на обновление
+Session = async_sessionmaker(engine, expire_on_commit=False)
 
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        Index('ix_users_username', 'username'),
+        # Загрузка индекса банов при старте
+        Index('ix_users_restricted', 'telegram_id',
+              postgresql_where=sql_text('is_banned OR is_in_blacklist')),
+    )
     
     id = Column(Integer, primary_key=True)
-    telegram_id = Column(Integer, unique=True)
+    telegram_id = Column(BigInteger, unique=True)
     username = Column(String(255))
     warning_count = Column(Integer, default=0)
     suspicious_edits_count = Column(Integer, default=0)
     is_banned = Column(Boolean, default=False)
     banned_until = Column(DateTime, nullable=True)
+    is_in_blacklist = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -31,6 +49,9 @@ class User(Base):
 
 class Warning(Base):
     __tablename__ = 'warnings'
+    __table_args__ = (
+        Index('ix_warnings_user_id', 'user_id'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'))
@@ -41,6 +62,15 @@ class Warning(Base):
 
 class Comment(Base):
     __tablename__ = 'comments'
+    __table_args__ = (
+        # Индексы очередей включают id: постраничная выборка идет по ключу (created_at, id)
+        Index('ix_comments_user_id_created_at', 'user_id', 'created_at', 'id'),
+        # Очередь модерации: только необработанные комментарии
+        Index('ix_comments_pending_created_at', 'created_at', 'id',
+              postgresql_where=sql_text('NOT is_approved AND NOT is_rejected')),
+        Index('ix_comments_rejected_created_at', 'created_at', 'id',
+              postgresql_where=sql_text('is_rejected')),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'))
@@ -50,6 +80,7 @@ class Comment(Base):
     toxicity_score = Column(Float)
     is_approved = Column(Boolean, default=False)
     is_rejected = Column(Boolean, default=False)
+    rejection_reason = Column(String(255))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -58,29 +89,49 @@ class Comment(Base):
 
 class MessageEdit(Base):
     __tablename__ = 'message_edits'
+    __table_args__ = (
+        Index('ix_message_edits_suspicious_created_at', 'created_at', 'id',
+              postgresql_where=sql_text('is_suspicious')),
+        # Помесячные разделы, см. src/db/partitions.py
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
     
-    id = Column(Integer, primary_key=True)
+    # Ключ раздела обязан входить в первичный ключ
+    id = Column(Integer, primary_key=True, autoincrement=True)
     comment_id = Column(Integer, ForeignKey('comments.id'))
     old_text = Column(Text)
     new_text = Column(Text)
     sentiment_change = Column(Float)
     is_suspicious = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, primary_key=True, default=datetime.utcnow)
     
     comment = relationship("Comment", back_populates="edits")
 
 class ModeratorLog(Base):
     __tablename__ = 'moderator_logs'
+    __table_args__ = (
+        Index('ix_moderator_logs_action_created_at', 'action', 'created_at'),
+        # Неполный час в начале окна статистики
+        Index('ix_moderator_logs_created_at', 'created_at'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
     
-    id = Column(Integer, primary_key=True)
-    moderator_id = Column(Integer, ForeignKey('users.id'))
-    action = Column(String(50))  # approve, reject, ban, etc.
-    target_type = Column(String(50))  # comment, user, etc.
-    target_id = Column(Integer)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    moderator_id = Column(BigInteger)  # Telegram ID модератора
+    action = Column(String(50))  # approve_comment, reject_comment, user_banned, etc.
+    target_user_id = Column(BigInteger)  # Telegram ID пользователя
+    comment_id = Column(Integer, ForeignKey('comments.id'), nullable=True)
     details = Column(Text, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    analysis_data = Column(Text, nullable=True)
+    created_at = Column(DateTime, primary_key=True, default=datetime.utcnow)
+
+class ModeratorActionRollup(Base):
+    """Почасовые счетчики действий модерации, обновляются вместе с журналом"""
+    __tablename__ = 'moderator_action_rollups'
     
-    moderator = relationship("User", foreign_keys=[moderator_id])
+    bucket = Column(DateTime, primary_key=True)  # Начало часа (UTC)
+    action = Column(String(50), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
 
 __all__ = [
     'Base',
@@ -89,5 +140,6 @@ __all__ = [
     'Warning',
     'Comment',
     'MessageEdit',
-    'ModeratorLog'
+    'ModeratorLog',
+    'ModeratorActionRollup'
 ] 
\ No newline at end of file
@@ -1,116 +1,157 @@
 import logging
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.models import Comment, MessageEdit, User
+from src.services.pagination import Cursor, Page, keyset_page
 
 class CommentService:
-    def __init__(self, session: Session):
+    def __init__(self, session: AsyncSession, buffer=None):
         self.session = session
+        # Буфер отложенной записи (WriteBehindBuffer); без него запись сразу
+        self.buffer = buffer
         self.logger = logging.getLogger(__name__)
 
-    def get_comment(self, comment_id: int) -> Comment:
+    async def get_comment(self, comment_id: int) -> Comment:
         """Получение комментария по ID"""
-        return self.session.query(Comment).filter_by(id=comment_id).first()
+        result = await self.session.execute(select(Comment).filter_by(id=comment_id))
+        return result.scalars().first()
 
-    def create_comment(self, user_id: int, text: str, post_id: int, sentiment_score: float = None, toxicity_score: float = None) -> Comment:
-        """Создание нового комментария"""
+    async def create_comment(self, user_id: int, text: str, post_id: int, sentiment_score: float = None, toxicity_score: float = None,
+                             is_approved: bool = False, is_rejected: bool = False, rejection_reason: str = None) -> Comment:
+        """Создание нового комментария (по умолчанию - в очереди модерации)"""
         try:
-            comment = Comment(
+            now = datetime.utcnow()
+            values = dict(
                 user_id=user_id,
                 text=text,
                 post_id=post_id,
                 sentiment_score=sentiment_score,
-                toxicity_score=toxicity_score
+                toxicity_score=toxicity_score,
+                is_approved=is_approved,
+                is_rejected=is_rejected,
+                rejection_reason=rejection_reason,
+                created_at=now,
+                updated_at=now
             )
+            if self.buffer is not None:
+                self.buffer.add(Comment.__table__, values)
+                return Comment(**values)
+            comment = Comment(**values)
             self.session.add(comment)
-            self.session.commit()
+            await self.session.commit()
             return comment
         except Exception as e:
             self.logger.error(f"Error creating comment: {e}")
-            self.session.rollback()
+            await self.session.rollback()
             raise
 
-    def approve_comment(self, comment: Comment, moderator_id: int) -> None:
+    async def approve_comment(self, comment: Comment, moderator_id: int) -> None:
         """Одобрение комментария"""
         try:
             comment.is_approved = True
             comment.is_rejected = False
             comment.updated_at = datetime.utcnow()
-            self.session.commit()
+            await self.session.commit()
             self.logger.info(f"Comment {comment.id} approved by moderator {moderator_id}")
         except Exception as e:
             self.logger.error(f"Error approving comment: {e}")
-            self.session.rollback()
+            await self.session.rollback()
             raise
 
-    def reject_comment(self, comment: Comment, moderator_id: int, reason: str = None) -> None:
+    async def reject_comment(self, comment: Comment, moderator_id: int, reason: str = None) -> None:
         """Отклонение комментария"""
         try:
             comment.is_approved = False
             comment.is_rejected = True
+            comment.rejection_reason = reason
             comment.updated_at = datetime.utcnow()
-            self.session.commit()
+            await self.session.commit()
             self.logger.info(f"Comment {comment.id} rejected by moderator {moderator_id}. Reason: {reason}")
         except Exception as e:
             self.logger.error(f"Error rejecting comment: {e}")
-            self.session.rollback()
+            await self.session.rollback()
             raise
 
-    def record_edit(self, comment: Comment, new_text: str, sentiment_change: float = None, is_suspicious: bool = False) -> MessageEdit:
+    async def record_edit(self, comment: Comment, new_text: str, sentiment_change: float = None, is_suspicious: bool = False) -> MessageEdit:
         """Запись изменения комментария"""
         try:
-            edit = MessageEdit(
+            values = dict(
                 comment_id=comment.id,
                 old_text=comment.text,
                 new_text=new_text,
                 sentiment_change=sentiment_change,
-                is_suspicious=is_suspicious
+                is_suspicious=is_suspicious,
+                created_at=datetime.utcnow()
             )
-            self.session.add(edit)
+            edit = MessageEdit(**values)
+            # История изменений пишется пакетно, текст комментария обновляется сразу
+            if self.buffer is not None:
+                self.buffer.add(MessageEdit.__table__, values)
+            else:
+                self.session.add(edit)
             
             # Обновляем текст комментария
             comment.text = new_text
             comment.updated_at = datetime.utcnow()
             
-            self.session.commit()
+            await self.session.commit()
             return edit
         except Exception as e:
             self.logger.error(f"Error recording edit: {e}")
-            self.session.rollback()
+            await self.session.rollback()
             raise
 
-    def get_user_comments(self, user_id: int, limit: int = 10) -> list[Comment]:
+    async def get_user_comments(self, user_id: int, limit: int = 10) -> list[Comment]:
         """Получение комментариев пользователя"""
         try:
-            return self.session.query(Comment)\
-                .filter_by(user_id=user_id)\
-                .order_by(Comment.created_at.desc())\
-                .limit(limit)\
-                .all()
+            result = await self.session.execute(
+                select(Comment)
+                .filter_by(user_id=user_id)
+                .order_by(Comment.created_at.desc())
+                .limit(limit)
+            )
+            return list(result.scalars().all())
         except Exception as e:
             self.logger.error(f"Error getting user comments: {e}")
             return []
 
-    def get_pending_comments(self, limit: int = 10) -> list[Comment]:
-        """Получение комментариев на модерации"""
+    async def get_pending_comments(self, limit: int = 10, after: Cursor = None,
+                                   before: Cursor = None) -> Page:
+        """Страница комментариев на модерации, от старых к новым
+
+        Строки: (id, created_at, user_id, username, text, toxicity_score)
+        """
+        query = (
+            select(Comment.id, Comment.created_at, Comment.user_id, User.username,
+                   Comment.text, Comment.toxicity_score)
+            .outerjoin(User, User.id == Comment.user_id)
+            .where(Comment.is_approved.is_(False), Comment.is_rejected.is_(False))
+        )
         try:
-            return self.session.query(Comment)\
-                .filter_by(is_approved=False, is_rejected=False)\
-                .order_by(Comment.created_at.asc())\
-                .limit(limit)\
-                .all()
+            return await keyset_page(self.session, query, Comment.created_at, Comment.id, limit,
+                                     after=after, before=before)
         except Exception as e:
             self.logger.error(f"Error getting pending comments: {e}")
-            return []
+            return Page([], None, None)
+
+    async def get_suspicious_edits(self, limit: int = 10, since: datetime = None,
+                                   after: Cursor = None, before: Cursor = None) -> Page:
+        """Страница подозрительных изменений, от новых к старым
 
-    def get_suspicious_edits(self, limit: int = 10) -> list[MessageEdit]:
-        """Получение подозрительных изменений"""
+        Строки: (id, created_at, comment_id, old_text, new_text, sentiment_change).
+        since ограничивает просматриваемые разделы.
+        """
+        query = (
+            select(MessageEdit.id, MessageEdit.created_at, MessageEdit.comment_id,
+                   MessageEdit.old_text, MessageEdit.new_text, MessageEdit.sentiment_change)
+            .where(MessageEdit.is_suspicious.is_(True))
+        )
+        if since:
+            query = query.where(MessageEdit.created_at >= since)
         try:
-            return self.session.query(MessageEdit)\
-                .filter_by(is_suspicious=True)\
-                .order_by(MessageEdit.created_at.desc())\
-                .limit(limit)\
-                .all()
+            return await keyset_page(self.session, query, MessageEdit.created_at, MessageEdit.id, limit,
+                                     descending=True, after=after, before=before)
         except Exception as e:
             self.logger.error(f"Error getting suspicious edits: {e}")
-            return [] 
\ No newline at end of file
+            return Page([], None, None)
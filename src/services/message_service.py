@@ -1,17 +1,21 @@
 import logging
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.models import Comment
+from src.services.pagination import Cursor, Page, keyset_page
 
 class MessageService:
-    def __init__(self, session: Session = None):
+    def __init__(self, session: AsyncSession = None, buffer=None):
         self.session = session
+        # Буфер отложенной записи (WriteBehindBuffer); без него запись сразу
+        self.buffer = buffer
         self.logger = logging.getLogger(__name__)
 
-    def save_message(self, user_id: int, text: str, post_id: int, sentiment_score: float = None, toxicity_score: float = None) -> Comment:
+    async def save_message(self, user_id: int, text: str, post_id: int, sentiment_score: float = None, toxicity_score: float = None) -> Comment:
         """Сохранение сообщения в базу данных"""
         try:
-            message = Comment(
+            values = dict(
                 user_id=user_id,
                 text=text,
                 post_id=post_id,
@@ -19,83 +23,99 @@ class MessageService:
                 toxicity_score=toxicity_score,
                 created_at=datetime.utcnow()
             )
-            if self.session:
+            message = Comment(**values)
+            if self.buffer is not None:
+                self.buffer.add(Comment.__table__, values)
+            elif self.session:
                 self.session.add(message)
-                self.session.commit()
+                await self.session.commit()
             return message
         except Exception as e:
             self.logger.error(f"Error saving message: {e}")
             if self.session:
-                self.session.rollback()
+                await self.session.rollback()
             raise
 
-    def get_message(self, message_id: int) -> Comment:
+    async def get_message(self, message_id: int) -> Comment:
         """Получение сообщения по ID"""
         try:
             if not self.session:
                 return None
-            return self.session.query(Comment).filter_by(id=message_id).first()
+            result = await self.session.execute(select(Comment).filter_by(id=message_id))
+            return result.scalars().first()
         except Exception as e:
             self.logger.error(f"Error getting message: {e}")
             return None
 
-    def update_message(self, message_id: int, new_text: str) -> bool:
+    async def update_message(self, message_id: int, new_text: str) -> bool:
         """Обновление текста сообщения"""
         try:
             if not self.session:
                 return False
-            message = self.session.query(Comment).filter_by(id=message_id).first()
+            message = await self.session.get(Comment, message_id)
             if message:
                 message.text = new_text
                 message.updated_at = datetime.utcnow()
-                self.session.commit()
+                await self.session.commit()
                 return True
             return False
         except Exception as e:
             self.logger.error(f"Error updating message: {e}")
-            self.session.rollback()
+            await self.session.rollback()
             return False
 
-    def delete_message(self, message_id: int) -> bool:
+    async def delete_message(self, message_id: int) -> bool:
         """Удаление сообщения"""
         try:
             if not self.session:
                 return False
-            message = self.session.query(Comment).filter_by(id=message_id).first()
+            message = await self.session.get(Comment, message_id)
             if message:
-                self.session.delete(message)
-                self.session.commit()
+                await self.session.delete(message)
+                await self.session.commit()
                 return True
             return False
         except Exception as e:
             self.logger.error(f"Error deleting message: {e}")
-            self.session.rollback()
+            await self.session.rollback()
             return False
 
-    def get_user_messages(self, user_id: int, limit: int = 100) -> list[Comment]:
-        """Получение последних сообщений пользователя"""
+    async def get_user_messages(self, user_id: int, limit: int = 100, after: Cursor = None,
+                                before: Cursor = None) -> Page:
+        """Страница сообщений пользователя, от новых к старым
+
+        Строки: (id, created_at, post_id, text, toxicity_score, is_rejected)
+        """
+        if not self.session:
+            return Page([], None, None)
+        query = (
+            select(Comment.id, Comment.created_at, Comment.post_id, Comment.text,
+                   Comment.toxicity_score, Comment.is_rejected)
+            .where(Comment.user_id == user_id)
+        )
         try:
-            if not self.session:
-                return []
-            return self.session.query(Comment)\
-                .filter_by(user_id=user_id)\
-                .order_by(Comment.created_at.desc())\
-                .limit(limit)\
-                .all()
+            return await keyset_page(self.session, query, Comment.created_at, Comment.id, limit,
+                                     descending=True, after=after, before=before)
         except Exception as e:
             self.logger.error(f"Error getting user messages: {e}")
-            return []
+            return Page([], None, None)
 
-    def get_negative_messages(self, limit: int = 100) -> list[Comment]:
-        """Получение последних негативных сообщений"""
+    async def get_negative_messages(self, limit: int = 100, after: Cursor = None,
+                                    before: Cursor = None) -> Page:
+        """Страница отклоненных сообщений, от новых к старым
+
+        Строки: (id, created_at, user_id, text, rejection_reason)
+        """
+        if not self.session:
+            return Page([], None, None)
+        query = (
+            select(Comment.id, Comment.created_at, Comment.user_id, Comment.text,
+                   Comment.rejection_reason)
+            .where(Comment.is_rejected.is_(True))
+        )
         try:
-            if not self.session:
-                return []
-            return self.session.query(Comment)\
-                .filter_by(is_rejected=True)\
-                .order_by(Comment.created_at.desc())\
-                .limit(limit)\
-                .all()
+            return await keyset_page(self.session, query, Comment.created_at, Comment.id, limit,
+                                     descending=True, after=after, before=before)
         except Exception as e:
             self.logger.error(f"Error getting negative messages: {e}")
-            return [] 
\ No newline at end of file
+            return Page([], None, None)
@@ -1,56 +1,115 @@
-from datetime import datetime
-from sqlalchemy.orm import Session
-from src.models import ModeratorLog, User, Comment
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models import ModeratorLog, ModeratorActionRollup, User, Comment
+
+ROLLUP_BUCKET = timedelta(hours=1)
+
+# Действие в журнале -> ключ статистики
+STATS_ACTIONS = {
+    'approve_comment': 'approved_comments',
+    'reject_comment': 'rejected_comments',
+    'warning_issued': 'warnings_issued',
+    'user_banned': 'users_banned',
+    'user_blacklisted': 'users_blacklisted',
+    'suspicious_edit': 'suspicious_edits'
+}
+
+def rollup_bucket(moment: datetime) -> datetime:
+    """Начало часового интервала, в который попадает момент"""
+    return moment.replace(minute=0, second=0, microsecond=0)
 
 class ModeratorLogService:
-    def __init__(self, session: Session):
+    def __init__(self, session: AsyncSession, buffer=None):
         self.session = session
+        # Буфер отложенной записи (WriteBehindBuffer); без него запись сразу
+        self.buffer = buffer
 
-    def log_action(self, moderator_id: int, action: str, target_user_id: int, 
+    async def log_action(self, moderator_id: int, action: str, target_user_id: int, 
                    comment_id: int = None, details: str = None,
                    analysis_data: dict = None):
-        log = ModeratorLog(
+        values = dict(
             moderator_id=moderator_id,
             action=action,
             target_user_id=target_user_id,
             comment_id=comment_id,
             details=details,
-            analysis_data=analysis_data
+            analysis_data=json.dumps(analysis_data, ensure_ascii=False) if analysis_data else None,
+            created_at=datetime.utcnow()
         )
-        self.session.add(log)
-        self.session.commit()
+        # Почасовой счетчик записывается в той же транзакции, что и журнал
+        bucket = {'bucket': rollup_bucket(values['created_at']), 'action': action}
+        if self.buffer is not None:
+            self.buffer.add(ModeratorLog.__table__, values)
+            self.buffer.increment(ModeratorActionRollup.__table__, bucket)
+            return
+        self.session.add(ModeratorLog(**values))
+        rollup = pg_insert(ModeratorActionRollup).values(count=1, **bucket)
+        await self.session.execute(rollup.on_conflict_do_update(
+            index_elements=[ModeratorActionRollup.bucket, ModeratorActionRollup.action],
+            set_={'count': ModeratorActionRollup.count + rollup.excluded.count}
+        ))
+        await self.session.commit()
 
-    def get_moderation_stats(self, from_date: datetime = None) -> dict:
-        query = self.session.query(ModeratorLog)
+    async def _count(self, model, *criteria) -> int:
+        result = await self.session.execute(select(func.count()).select_from(model).where(*criteria))
+        return result.scalar_one()
+
+    def _logged_actions(self, from_date: datetime = None, to_date: datetime = None):
+        """Подсчет действий по журналу одним GROUP BY"""
+        query = select(ModeratorLog.action, func.count().label('count')).group_by(ModeratorLog.action)
         if from_date:
-            query = query.filter(ModeratorLog.created_at >= from_date)
-            
-        stats = {
-            'total_actions': query.count(),
-            'approved_comments': query.filter(ModeratorLog.action == 'approve_comment').count(),
-            'rejected_comments': query.filter(ModeratorLog.action == 'reject_comment').count(),
-            'warnings_issued': query.filter(ModeratorLog.action == 'warning_issued').count(),
-            'users_banned': query.filter(ModeratorLog.action == 'user_banned').count(),
-            'users_blacklisted': query.filter(ModeratorLog.action == 'user_blacklisted').count(),
-            'suspicious_edits': query.filter(ModeratorLog.action == 'suspicious_edit').count()
-        }
+            query = query.where(ModeratorLog.created_at >= from_date)
+        if to_date:
+            query = query.where(ModeratorLog.created_at < to_date)
+        return query
+
+    async def count_actions(self, from_date: datetime = None) -> dict:
+        """Число действий каждого типа начиная с from_date
+
+        Полные часы берутся из почасовых счетчиков (включая текущий, еще не
+        закрытый час), и только неполный час в начале окна считается по журналу,
+        поэтому время запроса не зависит от размера журнала.
+        """
+        rollups = select(ModeratorActionRollup.action, ModeratorActionRollup.count)
+        if from_date:
+            head_end = rollup_bucket(from_date)
+            if head_end < from_date:
+                head_end += ROLLUP_BUCKET
+            rollups = rollups.where(ModeratorActionRollup.bucket >= head_end)
+            if head_end > from_date:
+                rollups = union_all(rollups, self._logged_actions(from_date, head_end))
+        counts = rollups.subquery()
+        result = await self.session.execute(
+            select(counts.c.action, func.sum(counts.c.count)).group_by(counts.c.action)
+        )
+        return {action: int(count) for action, count in result.all()}
+
+    async def get_moderation_stats(self, from_date: datetime = None) -> dict:
+        counts = await self.count_actions(from_date)
+        stats = {'total_actions': sum(counts.values())}
+        for action, key in STATS_ACTIONS.items():
+            stats[key] = counts.get(action, 0)
         return stats
         
-    def get_user_history(self, user_id: int) -> dict:
+    async def get_user_history(self, user_id: int) -> dict:
         """Получение истории действий пользователя"""
-        user = self.session.query(User).filter_by(telegram_id=user_id).first()
+        result = await self.session.execute(select(User).filter_by(telegram_id=user_id))
+        user = result.scalars().first()
         if not user:
             return None
             
         return {
-            'warnings_count': user.warnings_count,
+            'warnings_count': user.warning_count,
             'suspicious_edits': user.suspicious_edits_count,
-            'total_comments': self.session.query(Comment).filter_by(user_id=user.id).count(),
-            'rejected_comments': self.session.query(Comment).filter_by(
-                user_id=user.id, status='rejected'
-            ).count(),
-            'last_activity': user.last_activity,
-            'is_restricted': user.edit_restrictions,
+            'total_comments': await self._count(Comment, Comment.user_id == user.id),
+            'rejected_comments': await self._count(
+                Comment, Comment.user_id == user.id, Comment.is_rejected.is_(True)
+            ),
+            'last_activity': user.updated_at,
+            'is_restricted': user.suspicious_edits_count >= 3,
             'is_banned': user.is_banned,
-            'ban_until': user.ban_until
-        } 
\ No newline at end of file
+            'ban_until': user.banned_until
+        }
\ No newline at end of file
@@ -0,0 +1,66 @@
+from datetime import datetime, timezone
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Позиция в выборке: (created_at, id) граничной строки
+Cursor = Tuple[datetime, int]
+
+
+class Page(NamedTuple):
+    """Страница выборки: строки и курсоры соседних страниц (None - страницы нет)"""
+    rows: List[Any]
+    next_cursor: Optional[Cursor]
+    prev_cursor: Optional[Cursor]
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    """Компактная запись курсора для callback_data (не длиннее 64 байт)"""
+    created_at, row_id = cursor
+    micros = int(created_at.replace(tzinfo=timezone.utc).timestamp()) * 1000000 + created_at.microsecond
+    return f"{micros:x}.{row_id:x}"
+
+
+def decode_cursor(value: str) -> Cursor:
+    micros, row_id = (int(part, 16) for part in value.split('.'))
+    seconds, microsecond = divmod(micros, 1000000)
+    return datetime.utcfromtimestamp(seconds).replace(microsecond=microsecond), row_id
+
+
+async def keyset_page(session: AsyncSession, query: Select, created_at, row_id, limit: int,
+                      descending: bool = False, after: Cursor = None, before: Cursor = None) -> Page:
+    """Постраничная выборка по ключу (created_at, id) без OFFSET
+
+    query должен содержать колонки created_at и id. after - курсор для перехода
+    вперед (строки после него), before - назад (строки перед ним). Каждая
+    страница читает не больше limit + 1 строк по индексу независимо от глубины.
+    """
+    key = tuple_(created_at, row_id)
+    backward = before is not None
+    # Назад идем в обратном порядке и переворачиваем результат
+    reverse = descending != backward
+    # Дублирующее условие на created_at нужно для отсечения разделов: по
+    # сравнению кортежей планировщик разделы не отбрасывает
+    if after is not None:
+        query = query.where(key < tuple_(*after), created_at <= after[0]) if descending \
+            else query.where(key > tuple_(*after), created_at >= after[0])
+    if backward:
+        query = query.where(key > tuple_(*before), created_at >= before[0]) if descending \
+            else query.where(key < tuple_(*before), created_at <= before[0])
+    order = (created_at.desc(), row_id.desc()) if reverse else (created_at.asc(), row_id.asc())
+
+    result = await session.execute(query.order_by(*order).limit(limit + 1))
+    rows = list(result.all())
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backward:
+        rows.reverse()
+    if not rows:
+        return Page(rows, None, None)
+
+    first = (getattr(rows[0], created_at.key), getattr(rows[0], row_id.key))
+    last = (getattr(rows[-1], created_at.key), getattr(rows[-1], row_id.key))
+    if backward:
+        return Page(rows, last, first if has_more else None)
+    return Page(rows, last if has_more else None, first if after is not None else None)
@@ -1,99 +1,119 @@
 from datetime import datetime, timedelta
 import logging
-from sqlalchemy.orm import Session
-from src.models import User, Warning
+from sqlalchemy import select, insert, literal, case, and_, or_, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models import User, Warning, Comment
 from config.settings import MAX_WARNINGS, BAN_DURATION
 
 class UserService:
-    def __init__(self, session: Session):
+    def __init__(self, session: AsyncSession):
         self.session = session
         self.logger = logging.getLogger(__name__)
 
+    async def _get_user(self, telegram_id: int) -> User:
+        result = await self.session.execute(select(User).filter_by(telegram_id=telegram_id))
+        return result.scalars().first()
+
     async def get_or_create_user(self, telegram_id: int, username: str = None) -> User:
         """Получение или создание пользователя"""
         try:
-            user = self.session.query(User).filter_by(telegram_id=telegram_id).first()
+            user = await self._get_user(telegram_id)
             
             if not user:
-                user = User(
-                    telegram_id=telegram_id,
-                    username=username,
-                    warning_count=0,
-                    suspicious_edits_count=0
+                # Первые сообщения пользователя могут обрабатываться параллельно:
+                # вставка без ошибки при конфликте, затем чтение созданной строки
+                now = datetime.utcnow()
+                await self.session.execute(
+                    pg_insert(User).values(
+                        telegram_id=telegram_id,
+                        username=username,
+                        warning_count=0,
+                        suspicious_edits_count=0,
+                        is_banned=False,
+                        is_in_blacklist=False,
+                        created_at=now,
+                        updated_at=now
+                    ).on_conflict_do_nothing(index_elements=[User.telegram_id])
                 )
-                self.session.add(user)
-                self.session.commit()
+                await self.session.commit()
+                user = await self._get_user(telegram_id)
                 
             return user
             
         except Exception as e:
             self.logger.error(f"Error in get_or_create_user: {e}")
-            self.session.rollback()
+            await self.session.rollback()
             raise
 
+    async def get_by_username(self, username: str) -> User:
+        """Поиск пользователя по username"""
+        result = await self.session.execute(select(User).filter_by(username=username))
+        return result.scalars().first()
+
     async def increment_warning_count(self, user_id: int) -> int:
         """Увеличение счетчика предупреждений"""
         try:
-            user = self.session.query(User).filter_by(telegram_id=user_id).first()
+            user = await self._get_user(user_id)
             if not user:
                 raise ValueError(f"User {user_id} not found")
                 
             user.warning_count += 1
-            self.session.commit()
+            await self.session.commit()
             
             return user.warning_count
             
         except Exception as e:
             self.logger.error(f"Error in increment_warning_count: {e}")
-            self.session.rollback()
+            await self.session.rollback()
             raise
 
     async def ban_user(self, user_id: int, duration_hours: int = 24) -> None:
         """Бан пользователя"""
         try:
-            user = self.session.query(User).filter_by(telegram_id=user_id).first()
+            user = await self._get_user(user_id)
             if not user:
                 raise ValueError(f"User {user_id} not found")
                 
             user.is_banned = True
-            user.ban_end_time = datetime.utcnow() + timedelta(hours=duration_hours)
-            self.session.commit()
+            user.banned_until = datetime.utcnow() + timedelta(hours=duration_hours)
+            await self.session.commit()
             
-            self.logger.info(f"User {user_id} banned until {user.ban_end_time}")
+            self.logger.info(f"User {user_id} banned until {user.banned_until}")
             
         except Exception as e:
             self.logger.error(f"Error in ban_user: {e}")
-            self.session.rollback()
+            await self.session.rollback()
             raise
 
     async def unban_user(self, user_id: int) -> None:
         """Разбан пользователя"""
         try:
-            user = self.session.query(User).filter_by(telegram_id=user_id).first()
+            user = await self._get_user(user_id)
             if not user:
                 raise ValueError(f"User {user_id} not found")
                 
             user.is_banned = False
-            user.ban_end_time = None
-            self.session.commit()
+            user.banned_until = None
+            await self.session.commit()
             
             self.logger.info(f"User {user_id} unbanned")
             
         except Exception as e:
             self.logger.error(f"Error in unban_user: {e}")
-            self.session.rollback()
+            await self.session.rollback()
             raise
 
     async def is_banned(self, user_id: int) -> bool:
         """Проверка бана пользователя"""
         try:
-            user = self.session.query(User).filter_by(telegram_id=user_id).first()
+            user = await self._get_user(user_id)
             if not user:
                 return False
                 
             # Если пользователь забанен и время бана не истекло
-            if user.is_banned and user.ban_end_time:
-                if user.ban_end_time > datetime.utcnow():
+            if user.is_banned and user.banned_until:
+                if user.banned_until > datetime.utcnow():
                     return True
                 else:
                     # Если время бана истекло, разбаниваем
@@ -109,64 +129,107 @@ class UserService:
     async def reset_warnings(self, user_id: int) -> None:
         """Сброс предупреждений пользователя"""
         try:
-            user = self.session.query(User).filter_by(telegram_id=user_id).first()
+            user = await self._get_user(user_id)
             if not user:
                 raise ValueError(f"User {user_id} not found")
                 
             user.warning_count = 0
-            self.session.commit()
+            await self.session.commit()
             
             self.logger.info(f"Warnings reset for user {user_id}")
             
         except Exception as e:
             self.logger.error(f"Error in reset_warnings: {e}")
-            self.session.rollback()
+            await self.session.rollback()
             raise
 
-    def check_user_restrictions(self, user: User) -> tuple[bool, str]:
+    async def check_user_restrictions(self, user: User) -> tuple[bool, str]:
         """Проверка ограничений пользователя"""
         if user.is_banned:
-            if user.ban_end_time and user.ban_end_time > datetime.utcnow():
-                return False, f"Вы заблокированы до {user.ban_end_time.strftime('%Y-%m-%d %H:%M:%S')}"
+            if user.banned_until and user.banned_until > datetime.utcnow():
+                return False, f"Вы заблокированы до {user.banned_until.strftime('%Y-%m-%d %H:%M:%S')}"
             else:
                 user.is_banned = False
-                user.ban_end_time = None
-                self.session.commit()
+                user.banned_until = None
+                await self.session.commit()
                 
         return True, ""
 
-    async def add_warning(self, user_id: int, reason: str = "нарушение правил") -> int:
-        """Добавление предупреждения пользователю"""
+    async def add_warning(self, user_id: int, reason: str = "нарушение правил",
+                          username: str = None) -> tuple[int, bool]:
+        """Атомарная выдача предупреждения: один запрос создает пользователя при
+        необходимости, записывает предупреждение, увеличивает счетчик и применяет бан.
+        Возвращает новое число предупреждений и признак бана."""
         try:
-            user = await self.get_or_create_user(user_id)
+            now = datetime.utcnow()
+            banned_until = now + timedelta(hours=BAN_DURATION)
+            reaches_limit = User.warning_count + 1 >= MAX_WARNINGS
             
-            # Создаем запись о предупреждении
-            warning = Warning(
-                user_id=user.id,
-                reason=reason,
-                created_at=datetime.utcnow()
+            new_user = pg_insert(User).values(
+                telegram_id=user_id,
+                username=username,
+                warning_count=1,
+                suspicious_edits_count=0,
+                is_banned=MAX_WARNINGS <= 1,
+                banned_until=banned_until if MAX_WARNINGS <= 1 else None,
+                created_at=now,
+                updated_at=now
             )
-            self.session.add(warning)
+            upsert = new_user.on_conflict_do_update(
+                index_elements=[User.telegram_id],
+                set_={
+                    'username': func.coalesce(new_user.excluded.username, User.username),
+                    'warning_count': User.warning_count + 1,
+                    'is_banned': or_(User.is_banned, reaches_limit),
+                    'banned_until': case((reaches_limit, banned_until), else_=User.banned_until),
+                    'updated_at': now
+                }
+            ).returning(User.id, User.warning_count, User.is_banned).cte('upserted_user')
             
-            # Увеличиваем счетчик предупреждений
-            user.warning_count += 1
+            # Запись о предупреждении вставляется в том же запросе
+            warning = insert(Warning).from_select(
+                ['user_id', 'reason', 'created_at'],
+                select(upsert.c.id, literal(reason), literal(now))
+            ).cte('inserted_warning')
             
-            # Если достигнут лимит предупреждений, баним пользователя
-            if user.warning_count >= MAX_WARNINGS:
-                user.is_banned = True
-                user.banned_until = datetime.utcnow() + timedelta(hours=BAN_DURATION)
-                
-            self.session.commit()
-            return user.warning_count
+            result = await self.session.execute(
+                select(upsert.c.warning_count, upsert.c.is_banned).add_cte(warning)
+            )
+            warning_count, is_banned = result.one()
+            await self.session.commit()
+            return warning_count, is_banned
             
         except Exception as e:
             self.logger.error(f"Error adding warning: {e}")
-            self.session.rollback()
+            await self.session.rollback()
             raise
 
-    def add_to_blacklist(self, user: User):
+    async def get_restricted_users(self) -> list[tuple]:
+        """Действующие баны и черный список: (telegram_id, banned_until, is_in_blacklist)"""
+        result = await self.session.execute(
+            select(User.telegram_id, User.banned_until, User.is_in_blacklist).where(or_(
+                User.is_in_blacklist.is_(True),
+                and_(
+                    User.is_banned.is_(True),
+                    or_(User.banned_until.is_(None), User.banned_until > datetime.utcnow())
+                )
+            ))
+        )
+        return [tuple(row) for row in result.all()]
+
+    async def get_comment_counts(self, user: User) -> tuple[int, int]:
+        """Число рассмотренных комментариев пользователя и из них отклоненных
+        (для репутации); ожидающие модерации не учитываются"""
+        result = await self.session.execute(
+            select(func.count(), func.count().filter(Comment.is_rejected.is_(True)))
+            .where(Comment.user_id == user.id, or_(Comment.is_approved, Comment.is_rejected))
+        )
+        total, rejected = result.one()
+        return total, rejected
+
+    async def add_to_blacklist(self, user: User):
         user.is_in_blacklist = True
-        self.session.commit()
+        await self.session.commit()
         
     def check_edit_restrictions(self, user: User) -> tuple[bool, str]:
         """Проверка ограничений на редактирование"""
@@ -183,12 +246,12 @@ class UserService:
             self.logger.error(f"Error checking edit restrictions: {e}")
             return False, "Произошла ошибка при проверке ограничений"
 
-    def update_suspicious_edits_count(self, user: User) -> None:
+    async def update_suspicious_edits_count(self, user: User) -> None:
         """Обновление счетчика подозрительных изменений"""
         try:
             user.suspicious_edits_count += 1
-            self.session.commit()
+            await self.session.commit()
         except Exception as e:
             self.logger.error(f"Error updating suspicious edits count: {e}")
-            self.session.rollback()
+            await self.session.rollback()
             raise 
\ No newline at end of file
@@ -0,0 +1,128 @@
+import asyncio
+import sys
+import time
+
+from src.core.broker_backends import InMemoryBackend
+
+# Размер, при котором линейное вытеснение заметно по времени
+LOAD_ITEMS = 20000
+
+
+def check(name: str, ok: bool) -> bool:
+    print(f"{'OK  ' if ok else 'FAIL'} {name}")
+    return ok
+
+
+async def test_cache() -> bool:
+    backend = InMemoryBackend(max_items=2)
+    await backend.set('a', b'1')
+    await backend.set('b', b'2', expire=60)
+    data, ttl = await backend.get('a')
+    results = [check("чтение без TTL", data == b'1' and ttl == -1)]
+    data, ttl = await backend.get('b')
+    results.append(check("чтение с TTL", data == b'2' and 0 < ttl <= 60))
+
+    # 'a' прочитан раньше 'b', поэтому при переполнении вытесняется он
+    await backend.set('c', b'3')
+    results.append(check("вытеснение давно не читанного ключа", (await backend.get('a'))[0] is None))
+
+    backend._items['b'] = (b'2', time.monotonic() - 1)
+    results.append(check("истекший ключ не возвращается", await backend.get('b') == (None, -2)))
+    await backend.delete('c')
+    results.append(check("удаление ключа", (await backend.get('c'))[0] is None))
+    return all(results)
+
+
+async def test_pubsub() -> bool:
+    backend = InMemoryBackend()
+    stream = backend.subscribe('events')
+    receive = asyncio.create_task(stream.__anext__())
+    await asyncio.sleep(0)
+    await backend.publish('events', 'hello')
+    await backend.publish('other', 'ignored')
+    message = await asyncio.wait_for(receive, 1)
+    await stream.aclose()
+    return check("доставка сообщения подписчику", message == 'hello' and not backend._subscribers['events'])
+
+
+async def test_queues() -> bool:
+    backend = InMemoryBackend(max_items=2)
+    await backend.enqueue('moderation', {'n': 1})
+    await backend.enqueue('analysis', {'n': 2})
+    priority_id = await backend.enqueue('priority', {'n': 3})
+    order = [(await backend.dequeue())[0] for _ in range(3)]
+    results = [check("порядок очередей по приоритету", order == ['priority', 'analysis', 'moderation'])]
+
+    waiter = asyncio.create_task(backend.dequeue())
+    await asyncio.sleep(0)
+    await backend.enqueue('analysis', {'n': 4})
+    name, _, payload = await asyncio.wait_for(waiter, 1)
+    results.append(check("ожидание новой задачи", name == 'analysis' and payload == {'n': 4}))
+
+    backend.complete(priority_id, {'ok': True})
+    results.append(check("результат задачи", await backend.fetch_result(priority_id) == {'ok': True}))
+    backend.complete('j1', 1)
+    backend.complete('j2', 2)
+    results.append(check("вытеснение старейшего результата",
+                         await backend.fetch_result(priority_id) is None and len(backend._results) == 2))
+
+    for job_id in backend._results:
+        backend._results[job_id] = (backend._results[job_id][0], time.monotonic() - 1)
+    backend.complete('j3', 3)
+    results.append(check("истекшие результаты удаляются при записи",
+                         list(backend._results) == ['j3'] and await backend.fetch_result('j3') == 3))
+    return all(results)
+
+
+async def test_counters() -> bool:
+    backend = InMemoryBackend(max_items=3)
+    await backend.incr('c:1', expire=60)
+    value = await backend.incr('c:1', amount=2)
+    results = [check("счетчик", value == 3 and await backend.get_counters(['c:1', 'missing']) == [3, 0])]
+    results.append(check("TTL сохраняется при записи без expire", backend._counters['c:1'][1] is not None))
+
+    await backend.pfadd('u:1', 1, 2, expire=60)
+    await backend.pfadd('u:2', 2, 3, expire=60)
+    results.append(check("уникальные значения", await backend.pfcount('u:1', 'u:2') == 3))
+
+    # c:1 давно не обновлялся и вытесняется первым
+    await backend.incr('c:2')
+    results.append(check("вытеснение давно не обновлявшегося счетчика",
+                         list(backend._counters) == ['u:1', 'u:2', 'c:2']))
+
+    backend._counters['u:1'] = (backend._counters['u:1'][0], time.monotonic() - 1)
+    await backend.incr('c:3')
+    results.append(check("истекшие окна удаляются при записи", 'u:1' not in backend._counters))
+    results.append(check("истекший счетчик не читается", await backend.pfcount('u:1') == 0))
+    return all(results)
+
+
+async def test_bounded_load() -> bool:
+    # После заполнения каждая запись вытесняет один элемент, а не перестраивает хранилище
+    backend = InMemoryBackend(max_items=LOAD_ITEMS)
+    started = time.perf_counter()
+    for index in range(LOAD_ITEMS * 3):
+        await backend.incr(f"load:{index}", expire=60)
+        backend.complete(f"job:{index}", index)
+    elapsed = time.perf_counter() - started
+    print(f"{LOAD_ITEMS * 6} записей за {elapsed:.2f} с")
+    return check("размер ограничен max_items",
+                 len(backend._counters) == LOAD_ITEMS and len(backend._results) == LOAD_ITEMS
+                 and elapsed < 5)
+
+
+async def test_inmemory_backend() -> bool:
+    print("Проверка хранилища брокера в памяти процесса")
+    results = []
+    for test in (test_cache, test_pubsub, test_queues, test_counters, test_bounded_load):
+        print(f"\n{test.__name__}:")
+        results.append(await test())
+    return all(results)
+
+
+if __name__ == "__main__":
+    if asyncio.run(test_inmemory_backend()):
+        print("\nТест успешно завершен: хранилище в памяти работает корректно!")
+    else:
+        print("\nОбнаружены ошибки в хранилище в памяти.")
+        sys.exit(1)
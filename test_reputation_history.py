@@ -0,0 +1,91 @@
+import asyncio
+import random
+import sys
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, update
+
+from config.settings import DB_HOST, DB_PORT, DB_NAME, TRUST_TIERS
+from src.core.reputation import FULL_AGE_DAYS, ReputationCache, reputation_score
+from src.core.write_behind import WriteBehindBuffer
+from src.db.init_db import init_db
+from src.models import Session, User, Comment, engine
+from src.services.comment_service import CommentService
+from src.services.user_service import UserService
+
+
+async def record_comments(buffer: WriteBehindBuffer, user: User, count: int, rejected: bool = False) -> None:
+    # Комментарии пишутся так же, как в обработчике: через буфер отложенной записи
+    async with Session() as session:
+        service = CommentService(session, buffer)
+        for i in range(count):
+            await service.create_comment(
+                user.id, f"комментарий {i}", None, toxicity_score=0.9 if rejected else 0.1,
+                is_approved=not rejected, is_rejected=rejected,
+                rejection_reason='проверка' if rejected else None
+            )
+    await buffer.flush()
+
+
+async def current_tier(cache: ReputationCache, user: User):
+    # Тот же расчет, что в HighLoadBot.refresh_reputation
+    async with Session() as session:
+        comments, rejected = await UserService(session).get_comment_counts(user)
+    age_days = (datetime.utcnow() - user.created_at).total_seconds() / 86400
+    score = reputation_score(user.warning_count or 0, comments, rejected, age_days)
+    tier = cache.update(user.telegram_id, score)
+    print(f"Комментариев: {comments}, отклонено: {rejected}, репутация: {score:.2f}, "
+          f"уровень: {tier.name if tier else 'нет'}")
+    return tier
+
+
+async def test_reputation_history() -> bool:
+    print(f"Проверка репутации по истории комментариев: {DB_HOST}:{DB_PORT}/{DB_NAME}")
+
+    # Отрицательный ID не пересекается с реальными пользователями Telegram
+    telegram_id = -random.randint(10 ** 9, 10 ** 10)
+    buffer = WriteBehindBuffer(engine)
+    cache = ReputationCache(TRUST_TIERS)
+    top_tier = cache.tiers[0]
+    try:
+        async with Session() as session:
+            user = await UserService(session).get_or_create_user(telegram_id, "reputation_test")
+            # Полный вес стажа: без истории репутация не выше половины
+            user.created_at = datetime.utcnow() - timedelta(days=FULL_AGE_DAYS)
+            await session.execute(update(User).filter_by(id=user.id).values(created_at=user.created_at))
+            await session.commit()
+
+        before = await current_tier(cache, user)
+
+        # Одобренных комментариев достаточно для высшего уровня
+        needed = 0
+        while reputation_score(0, needed, 0, FULL_AGE_DAYS) < top_tier.min_score:
+            needed += 1
+        await record_comments(buffer, user, needed)
+        promoted = await current_tier(cache, user)
+
+        # Отклоненный комментарий снижает уровень
+        await record_comments(buffer, user, 1, rejected=True)
+        demoted = await current_tier(cache, user)
+
+        return (
+            before != top_tier
+            and promoted == top_tier
+            and demoted != top_tier
+        )
+
+    finally:
+        async with Session() as session:
+            user_ids = select(User.id).filter_by(telegram_id=telegram_id).scalar_subquery()
+            await session.execute(delete(Comment).where(Comment.user_id == user_ids))
+            await session.execute(delete(User).filter_by(telegram_id=telegram_id))
+            await session.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    init_db()
+    if asyncio.run(test_reputation_history()):
+        print("\nТест успешно завершен: записанные комментарии меняют уровень доверия!")
+    else:
+        print("\nУровень доверия не зависит от истории комментариев.")
+        sys.exit(1)
@@ -0,0 +1,81 @@
+import asyncio
+import sys
+
+from src.core.scheduler import FairScheduler
+
+WEIGHTS = {'priority': 6, 'analysis': 3, 'moderation': 1}
+AGING_SECONDS = 0.1
+
+
+def make_job(log: list, label, seconds: float):
+    async def job():
+        await asyncio.sleep(seconds)
+        log.append(label)
+    return job
+
+
+async def test_user_interleaving() -> bool:
+    """Пользователи не ждут всю очередь спамера и после порога старения"""
+    scheduler = FairScheduler(WEIGHTS, {name: 1 for name in WEIGHTS}, workers=1,
+                              aging_seconds=AGING_SECONDS)
+    scheduler.start()
+    log = []
+    try:
+        spam = [asyncio.create_task(scheduler.submit('analysis', 'spammer', make_job(log, 'spam', 0.005)))
+                for _ in range(200)]
+        # Задачи спамера ждут дольше порога старения
+        await asyncio.sleep(AGING_SECONDS * 2)
+        started = len(log)
+        others = [scheduler.submit('analysis', user, make_job(log, user, 0.005)) for user in range(3)]
+        await asyncio.gather(*others)
+        # Ротация пользователей: между задачами остальных спамер получает не больше одной задачи
+        # (плюс уже выполнявшаяся на момент отправки)
+        waited = len(log) - started
+        print(f"Задач спамера перед задачами остальных: {waited - 3} (в очереди было {200 - started})")
+        for task in spam:
+            task.cancel()
+        return waited - 3 <= 3 + 1
+    finally:
+        await scheduler.stop()
+
+
+async def test_weights_under_overload() -> bool:
+    """При перегрузке всех очередей доли воркеров соответствуют весам"""
+    scheduler = FairScheduler(WEIGHTS, {name: 1 for name in WEIGHTS}, workers=1,
+                              aging_seconds=AGING_SECONDS)
+    scheduler.start()
+    log = []
+    try:
+        tasks = [asyncio.create_task(scheduler.submit(queue, user, make_job(log, queue, 0.002)))
+                 for queue in WEIGHTS for user in range(10) for _ in range(30)]
+        # Ждем, пока задачи заведомо превысят порог старения
+        while len(log) < 300:
+            await asyncio.sleep(0.01)
+        window = log[100:300]
+        shares = {queue: window.count(queue) / len(window) for queue in WEIGHTS}
+        print("Доли очередей: " + ", ".join(f"{queue} {share:.0%}" for queue, share in shares.items()))
+        for task in tasks:
+            task.cancel()
+        total = sum(WEIGHTS.values())
+        return all(abs(shares[queue] - weight / total) < 0.1 for queue, weight in WEIGHTS.items())
+    finally:
+        await scheduler.stop()
+
+
+async def test_scheduler_fairness() -> bool:
+    print("Проверка справедливости планировщика")
+    results = []
+    for test in (test_user_interleaving, test_weights_under_overload):
+        print(f"\n{test.__name__}:")
+        ok = await test()
+        print("OK" if ok else "FAIL")
+        results.append(ok)
+    return all(results)
+
+
+if __name__ == "__main__":
+    if asyncio.run(test_scheduler_fairness()):
+        print("\nТест успешно завершен: старение не отменяет веса очередей и очередность пользователей!")
+    else:
+        print("\nПланировщик нарушает веса очередей или очередность пользователей.")
+        sys.exit(1)
@@ -0,0 +1,64 @@
+import asyncio
+import random
+import sys
+from sqlalchemy import select, func, delete
+
+from config.settings import DB_HOST, DB_PORT, DB_NAME, MAX_WARNINGS
+from src.db.init_db import init_db
+from src.models import Session, User, Warning, engine
+from src.services.user_service import UserService
+
+CONCURRENCY = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+
+async def issue_warning(telegram_id: int) -> tuple:
+    # Каждое предупреждение выдается в отдельной сессии, как в параллельных обработчиках
+    async with Session() as session:
+        return await UserService(session).add_warning(telegram_id, "проверка конкурентности")
+
+
+async def test_warning_concurrency() -> bool:
+    print(f"Проверка атомарности предупреждений: {DB_HOST}:{DB_PORT}/{DB_NAME}")
+
+    # Отрицательный ID не пересекается с реальными пользователями Telegram
+    telegram_id = -random.randint(10 ** 9, 10 ** 10)
+    try:
+        results = await asyncio.gather(*(issue_warning(telegram_id) for _ in range(CONCURRENCY)))
+
+        async with Session() as session:
+            user = (await session.execute(select(User).filter_by(telegram_id=telegram_id))).scalar_one()
+            warnings = (await session.execute(
+                select(func.count()).select_from(Warning).where(Warning.user_id == user.id)
+            )).scalar_one()
+
+        counts = sorted(count for count, _ in results)
+        print(f"Параллельных запросов: {CONCURRENCY}")
+        print(f"Итоговый счетчик: {user.warning_count}, записей о предупреждениях: {warnings}")
+        print(f"Бан: {user.is_banned} (лимит {MAX_WARNINGS})")
+
+        ok = (
+            user.warning_count == CONCURRENCY
+            and warnings == CONCURRENCY
+            and counts == list(range(1, CONCURRENCY + 1))
+            and user.is_banned == (CONCURRENCY >= MAX_WARNINGS)
+        )
+        if not ok:
+            print(f"Возвращенные значения счетчика: {counts}")
+        return ok
+
+    finally:
+        async with Session() as session:
+            user_ids = select(User.id).filter_by(telegram_id=telegram_id).scalar_subquery()
+            await session.execute(delete(Warning).where(Warning.user_id == user_ids))
+            await session.execute(delete(User).filter_by(telegram_id=telegram_id))
+            await session.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    init_db()
+    if asyncio.run(test_warning_concurrency()):
+        print("\nТест успешно завершен: ни одно увеличение счетчика не потеряно!")
+    else:
+        print("\nОбнаружены потерянные обновления счетчика предупреждений.")
+        sys.exit(1)